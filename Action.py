@@ -8,6 +8,7 @@ from .Toolset import Toolset
 
 if TYPE_CHECKING:
 	from .Project import Project
+	from .Configuration import Configuration
 
 class Action(ABC):
 	def __init__(self, project: 'Project', add_action_to_project: bool = True) -> None:
@@ -22,40 +23,91 @@ class Action(ABC):
 			project.add_action(self)
 
 		self._submitted_action = None
+		self._pool: str|None = None
+
+		# per configuration environments and submitted nodes (see submit_configurations)
+		self._configuration: 'Configuration|None' = None
+		self._configuration_envs: dict[str, Environment] = {}
+		self._configuration_submitted_actions: dict[str, NodeList] = {}
 
 	@property
 	def project(self) -> 'Project':
 		from .Project import Project
 		return self._project
 		
+	# the environment of the configuration being submitted (cloned from the action's environment on first use),
+	# where $CONFIGURATION is the configuration's name (e.g. for library paths of other actions' outputs)
 	@property
 	def env(self) -> Environment:
-		return self._env
+		if self._configuration is None:
+			return self._env
+
+		if self._configuration.name not in self._configuration_envs:
+			self._configuration_envs[self._configuration.name] = self._env.Clone(CONFIGURATION=self._configuration.name)
+		return self._configuration_envs[self._configuration.name]
+
+	# the configuration the action is being submitted for, None if the solution has no configurations
+	@property
+	def configuration(self) -> 'Configuration|None':
+		return self._configuration
+
+	def set_configuration(self, configuration: 'Configuration|None'):
+		self._configuration = configuration
 	
+	# the nodes of the configuration being submitted, or of all configurations
 	@property
 	def submitted_action(self) -> NodeList|None:
+		if self._configuration is not None:
+			return self._configuration_submitted_actions.get(self._configuration.name)
+
+		if len(self._configuration_submitted_actions) > 0:
+			return NodeList([node for nodes in self._configuration_submitted_actions.values() for node in nodes])
+
 		return self._submitted_action
+
+	# name of the solution pool limiting how many targets of this action are built concurrently (set before submitting)
+	@property
+	def pool(self) -> str|None:
+		return self._pool
+
+	def set_pool(self, name: str|None):
+		self._pool = name
 	
+	# when both actions are submitted per configuration, each configuration depends on the same configuration of the other
 	def depends_on(self, other: 'Action|List[str]|NodeList'):
-		if self._submitted_action is None:
+		if self.submitted_action is None:
 			raise RuntimeError('The action is yet to be submitted, Cannot set dependency on an action that has not been submitted yet')
 		
-		if isinstance(other, Action) and other._submitted_action is None:
+		if isinstance(other, Action) and other.submitted_action is None:
 			raise RuntimeError('The other action is yet to be submitted, Cannot set dependency on an action that has not been submitted yet')
 
+		if isinstance(other, Action) and self._configuration is None and len(self._configuration_submitted_actions) > 0 and len(other._configuration_submitted_actions) > 0:
+			for name, nodes in self._configuration_submitted_actions.items():
+				self._env.Depends(nodes, other._configuration_submitted_actions.get(name, other.submitted_action))
+			return
+
 		if isinstance(other, list):
-			self.env.Depends(self._submitted_action, other)
+			self.env.Depends(self.submitted_action, other)
 		elif isinstance(other, Action):
-			self.env.Depends(self._submitted_action, other.submitted_action)
+			self.env.Depends(self.submitted_action, other.submitted_action)
 		elif isinstance(other, str):
-			self.env.Depends(self._submitted_action, other)
+			self.env.Depends(self.submitted_action, other)
 		elif isinstance(other, NodeList):
-			self.env.Depends(self._submitted_action, other)
+			self.env.Depends(self.submitted_action, other)
 		else:
 			raise ValueError(f'Invalid type for other during "depends_on": {other}')
 
 	def _set_submitted_action(self, action: NodeList):
-		self._submitted_action = action
+		if self._configuration is not None:
+			self._configuration_submitted_actions[self._configuration.name] = action
+		else:
+			self._submitted_action = action
+		self.project.solution._on_action_submitted(self)
+
+	# submits the action for the solution's configurations.
+	# Actions are configuration independent unless they override it (see CPPAction), so they are submitted once.
+	def submit_configurations(self):
+		self.submit_action()
 
 	@abstractmethod
 	def submit_action(self) -> NodeList|None:
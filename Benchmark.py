@@ -0,0 +1,473 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+PACKAGE = __package__
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules imported by a typical SConstruct, and the SCons modules already loaded when it runs
+STARTUP_MODULES = [PACKAGE, f'{PACKAGE}.CPPActions', f'{PACKAGE}.CustomBuilder']
+STARTUP_PRELOAD = ['SCons.Script']
+
+# =================================================================================================
+# * Synthetic solution generator
+# =================================================================================================
+
+# Describes a synthetic solution: `projects` projects nested `fanout` per parent, each with
+# `sources` C++ sources compiled with its own CPPToolset (all toolsets share the same settings,
+# as a toolset also holds the sources of the actions using it), and every action depending on
+# the previous one in chains of `chain_length` actions
+class SyntheticSolutionSpec:
+	def __init__(self, projects: int = 20, sources: int = 10, fanout: int = 4, chain_length: int = 5):
+		self.projects = projects
+		self.sources = sources
+		self.fanout = fanout
+		self.chain_length = chain_length
+
+	def to_dict(self) -> dict[str, int]:
+		return {'projects': self.projects, 'sources': self.sources, 'fanout': self.fanout, 'chain_length': self.chain_length}
+
+	@staticmethod
+	def from_dict(values: dict[str, int]) -> 'SyntheticSolutionSpec':
+		return SyntheticSolutionSpec(**values)
+
+	# path of project i relative to the solution root (nested under its parent project)
+	def project_path(self, index: int) -> str:
+		parts = []
+		while True:
+			parts.append(f'project_{index}')
+			if index == 0:
+				break
+			index = (index - 1) // self.fanout
+		return os.path.join(*reversed(parts))
+
+	def parent_index(self, index: int) -> int|None:
+		if index == 0:
+			return None
+		return (index - 1) // self.fanout
+
+# writes the sources and the SConstruct of a synthetic solution into root
+def generate_solution_tree(root: str, spec: SyntheticSolutionSpec):
+	for project_index in range(spec.projects):
+		project_dir = os.path.join(root, spec.project_path(project_index))
+		os.makedirs(project_dir, exist_ok=True)
+
+		with open(os.path.join(project_dir, 'common.h'), 'w', encoding='utf-8') as f:
+			f.write(f'#pragma once\nnamespace project_{project_index} {{ int common(); }}\n')
+
+		for source_index in range(spec.sources):
+			with open(os.path.join(project_dir, f'source_{source_index}.cpp'), 'w', encoding='utf-8') as f:
+				f.write(f'#include "common.h"\n#include <vector>\n'
+						f'namespace project_{project_index} {{\n'
+						f'int function_{source_index}() {{ std::vector<int> v({source_index} + 1); return (int)v.size(); }}\n'
+						f'}}\n')
+
+	with open(os.path.join(root, 'SConstruct'), 'w', encoding='utf-8') as f:
+		f.write(f'import sys\n'
+				f'sys.path.insert(0, {PACKAGE_PARENT!r})\n'
+				f'import importlib\n'
+				f'benchmark = importlib.import_module({PACKAGE + ".Benchmark"!r})\n'
+				f'spec = benchmark.SyntheticSolutionSpec.from_dict({spec.to_dict()!r})\n'
+				f'solution, actions = benchmark.build_solution(spec, Dir(".").abspath)\n'
+				f'benchmark.submit_solution(solution, actions, spec)\n')
+
+# constructs the Solution, projects and actions of a synthetic solution rooted at root
+def build_solution(spec: SyntheticSolutionSpec, root: str) -> tuple[Any, list[Any]]:
+	from .Solution import Solution
+	from .CPPToolset import CPPToolset, CPPCompiler, CPPStandard
+	from .CPPActions import CPPObjFiles
+
+	solution = Solution('synthetic', root, os.path.join(root, 'out'))
+	projects = []
+	actions = []
+
+	for project_index in range(spec.projects):
+		# a single toolset shared by all projects would compile the sources of every project in each of them
+		toolset = CPPToolset(CPPCompiler.GCC)
+		toolset.set_cpp_standard(CPPStandard.Standard.CPP17)
+		toolset.add_preprocessor_definition('SYNTHETIC_BENCHMARK')
+		solution.add_toolset(f'toolset_{project_index}', toolset)
+
+		parent_index = spec.parent_index(project_index)
+		name = f'project_{project_index}'
+		if parent_index is None:
+			project = solution.create_project(name, name, name)
+		else:
+			project = projects[parent_index].add_sub_project(name, name, name)
+		projects.append(project)
+
+		action = CPPObjFiles(f'toolset_{project_index}', project, 'obj')
+		action.add_sources_in_directory(project.absolute_path)
+		action.include_directories(['.'])
+		actions.append(action)
+
+	return solution, actions
+
+# submits all actions and chains them with depends_on
+def submit_solution(solution: Any, actions: list[Any], spec: SyntheticSolutionSpec):
+	for project in solution.projects:
+		project.submit_action()
+
+	for index, action in enumerate(actions):
+		if index % spec.chain_length != 0:
+			action.depends_on(actions[index - 1])
+
+# =================================================================================================
+# * Measurements
+# =================================================================================================
+
+def median_time(func: Callable[[], Any], repeat: int) -> float:
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		times.append(time.perf_counter() - start)
+	return statistics.median(times)
+
+# construction and submit times and peak Python memory, measured in this process
+def measure_configure(spec: SyntheticSolutionSpec, root: str) -> dict[str, float]:
+	cwd = os.getcwd()
+	os.chdir(root)
+	try:
+		tracemalloc.start()
+		start = time.perf_counter()
+		solution, actions = build_solution(spec, root)
+		construction_time = time.perf_counter() - start
+
+		start = time.perf_counter()
+		submit_solution(solution, actions, spec)
+		submit_time = time.perf_counter() - start
+
+		_, peak_memory = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+	finally:
+		os.chdir(cwd)
+
+	return {
+		'construction_time': construction_time,
+		'submit_time': submit_time,
+		'peak_memory': float(peak_memory),
+	}
+
+# import time of the given modules in a fresh interpreter, parsed from `python -X importtime`, after importing the
+# preloaded modules (e.g. SCons, which is already loaded when an SConstruct imports the package). Returns the total
+# of the modules' packages in seconds and the slowest modules by self time.
+def measure_import_time(modules: list[str], repeat: int = 5, slowest: int = 10, preload: list[str] = [], package_parent: str = PACKAGE_PARENT) -> tuple[float, list[tuple[str, float]]]:
+	env = dict(os.environ)
+	env['PYTHONPATH'] = os.pathsep.join([package_parent] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+	packages = {module.split('.')[0] for module in modules}
+	code = '; '.join(f'import {module}' for module in preload + modules)
+
+	totals = []
+	self_times: dict[str, list[float]] = {}
+	for _ in range(repeat):
+		process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, stderr=subprocess.PIPE, text=True, check=True)
+
+		total = 0.0
+		nested: list[tuple[str, float]] = [] # modules are listed before the module importing them
+		for line in process.stderr.splitlines():
+			if not line.startswith('import time:') or 'cumulative' in line:
+				continue
+			self_us, cumulative_us, name = line[len('import time:'):].split('|')
+			nested.append((name.strip(), int(self_us) / 1e6))
+			if name.startswith('  '):
+				continue
+
+			# a top level import: counted if it's one of the modules, not if it's preloaded (or the interpreter's site)
+			if name.strip().split('.')[0] in packages:
+				total += int(cumulative_us) / 1e6
+				for module, self_time in nested:
+					self_times.setdefault(module, []).append(self_time)
+			nested = []
+		totals.append(total)
+
+	slowest_modules = sorted(((name, statistics.median(times)) for name, times in self_times.items()), key=lambda item: item[1], reverse=True)
+	return statistics.median(totals), slowest_modules[:slowest]
+
+def run_scons(root: str, jobs: int, arguments: list[str] = []):
+	subprocess.run([sys.executable, '-m', 'SCons', '-Q', f'-j{jobs}'] + arguments, cwd=root, check=True, stdout=subprocess.DEVNULL)
+
+# full, no-op and one-file-edit build times, measured by running SCons on the generated tree
+def measure_builds(spec: SyntheticSolutionSpec, root: str, jobs: int, repeat: int) -> dict[str, float]:
+	results = {}
+
+	start = time.perf_counter()
+	run_scons(root, jobs)
+	results['full_build_time'] = time.perf_counter() - start
+
+	results['noop_build_time'] = median_time(lambda: run_scons(root, jobs), repeat)
+
+	edited_source = os.path.join(root, spec.project_path(spec.projects - 1), 'source_0.cpp')
+	def edit_and_build():
+		with open(edited_source, 'a', encoding='utf-8') as f:
+			f.write('// edit\n')
+		run_scons(root, jobs)
+	results['edit_build_time'] = median_time(edit_and_build, repeat)
+
+	return results
+
+# time to compute the content signatures of `files` files of `size` bytes, with SCons' own hashing
+# and with ContentHasher (cold sequentially, cold in parallel and warm from its stat cache)
+def measure_signatures(files: int = 20, size: int = 32 * 1024 * 1024) -> dict[str, float]:
+	import SCons.Util
+	from .ContentHash import ContentHasher
+
+	root = tempfile.mkdtemp(prefix='metascons_signatures_')
+	try:
+		paths = []
+		for index in range(files):
+			path = os.path.join(root, f'output_{index}.bin')
+			with open(path, 'wb') as f:
+				f.write(os.urandom(size))
+			paths.append(path)
+		past = time.time() - 60 # out of the racy interval, so the hashes are cached
+		for path in paths:
+			os.utime(path, (past, past))
+
+		results = {}
+
+		start = time.perf_counter()
+		for path in paths:
+			SCons.Util.hash_file_signature(path, 64 * 1024)
+		results['scons_signature_time'] = time.perf_counter() - start
+
+		cache_path = os.path.join(root, 'content_hashes.json')
+		hasher = ContentHasher(cache_path)
+		start = time.perf_counter()
+		for path in paths:
+			hasher.hash_file(path)
+		results['cold_signature_time'] = time.perf_counter() - start
+		hasher.shutdown()
+
+		hasher = ContentHasher(cache_path)
+		start = time.perf_counter()
+		hasher.prefetch(paths)
+		for path in paths:
+			hasher.hash_file(path)
+		results['parallel_signature_time'] = time.perf_counter() - start
+		hasher.save()
+		hasher.shutdown()
+
+		hasher = ContentHasher(cache_path)
+		start = time.perf_counter()
+		for path in paths:
+			hasher.hash_file(path)
+		results['warm_signature_time'] = time.perf_counter() - start
+		hasher.shutdown()
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+	return results
+
+# objects of size bytes each (data assembled from a file, so they are quick to generate), in root
+def generate_objects(root: str, count: int, size: int) -> list[str]:
+	blob_path = os.path.join(root, 'blob.bin')
+	with open(blob_path, 'wb') as f:
+		f.write(os.urandom(size))
+
+	objects = []
+	for index in range(count):
+		assembly_path = os.path.join(root, f'object_{index}.s')
+		with open(assembly_path, 'w', encoding='utf-8') as f:
+			f.write(f'\t.globl data_{index}\n\t.section .rodata\ndata_{index}:\n\t.incbin "{blob_path}"\n')
+		objects.append(os.path.join(root, f'object_{index}.o'))
+		subprocess.run(['gcc', '-c', assembly_path, '-o', objects[-1]], check=True)
+	return objects
+
+# archive time and size of full archives (with ranlib, as SCons creates them by default),
+# thin deterministic archives, and thin archives split in parts archived in parallel
+def measure_archives(objects: int = 200, size: int = 256 * 1024, objects_per_archive: int = 50) -> dict[str, float]:
+	from concurrent.futures import ThreadPoolExecutor
+
+	if shutil.which('ar') is None or shutil.which('gcc') is None:
+		raise Exception('Measuring archives requires ar and gcc')
+
+	root = tempfile.mkdtemp(prefix='metascons_archives_')
+	try:
+		paths = generate_objects(root, objects, size)
+		results = {}
+
+		def archive(path: str, flags: str, members: list[str]):
+			if os.path.exists(path):
+				os.remove(path)
+			subprocess.run(['ar', flags, path] + members, check=True)
+
+		full_path = os.path.join(root, 'libfull.a')
+		def full_archive():
+			archive(full_path, 'rc', paths)
+			subprocess.run(['ranlib', full_path], check=True)
+		results['full_archive_time'] = median_time(full_archive, 3)
+		results['full_archive_size'] = os.path.getsize(full_path)
+
+		thin_path = os.path.join(root, 'libthin.a')
+		results['thin_archive_time'] = median_time(lambda: archive(thin_path, 'rcTDs', paths), 3)
+		results['thin_archive_size'] = os.path.getsize(thin_path)
+
+		split_path = os.path.join(root, 'libsplit.a')
+		chunks = [paths[index:index + objects_per_archive] for index in range(0, len(paths), objects_per_archive)]
+		part_paths = [os.path.join(root, f'libpart{index}.a') for index in range(len(chunks))]
+		def split_archive():
+			with ThreadPoolExecutor() as executor:
+				list(executor.map(lambda part: archive(part[0], 'rcTDs', part[1]), zip(part_paths, chunks)))
+			archive(split_path, 'rcTDs', part_paths)
+		results['split_thin_archive_time'] = median_time(split_archive, 3)
+		results['split_thin_archive_size'] = os.path.getsize(split_path) + sum(os.path.getsize(path) for path in part_paths)
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+	return results
+
+# per command time of running true through sh -c (as SCons does) and with posix_spawn, from a process
+# with heap_size bytes of touched memory (the page tables a fork copies, as in a large SCons process)
+def measure_spawn(commands: int = 500, heap_size: int = 512 * 1024 * 1024) -> dict[str, float]:
+	from .Spawn import spawn_direct, spawn_shell
+
+	heap = bytearray(heap_size)
+	for index in range(0, heap_size, 4096):
+		heap[index] = 1
+
+	env = dict(os.environ)
+	sh = shutil.which('sh') or '/bin/sh'
+	program = shutil.which('true') or '/bin/true' # not the shell's builtin
+	results = {}
+	results['shell_spawn_time'] = median_time(lambda: [spawn_shell(sh, program, env) for _ in range(commands)], 3) / commands
+	results['direct_spawn_time'] = median_time(lambda: [spawn_direct(['true'], env) for _ in range(commands)], 3) / commands
+	del heap
+	return results
+
+def run_benchmarks(spec: SyntheticSolutionSpec, jobs: int = 4, repeat: int = 3, builds: bool = True) -> dict[str, Any]:
+	root = tempfile.mkdtemp(prefix='metascons_benchmark_')
+	try:
+		generate_solution_tree(root, spec)
+		results = {'import_time': measure_import_time(STARTUP_MODULES, repeat, preload=STARTUP_PRELOAD)[0]}
+		results.update(measure_configure(spec, root))
+		if builds:
+			results.update(measure_builds(spec, root, jobs, repeat))
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+	return {
+		'metadata': {
+			'spec': spec.to_dict(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		},
+		'results': results,
+	}
+
+# =================================================================================================
+# * Regression comparison
+# =================================================================================================
+
+# returns the metrics of current that regressed by more than tolerance (a fraction) compared to
+# baseline. Differences below min_delta (in the metric's unit) are considered noise.
+def compare_results(current: dict[str, Any], baseline: dict[str, Any], tolerance: float = 0.1, min_delta: float = 0.005) -> list[str]:
+	regressions = []
+	for metric, baseline_value in baseline['results'].items():
+		if metric not in current['results']:
+			continue
+		current_value = current['results'][metric]
+		if current_value - baseline_value > max(baseline_value * tolerance, min_delta):
+			regressions.append(f'{metric}: {baseline_value:.4f} -> {current_value:.4f} (+{(current_value / baseline_value - 1) * 100 if baseline_value else float("inf"):.1f}%)')
+	return regressions
+
+def main(argv: list[str]|None = None) -> int:
+	parser = argparse.ArgumentParser(prog=f'python -m {PACKAGE}.Benchmark', description='MetaSCons performance benchmarks')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	run_parser = commands.add_parser('run', help='generate a synthetic solution and measure it')
+	run_parser.add_argument('--projects', type=int, default=20)
+	run_parser.add_argument('--sources', type=int, default=10)
+	run_parser.add_argument('--fanout', type=int, default=4)
+	run_parser.add_argument('--chain-length', type=int, default=5)
+	run_parser.add_argument('--jobs', type=int, default=4)
+	run_parser.add_argument('--repeat', type=int, default=3)
+	run_parser.add_argument('--no-builds', action='store_true', help='only measure construction and submit')
+	run_parser.add_argument('--output', help='write the results as JSON to this file')
+	run_parser.add_argument('--baseline', help='compare the results against this JSON file')
+	run_parser.add_argument('--tolerance', type=float, default=0.1)
+
+	compare_parser = commands.add_parser('compare', help='compare two result files')
+	compare_parser.add_argument('current')
+	compare_parser.add_argument('baseline')
+	compare_parser.add_argument('--tolerance', type=float, default=0.1)
+
+	import_time_parser = commands.add_parser('import-time', help='measure the import time of the package')
+	import_time_parser.add_argument('--budget', type=float, help='fail if the import time exceeds this many milliseconds')
+	import_time_parser.add_argument('--repeat', type=int, default=5)
+
+	signatures_parser = commands.add_parser('signatures', help='measure content signature computation of large files')
+	signatures_parser.add_argument('--files', type=int, default=20)
+	signatures_parser.add_argument('--size', type=int, default=32, help='size of each file in MiB')
+
+	archives_parser = commands.add_parser('archives', help='measure full, thin and split thin static library archives')
+	archives_parser.add_argument('--objects', type=int, default=200)
+	archives_parser.add_argument('--size', type=int, default=256, help='size of each object in KiB')
+	archives_parser.add_argument('--objects-per-archive', type=int, default=50)
+
+	spawn_parser = commands.add_parser('spawn', help='measure the cost of spawning a command')
+	spawn_parser.add_argument('--commands', type=int, default=500)
+	spawn_parser.add_argument('--heap', type=int, default=512, help='memory of the spawning process in MiB')
+
+	args = parser.parse_args(argv)
+
+	if args.command == 'spawn':
+		for metric, value in measure_spawn(args.commands, args.heap * 1024 * 1024).items():
+			print(f'{metric}: {value * 1000000:.1f}us')
+		return 0
+
+	if args.command == 'archives':
+		for metric, value in measure_archives(args.objects, args.size * 1024, args.objects_per_archive).items():
+			print(f'{metric}: {value / 1024:.1f}KiB' if metric.endswith('_size') else f'{metric}: {value * 1000:.2f}ms')
+		return 0
+
+	if args.command == 'signatures':
+		for metric, value in measure_signatures(args.files, args.size * 1024 * 1024).items():
+			print(f'{metric}: {value * 1000:.2f}ms')
+		return 0
+
+	if args.command == 'import-time':
+		total, slowest_modules = measure_import_time(STARTUP_MODULES, args.repeat, preload=STARTUP_PRELOAD)
+		for name, self_time in slowest_modules:
+			print(f'{self_time * 1000:8.2f}ms  {name}')
+		print(f'import time: {total * 1000:.2f}ms')
+		if args.budget is not None and total * 1000 > args.budget:
+			print(f'REGRESSION import time {total * 1000:.2f}ms exceeds the budget of {args.budget:.2f}ms', file=sys.stderr)
+			return 1
+		return 0
+
+	if args.command == 'run':
+		spec = SyntheticSolutionSpec(args.projects, args.sources, args.fanout, args.chain_length)
+		current = run_benchmarks(spec, args.jobs, args.repeat, not args.no_builds)
+		print(json.dumps(current, indent=2))
+		if args.output:
+			with open(args.output, 'w', encoding='utf-8') as f:
+				json.dump(current, f, indent=2)
+		if not args.baseline:
+			return 0
+		baseline_path = args.baseline
+	else:
+		with open(args.current, 'r', encoding='utf-8') as f:
+			current = json.load(f)
+		baseline_path = args.baseline
+
+	with open(baseline_path, 'r', encoding='utf-8') as f:
+		baseline = json.load(f)
+
+	regressions = compare_results(current, baseline, args.tolerance)
+	for regression in regressions:
+		print(f'REGRESSION {regression}', file=sys.stderr)
+	return 1 if len(regressions) > 0 else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,266 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+
+# suffixes of the targets of compile and archive commands, other commands of object files are links
+OBJECT_SUFFIXES = ('.o', '.os', '.obj')
+ARCHIVE_SUFFIXES = ('.a', '.lib')
+
+# maximum increase (a fraction) of each run metric over the baseline before the comparison fails.
+# The cache hit rate is a fraction of the cached targets, so its threshold is the maximum decrease.
+DEFAULT_THRESHOLDS = {
+	'total_time': 0.1,
+	'configure_time': 0.2,
+	'compile_time': 0.1,
+	'link_time': 0.1,
+	'peak_rss': 0.2,
+	'cache_hit_rate': 0.1,
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	started REAL NOT NULL,
+	command_line TEXT NOT NULL,
+	exit_code INTEGER NOT NULL,
+	total_time REAL NOT NULL,
+	configure_time REAL NOT NULL,
+	compile_time REAL NOT NULL,
+	link_time REAL NOT NULL,
+	commands INTEGER NOT NULL,
+	cache_hits INTEGER NOT NULL,
+	cache_misses INTEGER NOT NULL,
+	peak_rss INTEGER NOT NULL,
+	scons_peak_rss INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS targets (
+	run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+	target TEXT NOT NULL,
+	kind TEXT NOT NULL,
+	duration REAL NOT NULL,
+	peak_rss INTEGER,
+	exit_code INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS targets_by_target ON targets(target, run_id);
+'''
+
+# the kind of a command: 'compile', 'archive', 'link' or 'other'
+def command_kind(target: str|None, args: list[str]) -> str:
+	if target is not None and target.endswith(OBJECT_SUFFIXES):
+		return 'compile'
+	if target is not None and target.endswith(ARCHIVE_SUFFIXES):
+		return 'archive'
+	if any(arg.strip('"').endswith(OBJECT_SUFFIXES + ARCHIVE_SUFFIXES) for arg in args[1:]):
+		return 'link'
+	return 'other'
+
+# peak RSS of the SCons process in bytes
+def scons_peak_rss() -> int:
+	try:
+		import resource
+		from .ResourceMonitor import rusage_to_bytes
+		return rusage_to_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+	except ImportError:
+		return 0
+
+def connect(path: str) -> sqlite3.Connection:
+	connection = sqlite3.connect(path, timeout=30)
+	connection.row_factory = sqlite3.Row
+	connection.execute('PRAGMA foreign_keys = ON')
+	connection.executescript(SCHEMA)
+	return connection
+
+
+# Records the metrics of a build (see Solution.enable_build_history): the duration, peak RSS and exit code of every
+# command run by the Spawner, the time SCons took before running the first command (reading the build scripts and
+# scanning the graph), the cache hits and the peak RSS. The run is appended to a SQLite database when SCons exits,
+# keeping the last max_runs runs.
+class BuildHistory:
+	def __init__(self, path: str, max_runs: int = 1000):
+		self.path = path
+		self.max_runs = max_runs
+		self.started = time.time()
+		self.first_command_started: float|None = None
+		self.targets: list[tuple[str, str, float, int|None, int]] = []
+		self._lock = threading.Lock()
+
+		try:
+			import SCons.Script
+			self.started = SCons.Script.start_time
+		except (ImportError, AttributeError):
+			pass
+
+	# called by the Spawner right before a command starts
+	def command_started(self):
+		if self.first_command_started is None:
+			self.first_command_started = time.time()
+
+	# called by the Spawner for every command that finished
+	def record(self, target: str|None, args: list[str], duration: float, peak_rss: int|None, exit_code: int):
+		with self._lock:
+			self.targets.append((target if target is not None else ' '.join(args), command_kind(target, args), duration, peak_rss, exit_code))
+
+	# appends the run to the database, returns its id
+	def save(self, command_line: str, exit_code: int, cache_hits: int, cache_misses: int) -> int:
+		finished = time.time()
+		with self._lock:
+			targets = list(self.targets)
+
+		configure_time = (self.first_command_started if self.first_command_started is not None else finished) - self.started
+		compile_time = sum(duration for _, kind, duration, _, _ in targets if kind == 'compile')
+		link_time = sum(duration for _, kind, duration, _, _ in targets if kind in ('link', 'archive'))
+		peak_rss = max([rss for _, _, _, rss, _ in targets if rss is not None], default=0)
+
+		os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		connection = connect(self.path)
+		try:
+			with connection:
+				cursor = connection.execute(
+					'INSERT INTO runs (started, command_line, exit_code, total_time, configure_time, compile_time, link_time, commands, cache_hits, cache_misses, peak_rss, scons_peak_rss) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+					(self.started, command_line, exit_code, finished - self.started, configure_time, compile_time, link_time, len(targets), cache_hits, cache_misses, peak_rss, scons_peak_rss()))
+				run_id = cursor.lastrowid
+				connection.executemany('INSERT INTO targets (run_id, target, kind, duration, peak_rss, exit_code) VALUES (?, ?, ?, ?, ?, ?)',
+					[(run_id, *target) for target in targets])
+				connection.execute('DELETE FROM runs WHERE id <= ?', (run_id - self.max_runs,))
+		finally:
+			connection.close()
+		return run_id # type: ignore
+
+
+# metrics of a run compared against the baseline: the run's value of the metric
+def run_metrics(run: sqlite3.Row) -> dict[str, float]:
+	cached = run['cache_hits'] + run['cache_misses']
+	metrics = {
+		'total_time': run['total_time'],
+		'configure_time': run['configure_time'],
+		'compile_time': run['compile_time'],
+		'link_time': run['link_time'],
+		'peak_rss': float(max(run['peak_rss'], run['scons_peak_rss'])),
+	}
+	if cached > 0:
+		metrics['cache_hit_rate'] = run['cache_hits'] / cached
+	return metrics
+
+# returns the regressions of the latest run compared to the median of the baseline_runs successful runs before it
+# with the same command line and a similar amount of work (between 1/command_ratio and command_ratio times its
+# number of commands, so up to date builds are only compared with each other): run metrics over their threshold
+# (see DEFAULT_THRESHOLDS), and targets whose command took more than target_threshold (a fraction) and min_seconds
+# longer than their median in the baseline
+def compare_latest(path: str, baseline_runs: int = 5, thresholds: dict[str, float] = DEFAULT_THRESHOLDS, target_threshold: float|None = 0.5, min_seconds: float = 0.5, command_ratio: float = 2.0) -> list[str]:
+	connection = connect(path)
+	try:
+		latest = connection.execute('SELECT * FROM runs ORDER BY id DESC LIMIT 1').fetchone()
+		if latest is None:
+			raise ValueError(f'No runs recorded in {path}')
+
+		baseline = connection.execute('SELECT * FROM runs WHERE id < ? AND exit_code = 0 AND command_line = ? AND commands BETWEEN ? AND ? ORDER BY id DESC LIMIT ?',
+			(latest['id'], latest['command_line'], latest['commands'] / command_ratio, latest['commands'] * command_ratio, baseline_runs)).fetchall()
+		if len(baseline) == 0:
+			return []
+
+		regressions = []
+		latest_metrics = run_metrics(latest)
+		baseline_metrics = [run_metrics(run) for run in baseline]
+		for metric, threshold in thresholds.items():
+			values = [metrics[metric] for metrics in baseline_metrics if metric in metrics]
+			if metric not in latest_metrics or len(values) == 0:
+				continue
+
+			current_value = latest_metrics[metric]
+			baseline_value = statistics.median(values)
+			if metric == 'cache_hit_rate':
+				if baseline_value - current_value > threshold:
+					regressions.append(f'{metric}: {baseline_value * 100:.1f}% -> {current_value * 100:.1f}%')
+			elif current_value - baseline_value > baseline_value * threshold and current_value - baseline_value > (min_seconds if metric.endswith('_time') else 0):
+				regressions.append(f'{metric}: {baseline_value:.2f} -> {current_value:.2f} (+{(current_value / baseline_value - 1) * 100 if baseline_value else float("inf"):.1f}%)')
+
+		if target_threshold is not None:
+			baseline_ids = [run['id'] for run in baseline]
+			durations: dict[str, list[float]] = {}
+			rows = connection.execute(f'SELECT target, duration FROM targets WHERE exit_code = 0 AND run_id IN ({",".join("?" * len(baseline_ids))})', baseline_ids)
+			for row in rows:
+				durations.setdefault(row['target'], []).append(row['duration'])
+
+			for row in connection.execute('SELECT target, duration FROM targets WHERE run_id = ? AND exit_code = 0 ORDER BY duration DESC', (latest['id'],)):
+				if row['target'] not in durations:
+					continue
+				baseline_value = statistics.median(durations[row['target']])
+				if row['duration'] - baseline_value > max(baseline_value * target_threshold, min_seconds):
+					regressions.append(f'{row["target"]}: {baseline_value:.2f}s -> {row["duration"]:.2f}s')
+		return regressions
+	finally:
+		connection.close()
+
+# median duration of the successful compile commands of each target over the last runs
+def compile_costs(path: str, runs: int = 20) -> dict[str, float]:
+	connection = connect(path)
+	try:
+		durations: dict[str, list[float]] = {}
+		rows = connection.execute("SELECT target, duration FROM targets WHERE kind = 'compile' AND exit_code = 0 AND run_id > (SELECT COALESCE(MAX(id), 0) FROM runs) - ?", (runs,))
+		for row in rows:
+			durations.setdefault(row['target'], []).append(row['duration'])
+	finally:
+		connection.close()
+	return {target: statistics.median(values) for target, values in durations.items()}
+
+def print_runs(path: str, count: int):
+	connection = connect(path)
+	try:
+		runs = connection.execute('SELECT * FROM runs ORDER BY id DESC LIMIT ?', (count,)).fetchall()
+	finally:
+		connection.close()
+
+	print(f'{"run":>6} {"started":<19} {"exit":>4} {"total":>8} {"configure":>9} {"compile":>8} {"link":>8} {"commands":>8} {"cache":>6} {"peak RSS":>9}')
+	for run in reversed(runs):
+		metrics = run_metrics(run)
+		cache = f'{metrics["cache_hit_rate"] * 100:.0f}%' if 'cache_hit_rate' in metrics else '-'
+		started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started']))
+		print(f'{run["id"]:>6} {started:<19} {run["exit_code"]:>4} {run["total_time"]:>7.1f}s {run["configure_time"]:>8.1f}s {run["compile_time"]:>7.1f}s {run["link_time"]:>7.1f}s {run["commands"]:>8} {cache:>6} {metrics["peak_rss"] / (1024 * 1024):>6.0f}MiB')
+
+def parse_thresholds(values: list[str]) -> dict[str, float]:
+	thresholds = dict(DEFAULT_THRESHOLDS)
+	for value in values:
+		metric, _, threshold = value.partition('=')
+		if metric not in DEFAULT_THRESHOLDS:
+			raise ValueError(f'Unknown metric {metric}, expected one of {list(DEFAULT_THRESHOLDS.keys())}')
+		if threshold == '':
+			del thresholds[metric]
+		else:
+			thresholds[metric] = float(threshold)
+	return thresholds
+
+def main(argv: list[str]|None = None) -> int:
+	parser = argparse.ArgumentParser(prog=f'python -m {__package__}.BuildHistory', description='Shows and compares the build metrics recorded by Solution.enable_build_history')
+	parser.add_argument('--history', default=os.path.join('.metascons', 'history.sqlite'), help='path of the history database (<output root>/.metascons/history.sqlite)')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	show_parser = commands.add_parser('show', help='print the last runs')
+	show_parser.add_argument('--count', type=int, default=20)
+
+	compare_parser = commands.add_parser('compare', help='compare the latest run against the median of the previous runs, exits with 1 on regressions')
+	compare_parser.add_argument('--baseline-runs', type=int, default=5)
+	compare_parser.add_argument('--threshold', action='append', default=[], metavar='METRIC=FRACTION', help=f'maximum increase of a metric (decrease of cache_hit_rate), empty to ignore it. Defaults: {DEFAULT_THRESHOLDS}')
+	compare_parser.add_argument('--target-threshold', type=float, default=0.5, help='maximum increase (a fraction) of the duration of a target')
+	compare_parser.add_argument('--min-seconds', type=float, default=0.5, help='ignore time increases smaller than this')
+	compare_parser.add_argument('--command-ratio', type=float, default=2.0, help='compare only with runs that ran between 1/RATIO and RATIO times as many commands')
+	args = parser.parse_args(argv)
+
+	if not os.path.isfile(args.history):
+		print(f'No build history at {args.history}', file=sys.stderr)
+		return 2
+
+	if args.command == 'show':
+		print_runs(args.history, args.count)
+		return 0
+
+	regressions = compare_latest(args.history, args.baseline_runs, parse_thresholds(args.threshold), args.target_threshold, args.min_seconds, args.command_ratio)
+	for regression in regressions:
+		print(f'REGRESSION {regression}', file=sys.stderr)
+	return 1 if len(regressions) > 0 else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
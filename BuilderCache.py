@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+def _file_digest(path: str) -> str:
+	digest = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1024 * 1024), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+# Content addressed cache of the targets of Python builder functions (see CustomBuildAction.set_use_cache).
+# A result is keyed by the function's code (its SCons signature), the targets' paths and the sources' contents.
+# On a hit, the targets (which SCons removed before building them) are copied from the store.
+# The store is bounded to max_size bytes, evicting the least recently used results.
+#
+# Layout: <path>/results/<key>.json (the targets' blob digests and the time it took to build them),
+# <path>/blobs/<digest[:2]>/<digest> (the targets' contents)
+class BuilderCache:
+	def __init__(self, path: str, max_size: int = 1024 * 1024 * 1024):
+		self.path = path
+		self.max_size = max_size
+		self._lock = threading.Lock()
+
+		self.hits = 0
+		self.misses = 0
+		self.time_saved = 0.0
+
+	def _result_path(self, key: str) -> str:
+		return os.path.join(self.path, 'results', f'{key}.json')
+
+	def _blob_path(self, digest: str) -> str:
+		return os.path.join(self.path, 'blobs', digest[:2], digest)
+
+	def key(self, function_signature: bytes, target, source) -> str:
+		digest = hashlib.sha1(function_signature)
+		for node in target:
+			digest.update(f'target\0{node.get_path()}\0'.encode())
+		for node in source:
+			digest.update(f'source\0{node.get_path()}\0{node.get_csig()}\0'.encode())
+		return digest.hexdigest()
+
+	# restores the cached targets of the key, returns False if there are none
+	def restore(self, key: str, target) -> bool:
+		result_path = self._result_path(key)
+		try:
+			with open(result_path, 'r', encoding='utf-8') as f:
+				result = json.load(f)
+			paths = [node.get_abspath() for node in target]
+			if len(paths) != len(result['targets']):
+				raise ValueError('Targets mismatch')
+
+			for path, digest in zip(paths, result['targets']):
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+				shutil.copyfile(self._blob_path(digest), temp_path)
+				os.replace(temp_path, path)
+			os.utime(result_path) # most recently used
+		except (OSError, ValueError, KeyError):
+			with self._lock:
+				self.misses += 1
+			return False
+
+		with self._lock:
+			self.hits += 1
+			self.time_saved += result.get('duration', 0.0)
+		return True
+
+	# stores the targets of a successful build that took duration seconds
+	def store(self, key: str, target, duration: float):
+		try:
+			digests = []
+			for node in target:
+				path = node.get_abspath()
+				digest = _file_digest(path)
+				blob_path = self._blob_path(digest)
+				if not os.path.exists(blob_path):
+					os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+					temp_path = f'{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+					shutil.copyfile(path, temp_path)
+					os.replace(temp_path, blob_path)
+				digests.append(digest)
+
+			result_path = self._result_path(key)
+			os.makedirs(os.path.dirname(result_path), exist_ok=True)
+			temp_path = f'{result_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+			with open(temp_path, 'w', encoding='utf-8') as f:
+				json.dump({'targets': digests, 'duration': duration}, f)
+			os.replace(temp_path, result_path)
+		except OSError as e:
+			print(f'Failed to cache {[str(node) for node in target]}: {e}', file=sys.stderr)
+
+	# removes the least recently used results until the store fits in max_size, then the blobs no result uses
+	def evict(self):
+		results_path = os.path.join(self.path, 'results')
+		blobs_path = os.path.join(self.path, 'blobs')
+		if not os.path.isdir(results_path):
+			return
+
+		results: list[tuple[float, str, list[str]]] = []
+		for name in os.listdir(results_path):
+			path = os.path.join(results_path, name)
+			try:
+				with open(path, 'r', encoding='utf-8') as f:
+					digests = json.load(f)['targets']
+				results.append((os.path.getmtime(path), path, digests))
+			except (OSError, ValueError, KeyError):
+				continue
+
+		blob_sizes: dict[str, int] = {}
+		for directory, _, names in os.walk(blobs_path):
+			for name in names:
+				if not name.endswith('.tmp'):
+					blob_sizes[name] = os.path.getsize(os.path.join(directory, name))
+
+		# most recently used first, keeping results while their blobs fit
+		results.sort(reverse=True)
+		kept_blobs: set[str] = set()
+		size = 0
+		for _, path, digests in results:
+			new_blobs = set(digests) - kept_blobs
+			result_size = sum(blob_sizes.get(digest, 0) for digest in new_blobs)
+			if size + result_size <= self.max_size:
+				size += result_size
+				kept_blobs |= new_blobs
+			else:
+				os.remove(path)
+
+		for digest in blob_sizes.keys() - kept_blobs:
+			try:
+				os.remove(self._blob_path(digest))
+			except OSError:
+				pass
+
+	def summary(self) -> str:
+		return f'Builder cache: {self.hits} hits, {self.misses} misses, {self.time_saved:.1f}s saved'
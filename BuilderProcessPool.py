@@ -0,0 +1,210 @@
+import io
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Callable
+
+# builder functions by key. Workers are forked, so they have the functions registered before they started,
+# including the ones that can't be pickled (e.g. defined in an SConstruct)
+_functions: dict[int, Callable[..., Any]] = {}
+
+def register_function(func: Callable[..., Any]) -> int:
+	_functions[id(func)] = func
+	return id(func)
+
+# picklable copy of a construction variable value, or None if it isn't made of plain values
+def _plain_value(value: Any) -> Any:
+	if value is None or isinstance(value, (str, int, float, bool)):
+		return value
+	if isinstance(value, (list, tuple)) or type(value).__name__ == 'CLVar':
+		items = [_plain_value(item) for item in value]
+		return None if any(item is None for item in items) else items
+	if isinstance(value, dict):
+		items = {key: _plain_value(item) for key, item in value.items() if isinstance(key, str)}
+		return None if any(item is None for item in items.values()) else items
+	return None
+
+
+# A node of SCons passed to a builder function running in a worker: the target or source file by path
+class PathShim:
+	def __init__(self, path: str, abspath: str):
+		self.path = path
+		self.abspath = abspath
+		self.name = os.path.basename(path)
+
+	def get_path(self) -> str:
+		return self.path
+
+	def get_abspath(self) -> str:
+		return self.abspath
+
+	def exists(self) -> bool:
+		return os.path.exists(self.abspath)
+
+	def get_contents(self) -> bytes:
+		with open(self.abspath, 'rb') as f:
+			return f.read()
+
+	def get_text_contents(self) -> str:
+		return self.get_contents().decode(errors='replace')
+
+	def __str__(self) -> str:
+		return self.path
+
+	def __repr__(self) -> str:
+		return repr(self.path)
+
+	def __fspath__(self) -> str:
+		return self.abspath
+
+
+# An environment passed to a builder function running in a worker: a snapshot of the construction variables with plain
+# values, with the common read-only methods (variable substitution is plain $VAR and ${VAR} expansion)
+class EnvironmentSnapshot:
+	_variable_pattern = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+
+	def __init__(self, variables: dict[str, Any]):
+		self.variables = variables
+
+	@staticmethod
+	def of(env) -> 'EnvironmentSnapshot':
+		variables = {}
+		for key, value in env.Dictionary().items():
+			value = _plain_value(value)
+			if value is not None:
+				variables[key] = value
+		return EnvironmentSnapshot(variables)
+
+	def __getitem__(self, key: str) -> Any:
+		return self.variables[key]
+
+	def __contains__(self, key: str) -> bool:
+		return key in self.variables
+
+	def get(self, key: str, default: Any = None) -> Any:
+		return self.variables.get(key, default)
+
+	def Dictionary(self) -> dict[str, Any]:
+		return self.variables
+
+	def subst(self, string: str, depth: int = 0) -> str:
+		def replace(match: re.Match) -> str:
+			value = self.variables.get(match.group(1) or match.group(2), '')
+			value = ' '.join(str(item) for item in value) if isinstance(value, list) else str(value)
+			return self.subst(value, depth + 1) if depth < 16 else value
+		return self._variable_pattern.sub(replace, string)
+
+	def WhereIs(self, program: str, path: str|None = None) -> str|None:
+		if path is None:
+			path = self.variables.get('ENV', {}).get('PATH')
+		if isinstance(path, list):
+			path = os.pathsep.join(path)
+		return shutil.which(program, path=path)
+
+
+# result of a builder function run in a worker: its return value (or exit code), its output, and its exception
+class WorkerResult:
+	def __init__(self, result: Any, stdout: str, stderr: str, exception: BaseException|None = None, traceback_text: str = ''):
+		self.result = result
+		self.stdout = stdout
+		self.stderr = stderr
+		self.exception = exception
+		self.traceback_text = traceback_text
+
+def _warm_up() -> int:
+	return os.getpid()
+
+def _run_function(key: int, pickled_function: bytes|None, targets: list[tuple[str, str]], sources: list[tuple[str, str]], env: EnvironmentSnapshot, cwd: str) -> WorkerResult|None:
+	func = _functions.get(key)
+	if func is None and pickled_function is not None:
+		try:
+			func = pickle.loads(pickled_function)
+		except Exception:
+			func = None
+	if func is None:
+		return None # registered after the worker started: the caller runs it
+
+	if os.getcwd() != cwd:
+		os.chdir(cwd)
+
+	stdout = io.StringIO()
+	stderr = io.StringIO()
+	exception = None
+	traceback_text = ''
+	result = None
+	with redirect_stdout(stdout), redirect_stderr(stderr):
+		try:
+			result = func(target=[PathShim(*target) for target in targets], source=[PathShim(*source) for source in sources], env=env)
+		except SystemExit as e:
+			result = e.code if isinstance(e.code, int) else 1
+			if e.code is not None and not isinstance(e.code, int):
+				print(e.code, file=sys.stderr)
+		except Exception as e:
+			exception = e
+			traceback_text = traceback.format_exc()
+
+	if exception is not None:
+		try:
+			pickle.dumps(exception)
+		except Exception:
+			exception = Exception(f'{type(exception).__name__}: {exception}')
+	try:
+		pickle.dumps(result)
+	except Exception:
+		result = 1 if result else None
+	return WorkerResult(result, stdout.getvalue(), stderr.getvalue(), exception, traceback_text)
+
+
+# Persistent pool of worker processes running the Python builder functions of CustomBuildActions, so they don't
+# serialize on the GIL of the SCons process. Workers are started (forked where possible) when first needed and reused.
+class BuilderProcessPool:
+	def __init__(self, max_workers: int|None = None):
+		self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+		self._executor: ProcessPoolExecutor|None = None
+		self._lock = threading.Lock()
+		if hasattr(os, 'register_at_fork'):
+			os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+	# a forked child can't use the parent's workers: start its own when needed
+	def _after_fork_in_child(self):
+		self._executor = None
+		self._lock = threading.Lock()
+
+	def _ensure_executor(self) -> ProcessPoolExecutor:
+		with self._lock:
+			if self._executor is None:
+				method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+				self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context(method))
+			return self._executor
+
+	# starts the workers ahead of the build
+	def warm_up(self):
+		executor = self._ensure_executor()
+		for _ in range(self.max_workers):
+			executor.submit(_warm_up)
+
+	# runs the function in a worker; returns None if the worker doesn't have the function
+	def run(self, func: Callable[..., Any], target, source, env) -> WorkerResult|None:
+		key = register_function(func)
+		try:
+			pickled_function = pickle.dumps(func)
+		except Exception:
+			pickled_function = None
+
+		targets = [(str(node), node.get_abspath()) for node in target]
+		sources = [(str(node), node.get_abspath()) for node in source]
+		future = self._ensure_executor().submit(_run_function, key, pickled_function, targets, sources, EnvironmentSnapshot.of(env), os.getcwd())
+		return future.result()
+
+	def shutdown(self):
+		with self._lock:
+			if self._executor is not None:
+				self._executor.shutdown(wait=True, cancel_futures=True)
+				self._executor = None
@@ -1,24 +1,33 @@
+import copy
 import fnmatch
-from json import tool
-import re
-import subprocess
 from sys import platform
 import sys
 from SCons.Environment import Environment
 from SCons.Node import NodeList
 from enum import Enum
-from typing import List, Union, cast
+from typing import TYPE_CHECKING, List, Union, cast
 
 from .CustomBuilder import CustomBuildAction
 from .Action import Action
 from .CPPEnvironment import CPPEnvironment
-from .CPPToolset import CPPCompiler, CPPToolset
+from .CPPModules import MODULE_INTERFACE_SUFFIXES, ModuleDependencies, module_file_name
+from .CPPToolset import CPPCompiler, CPPProfileGuidedOptimization, CPPToolset
 from .Project import Project
+from .UsageRequirements import UsageRequirements, LinkGroup, unique_first, unique_last, expand_link_groups
 from abc import ABC, abstractmethod
 import os
 import glob
 import os
 
+if TYPE_CHECKING:
+	from .Configuration import Configuration
+
+# sources of tests, built by CPPTest and excluded from the other actions' sources
+TEST_SOURCE_PATTERNS = ['*_test.cpp', '*_test.c', '*_test.cc', '*_test.cxx']
+
+# suffixes of C++ sources, which may import modules
+CPP_SOURCE_SUFFIXES = ('.cpp', '.cc', '.cxx', '.c++', '.C') + MODULE_INTERFACE_SUFFIXES
+
 
 
 # =================================================================================================
@@ -28,7 +37,34 @@ import os
 class CPPAction(Action):
 	def __init__(self, project: Project, toolset: CPPToolset, add_action_to_project: bool = True):
 		super().__init__(project, add_action_to_project)
-		self.cpp_env = CPPEnvironment(self.env, toolset)
+		self._cpp_env = CPPEnvironment(self.env, toolset)
+		self._configuration_cpp_envs: dict[str, CPPEnvironment] = {}
+
+		# usage requirements: what the action's consumers need (public), the libraries it links (with
+		# whether they are linked publicly), and the memoized closures per configuration name
+		self.public_requirements = UsageRequirements()
+		self.linked_libraries: list[tuple[CPPAction, bool]] = []
+		self._interface_requirements: dict[str, UsageRequirements] = {}
+		self._computing_interface: set[str] = set()
+
+		# name of the variant the action builds (e.g. an instrumented build, see CPPProfileTraining), in its own output directory
+		self.variant: str|None = None
+
+		# whether the sources include C++20 modules (see add_module_sources), and their scanned dependencies
+		# per configuration name and source path
+		self.is_using_modules = False
+		self._module_dependencies: dict[str, dict[str, ModuleDependencies]] = {}
+
+	# the C++ environment of the configuration being submitted, with the configuration applied to a copy of the toolset
+	@property
+	def cpp_env(self) -> CPPEnvironment:
+		if self.configuration is None:
+			return self._cpp_env
+
+		if self.configuration.name not in self._configuration_cpp_envs:
+			toolset = self.configuration.configure_toolset(cast(CPPToolset, self._cpp_env.toolset))
+			self._configuration_cpp_envs[self.configuration.name] = CPPEnvironment(self.env, toolset)
+		return self._configuration_cpp_envs[self.configuration.name]
 	
 	@property
 	def toolset(self) -> CPPToolset:
@@ -37,6 +73,291 @@ class CPPAction(Action):
 	@abstractmethod
 	def submit_action(self):
 		self.cpp_env.add_to_environment()
+		self.add_usage_requirements_to_environment()
+		self.env['PGO_OBJECTS_PATH'] = self.objects_path()
+		if self.is_compiling_modules:
+			self.add_modules_to_environment()
+
+		max_command_line_length = self.project.solution.max_command_line_length
+		if max_command_line_length is not None:
+			from .ResponseFile import use_response_files
+			use_response_files(self.env, max_command_line_length if max_command_line_length >= 0 else None)
+
+	# submits the action once per configuration of the solution, all in the same build graph
+	# (skipping what was already submitted for a consumer, see submitted_for)
+	def submit_configurations(self):
+		configurations = self.project.solution.configurations
+		if len(configurations) == 0:
+			self.submitted_for(None)
+			return
+
+		for configuration in configurations:
+			self.submitted_for(configuration)
+
+	# the nodes of the action for the given configuration, submitting it first if needed
+	# (so libraries are submitted before their consumers regardless of declaration order)
+	def submitted_for(self, configuration: 'Configuration|None') -> NodeList:
+		previous_configuration = self.configuration
+		self.set_configuration(configuration)
+		try:
+			if self.submitted_action is None:
+				self.submit_action()
+			return cast(NodeList, self.submitted_action)
+		finally:
+			self.set_configuration(previous_configuration)
+
+	# a copy of the action (not added to the project) that builds the given variant with the given toolset,
+	# with the same sources and linked libraries
+	def variant_copy(self, variant: str, toolset: CPPToolset) -> 'CPPAction':
+		copied = copy.copy(self)
+		copied._env = self._env.Clone()
+		copied._submitted_action = None
+		copied._configuration = None
+		copied._configuration_envs = {}
+		copied._configuration_submitted_actions = {}
+		copied._cpp_env = CPPEnvironment(copied._env, toolset)
+		copied._configuration_cpp_envs = {}
+		copied._interface_requirements = {}
+		copied._computing_interface = set()
+		copied._module_dependencies = {}
+		copied.variant = variant
+		return copied
+
+	# include paths that the action and its consumers compile with (relative to the project's path)
+	def add_public_include_paths(self, include_paths: list[str]):
+		include_paths = [os.path.join(self.project.absolute_path, path) for path in include_paths]
+		self.toolset.add_include_path(include_paths)
+		self.public_requirements.include_paths.extend(include_paths)
+
+	# library paths that the action and its consumers link with
+	def add_public_library_paths(self, library_paths: list[str]):
+		self.toolset.add_library_path(library_paths)
+		self.public_requirements.library_paths.extend(library_paths)
+
+	# libraries that the action and its consumers link with (a LinkGroup for libraries that depend on each other)
+	def add_public_libraries(self, libraries: list[str|LinkGroup]):
+		self.toolset.add_library(libraries)
+		self.public_requirements.libraries.extend(libraries)
+
+	# links C++ libraries by object: the action compiles with their public include paths and links with them and their
+	# dependencies. If public, the action's consumers also compile with their public include paths.
+	def link(self, libraries: 'CPPAction|list[CPPAction]', public: bool = False):
+		for library in libraries if isinstance(libraries, list) else [libraries]:
+			if not isinstance(library, (CPPStaticLibrary, CPPSharedLibrary)):
+				raise ValueError(f'Only C++ libraries can be linked, got {library}')
+			self.linked_libraries.append((library, public))
+
+	# the library files consumers link with
+	def library_nodes(self, configuration: 'Configuration|None') -> list:
+		return []
+
+	# what consumers of the action need for the given configuration: its public requirements, its library files,
+	# and transitively those of the libraries it links (publicly, or privately for link requirements of static libraries).
+	# Computed once per configuration, dependencies first.
+	def interface_requirements(self, configuration: 'Configuration|None') -> UsageRequirements:
+		key = configuration.name if configuration is not None else ''
+		if key in self._interface_requirements:
+			return self._interface_requirements[key]
+
+		if key in self._computing_interface:
+			raise Exception(f'Circular library dependency involving {self.project.name}/{getattr(self, "target", "")}')
+		self._computing_interface.add(key)
+		try:
+			requirements = UsageRequirements(list(self.public_requirements.include_paths), list(self.public_requirements.library_paths), self.library_nodes(configuration) + self.public_requirements.libraries, list(self.module_interfaces(configuration).items()))
+			for library, public in self.linked_libraries:
+				requirements.add(library.interface_requirements(configuration), include=public, link=public or isinstance(self, CPPStaticLibrary))
+		finally:
+			self._computing_interface.discard(key) # a failed computation can be retried
+
+		self._interface_requirements[key] = requirements.deduplicate()
+		return requirements
+
+	# adds the requirements of the linked libraries to the environment (link requirements only if the action links),
+	# removes the duplicates of the final include paths, library paths and libraries, and expands the link groups
+	def add_usage_requirements_to_environment(self):
+		requirements = UsageRequirements()
+		for library, _ in self.linked_libraries:
+			requirements.add(library.interface_requirements(self.configuration), link=isinstance(self, (CPPProgram, CPPSharedLibrary, CPPTest)))
+		self.env.Append(CPPPATH=requirements.include_paths, LIBPATH=requirements.library_paths, LIBS=requirements.libraries) # type: ignore
+		self.env['MODULE_FILES'] = requirements.modules
+
+		self.env.Replace(CPPPATH=unique_first(self.env.get('CPPPATH', [])), LIBPATH=unique_first(self.env.get('LIBPATH', [])), LIBS=expand_link_groups(unique_last(self.env.get('LIBS', [])))) # type: ignore
+
+	# true if the action builds into a directory of its configuration or variant, with its own objects
+	@property
+	def has_variant_output(self) -> bool:
+		return self.configuration is not None or self.variant is not None
+
+	# output directory of the configuration and variant being submitted
+	def variant_output_path(self) -> str:
+		output_path = self.absolute_output_path # type: ignore
+		if self.configuration is not None:
+			output_path = self.configuration.output_path(output_path)
+		if self.variant is not None:
+			output_path = os.path.join(output_path, self.variant)
+		return output_path
+
+	# directory of the objects, which are named by the paths of their sources relative to the project under it
+	def objects_path(self) -> str:
+		if not self.has_variant_output:
+			return os.path.normpath(self.project.absolute_path)
+		return os.path.normpath(os.path.join(self.variant_output_path(), 'obj'))
+
+	# path of an output file of the action, under the configuration's (and variant's) output directory when it has one.
+	# An absolute file name is rebased there by its path relative to the action's output path (or to the project's output
+	# path, or to the project's path), so the configurations don't declare the same target.
+	def output_file(self, file_name: str) -> str:
+		if not self.has_variant_output:
+			return file_name
+		if os.path.isabs(file_name):
+			file_name = self._relative_output_file(file_name)
+		return os.path.join(self.variant_output_path(), file_name)
+
+	def _relative_output_file(self, file_name: str) -> str:
+		for base_path in [self.absolute_output_path, self.project.absolute_output_path, self.project.absolute_path]: # type: ignore
+			relative_path = os.path.relpath(file_name, base_path)
+			if relative_path != os.pardir and not relative_path.startswith(os.pardir + os.sep):
+				return relative_path
+		raise ValueError(f'Output file {file_name} of {self.project.name}/{getattr(self, "target", "")} is outside of the project and its output path, '
+						'so it cannot be placed per configuration. Use a path relative to the output path.')
+
+	# the sources to link or archive. When submitted per configuration (or variant), these are objects compiled explicitly
+	# under the configuration's output directory, so the configurations don't overwrite each other's objects.
+	# Sources are also compiled explicitly with modules, ordered after the BMIs of the modules they import.
+	def compiled_sources(self, shared: bool = False, sources: list|None = None) -> list[str]|NodeList:
+		if sources is None:
+			sources = unique_first(self.toolset.sources.sources) # toolsets shared by actions may repeat sources
+		if not self.has_variant_output and not self.is_compiling_modules:
+			return sources
+
+		object_builder = self.env.SharedObject if shared else self.env.Object # type: ignore
+		objects_path = self.objects_path()
+		objects = []
+		for source in sources:
+			node = self.env.File(source) if isinstance(source, str) else source
+			# sources outside of the project are placed under the objects directory too: each parent directory step
+			# becomes '__' (which only collides with a project directory actually named '__')
+			relative_path = os.path.relpath(node.get_abspath(), self.project.absolute_path)
+			relative_path = os.path.join(*['__' if part == os.pardir else part for part in relative_path.split(os.sep)])
+			target = os.path.join(objects_path, os.path.splitext(relative_path)[0])
+			if self.is_compiling_modules and node.get_abspath().endswith(CPP_SOURCE_SUFFIXES):
+				objects += self.compile_module_source(object_builder, target, node)
+			else:
+				objects += object_builder(target=target, source=node)
+		return NodeList(objects)
+
+	# C++20 module sources (interface, partition and implementation units) of the action. The C++ sources of the action
+	# are scanned for the modules they provide and import (see CPPModules.ModuleScanner), interface units are compiled
+	# into BMIs under <output path>/modules before the sources importing them, and the action's consumers can import them.
+	# Requires C++20 (see CPPToolset.set_cpp_standard) and GCC or clang.
+	def add_module_sources(self, sources: list[str]):
+		self.toolset.add_source(sources)
+		self.is_using_modules = True
+
+	# true if the sources are compiled with modules: the action has module sources or links libraries that do
+	@property
+	def is_compiling_modules(self) -> bool:
+		return self.is_using_modules or len(self.env.get('MODULE_FILES', [])) > 0
+
+	# directory of the BMIs of the action's modules for the configuration
+	def modules_path(self, configuration: 'Configuration|None') -> str:
+		output_path = self.absolute_output_path # type: ignore
+		if configuration is not None:
+			output_path = configuration.output_path(output_path)
+		if self.variant is not None:
+			output_path = os.path.join(output_path, self.variant)
+		return os.path.normpath(os.path.join(output_path, 'modules'))
+
+	# the module dependencies of the C++ sources of the configuration (all the action's sources by default) by absolute
+	# path, scanned with the configuration's standard, include paths and definitions. Sources yet to be generated have none.
+	def scan_modules(self, configuration: 'Configuration|None', sources: list|None = None) -> dict[str, ModuleDependencies]:
+		import shlex
+
+		previous_configuration = self.configuration
+		self.set_configuration(configuration)
+		try:
+			toolset = self.toolset
+			if sources is None:
+				sources = unique_first(toolset.sources.sources)
+			paths = [self.env.File(source).get_abspath() if isinstance(source, str) else source.get_abspath() for source in sources] # type: ignore
+			paths = [path for path in paths if path.endswith(CPP_SOURCE_SUFFIXES) and os.path.isfile(path)]
+
+			dependencies = self._module_dependencies.setdefault(configuration.name if configuration is not None else '', {})
+			missing = [path for path in paths if path not in dependencies]
+			if len(missing) > 0:
+				flags = shlex.split(' '.join([toolset.cpp_standard.get_command_line(), str(toolset.includes_path), str(toolset.preprocessor_definitions)]))
+				scanner = self.project.solution._ensure_module_scanner()
+				dependencies.update(zip(missing, scanner.scan(missing, toolset.compiler, self.env.subst('$CXX'), flags))) # type: ignore
+			return {path: dependencies[path] for path in paths}
+		finally:
+			self.set_configuration(previous_configuration)
+
+	# the BMIs of the modules the action provides for the configuration, by module name
+	def module_interfaces(self, configuration: 'Configuration|None') -> dict[str, str]:
+		if not self.is_using_modules:
+			return {}
+
+		modules_path = self.modules_path(configuration)
+		compiler = self.toolset.compiler
+		return {dependencies.provides: os.path.join(modules_path, module_file_name(dependencies.provides, compiler))
+				for dependencies in self.scan_modules(configuration).values() if dependencies.provides is not None}
+
+	# adds the modules of the action and of the libraries it links to the environment: GCC finds their BMIs
+	# through a module mapper file, clang through -fmodule-file
+	def add_modules_to_environment(self):
+		import SCons.Defaults
+		import SCons.Tool
+		from .ResponseFile import write_if_changed
+
+		# SCons doesn't know the suffixes of module interface units
+		static_object, shared_object = SCons.Tool.createObjBuilders(self.env)
+		for suffix in MODULE_INTERFACE_SUFFIXES:
+			static_object.add_action(suffix, SCons.Defaults.CXXAction)
+			static_object.add_emitter(suffix, SCons.Defaults.StaticObjectEmitter)
+			shared_object.add_action(suffix, SCons.Defaults.ShCXXAction)
+			shared_object.add_emitter(suffix, SCons.Defaults.SharedObjectEmitter)
+		self.env.AppendUnique(CPPSUFFIXES=list(MODULE_INTERFACE_SUFFIXES)) # type: ignore
+
+		module_files = dict(self.env.get('MODULE_FILES', []))
+		module_files.update(self.module_interfaces(self.configuration))
+		self.env['MODULE_FILES'] = list(module_files.items())
+
+		compiler = self.toolset.compiler
+		if compiler == CPPCompiler.GCC:
+			mapper_path = os.path.join(self.modules_path(self.configuration), f'{getattr(self, "target", "objects")}.map')
+			write_if_changed(mapper_path, ''.join(f'{module} {path}\n' for module, path in sorted(module_files.items())).encode())
+			self.env.Append(CXXFLAGS=['-fmodules-ts', f'-fmodule-mapper={mapper_path}']) # type: ignore
+		elif compiler == CPPCompiler.CLANG:
+			self.env.Append(CXXFLAGS=[f'-fmodule-file={module}={path}' for module, path in sorted(module_files.items())]) # type: ignore
+		else:
+			raise Exception(f'C++ modules are not supported with {compiler}')
+
+	# compiles a C++ source with modules: an interface unit also builds its BMI, and the object depends on the BMIs of the
+	# modules the source imports. Returns the object.
+	def compile_module_source(self, object_builder, target: str, node) -> list:
+		dependencies = self.scan_modules(self.configuration, [node]).get(node.get_abspath(), ModuleDependencies())
+		module_files = dict(self.env['MODULE_FILES'])
+		compiler = self.toolset.compiler
+
+		targets = [target]
+		flags = []
+		if node.get_abspath().endswith(MODULE_INTERFACE_SUFFIXES):
+			flags += ['-x', 'c++-module' if compiler == CPPCompiler.CLANG else 'c++']
+		if dependencies.provides is not None:
+			targets.append(module_files[dependencies.provides])
+			if compiler == CPPCompiler.CLANG:
+				flags.append(f'-fmodule-output={module_files[dependencies.provides]}')
+
+		if len(flags) > 0:
+			nodes = object_builder(target=targets, source=node, CXXFLAGS=self.env['CXXFLAGS'] + flags) # type: ignore
+		else:
+			nodes = object_builder(target=targets, source=node)
+
+		# modules that aren't built by the actions (e.g. std) are the compiler's
+		for module in dependencies.requires:
+			if module in module_files:
+				self.env.Depends(nodes, module_files[module]) # type: ignore
+		return nodes[:1]
 
 	def add_sources(self, sources: list[str]):
 		self.toolset.add_source(sources)
@@ -44,7 +365,10 @@ class CPPAction(Action):
 	def add_sources_in_directory(self, root_dir: str,
 									recursive: bool = False,
 									include_patterns: list[str] = ['*.cpp', '*.c', '*.cc', '*.cxx'],
-									exclude_patterns: list[str] = ['*_test.cpp', '*_test.c', '*_test.cc', '*_test.cxx']):
+									exclude_patterns: list[str] = TEST_SOURCE_PATTERNS):
+		self.toolset.add_source(self.sources_in_directory(root_dir, recursive, include_patterns, exclude_patterns))
+
+	def sources_in_directory(self, root_dir: str, recursive: bool, include_patterns: list[str], exclude_patterns: list[str]) -> list[str]:
 		# Generate file patterns to search for
 		file_patterns = include_patterns
 		exclude_patterns = exclude_patterns
@@ -57,10 +381,7 @@ class CPPAction(Action):
 		sources = [source for pattern in file_patterns for source in glob.glob(os.path.join(root_dir, pattern), recursive=recursive)]
 
 		# Exclude files matching the exclude patterns
-		sources = [source for source in sources if not any(fnmatch.fnmatch(source, pattern) for pattern in exclude_patterns)]
-
-		# Add the sources to the toolset
-		self.toolset.add_source(sources)
+		return [source for source in sources if not any(fnmatch.fnmatch(source, pattern) for pattern in exclude_patterns)]
 
 	def include_directories(self, include_paths: list[str]):
 		include_paths = [os.path.join(self.project.absolute_path, path) for path in include_paths]
@@ -100,7 +421,10 @@ class CPPObjFiles(CPPAction):
 	def submit_action(self):
 		super().submit_action() # adds toolset to environment
 		
-		action: NodeList = self.env.Object(self.toolset.sources.sources) # type: ignore
+		if not self.has_variant_output and not self.is_compiling_modules:
+			action: NodeList = self.env.Object(self.toolset.sources.sources) # type: ignore
+		else:
+			action = cast(NodeList, self.compiled_sources())
 		self._set_submitted_action(action)
 
 # =================================================================================================
@@ -108,6 +432,9 @@ class CPPObjFiles(CPPAction):
 # =================================================================================================
 
 def def_from_windows_objs(target, source, env):
+	import re
+	import subprocess
+
 	# make sure that dumpbin is found
 	if not env.WhereIs('dumpbin'):
 		print('dumpbin.exe is not found. Exiting...', file=sys.stderr)
@@ -187,7 +514,7 @@ class CPPDefFile(CPPAction):
 
 		# add custom build action to create DEF file from object files
 		
-		action = CustomBuildAction(self.project, def_from_windows_objs, self.target, self.toolset.sources.sources)
+		action = CustomBuildAction(self.project, def_from_windows_objs, self.output_file(self.target), self.toolset.sources.sources)
 		action.submit_action()
 
 		if action.submitted_action is None:
@@ -230,8 +557,7 @@ class CPPProgram(CPPAction):
 	def submit_action(self):
 		super().submit_action() # adds toolset to environment
 
-		self.cpp_env.add_to_environment()
-		action = self.env.Program(target=self.target) # type: ignore
+		action = self.env.Program(target=self.output_file(self.target), source=self.compiled_sources()) # type: ignore
 		self._set_submitted_action(action)
 
 
@@ -282,6 +608,12 @@ class CPPSharedLibrary(CPPAction):
 	def absolute_output_path(self) -> str:
 		return os.path.join(self.project.absolute_output_path, self.output_path_relative_to_parent)
 
+	# the import library on Windows, the shared library itself elsewhere
+	def library_nodes(self, configuration: 'Configuration|None') -> list:
+		nodes = self.submitted_for(configuration)
+		import_libraries = [node for node in nodes if str(node).endswith(self.env.subst('$LIBSUFFIX'))]
+		return import_libraries if len(import_libraries) > 0 else list(nodes[:1])
+
 	# in windows, it mimics CMAKE_WINDOWS_EXPORT_ALL_SYMBOLS
 	def set_export_all_symbols(self):
 		self.toolset.add_preprocessor_definition('EXPORT_ALL_SYMBOLS')
@@ -289,7 +621,7 @@ class CPPSharedLibrary(CPPAction):
 
 	def add_all_sources(self, recursive: bool = True,
 										include_patterns: list[str] = ['*.cpp', '*.c', '*.cc', '*.cxx'],
-										exclude_patterns: list[str] = ['*_test.cpp', '*_test.c', '*_test.cc', '*_test.cxx']):
+										exclude_patterns: list[str] = TEST_SOURCE_PATTERNS):
 		self.add_sources_in_directory(self.absolute_source_code_path, recursive, include_patterns, exclude_patterns)
 
 	def include_source_directory(self):
@@ -304,6 +636,7 @@ class CPPSharedLibrary(CPPAction):
 		# 	link object files and DEF file to create DLL
 		if self.is_export_all_symbols and self.toolset.compiler == CPPCompiler.CL:
 			objects = CPPObjFiles(self.toolset, self.project, self.output_path_relative_to_parent, self.toolset.sources.sources, add_action_to_project=False)
+			objects.set_configuration(self.configuration)
 			objects.submit_action()
 			objects.depends_on(self.toolset.sources.sources)
 
@@ -311,14 +644,14 @@ class CPPSharedLibrary(CPPAction):
 				raise Exception('Object files are not submitted. Exiting...')
 
 			def_file = CPPDefFile(self.toolset, self.project, self.target+'.def', self.output_path_relative_to_parent, sources=objects.submitted_action, add_action_to_project=False)
+			def_file.set_configuration(self.configuration)
 			def_file.submit_action()
 			def_file.depends_on(objects)
 
-			action: NodeList = self.env.SharedLibrary(target=self.target) # type: ignore
+			action: NodeList = self.env.SharedLibrary(target=self.output_file(self.target), source=objects.submitted_action + [def_file.output_file(def_file.target)]) # type: ignore
 			self._set_submitted_action(action)			
 		else:
-			self.cpp_env.add_to_environment()
-			action: NodeList = self.env.SharedLibrary(target=self.target) # type: ignore
+			action: NodeList = self.env.SharedLibrary(target=self.output_file(self.target), source=self.compiled_sources(shared=True)) # type: ignore
 			self._set_submitted_action(action)
 
 # =================================================================================================
@@ -348,13 +681,442 @@ class CPPStaticLibrary(CPPAction):
 		self.toolset.add_library_path(library_paths)
 		self.toolset.add_library(libraries)
 
+		self.is_thin_archive = False
+		self.is_skip_ranlib = False
+		self.objects_per_archive: int|None = None
+
 	@property
 	def absolute_output_path(self) -> str:
 		return os.path.join(self.project.absolute_output_path, self.output_path_relative_to_parent)
+
+	def library_nodes(self, configuration: 'Configuration|None') -> list:
+		return list(self.submitted_for(configuration))
+
+	# creates a thin archive (GNU ar's T modifier): the archive references the object files instead of copying them,
+	# so they must be kept (and distributed) along with it. Archives are deterministic (no timestamps, uids or modes).
+	def set_thin_archive(self, is_thin_archive: bool = True):
+		self.is_thin_archive = is_thin_archive
+
+	# writes the symbol index with ar's s modifier instead of running ranlib on the archive afterwards
+	def set_skip_ranlib(self, is_skip_ranlib: bool = True):
+		self.is_skip_ranlib = is_skip_ranlib
+
+	# archives every objects_per_archive objects into a separate thin archive (in parallel, each as soon as its
+	# objects are compiled) and combines them into the library, which flattens them. Requires a thin archive.
+	def set_objects_per_archive(self, objects_per_archive: int|None):
+		if objects_per_archive is not None and objects_per_archive < 1:
+			raise ValueError(f'objects_per_archive must be at least 1, got {objects_per_archive}')
+		self.objects_per_archive = objects_per_archive
+
+	def _set_archive_flags(self):
+		if not self.is_thin_archive and not self.is_skip_ranlib and self.objects_per_archive is None:
+			return
+
+		if self.toolset.compiler == CPPCompiler.CL:
+			raise Exception('Thin archives, skipping ranlib and split archives require GNU ar (not supported with CL)')
+		if self.objects_per_archive is not None and not self.is_thin_archive:
+			raise Exception('Split archives require a thin archive (see set_thin_archive)')
+
+		flags = 'rc'
+		if self.is_thin_archive:
+			flags += 'TD'
+		if self.is_skip_ranlib:
+			flags += 's'
+			self.env['RANLIBCOM'] = ''
+		self.env.Replace(ARFLAGS=[flags]) # type: ignore
 		
 	def submit_action(self):
 		super().submit_action() # adds toolset to environment
-		
-		action = self.env.StaticLibrary(target=self.target) # type: ignore
+		self._set_archive_flags()
+
+		objects = self.compiled_sources()
+		if self.objects_per_archive is None or len(objects) <= self.objects_per_archive:
+			action = self.env.StaticLibrary(target=self.output_file(self.target), source=objects) # type: ignore
+			self._set_submitted_action(action)
+			return
+
+		# objects of sources are compiled by the parts' builders
+		if not self.has_variant_output:
+			objects = self.env.Object(objects) # type: ignore
+
+		parts = []
+		for index in range(0, len(objects), self.objects_per_archive):
+			part_target = self.output_file(os.path.join(f'{self.target}.parts', f'{self.target}{index // self.objects_per_archive}'))
+			parts += self.env.StaticLibrary(target=part_target, source=objects[index:index + self.objects_per_archive]) # type: ignore
+
+		action = self.env.StaticLibrary(target=self.output_file(self.target), source=parts) # type: ignore
+		self._set_submitted_action(action)
+
+
+# =================================================================================================
+# * C++ Tests
+# =================================================================================================
+
+# Builds a test executable from each test source (see TEST_SOURCE_PATTERNS) in the source code path, linked
+# with the given sources (e.g. a test main) and the linked libraries. Building the "test" alias (or "test-<project>",
+# "test-<project>-<configuration>" per configuration) runs them in parallel (see TestRunner): the tests of the shard selected by $METASCONS_TEST_SHARD_INDEX and
+# $METASCONS_TEST_SHARD_COUNT run with a timeout each, tests that passed are skipped until their executable or
+# runtime inputs change, and the results are written in JUnit XML to <output path>/test_results.xml
+class CPPTest(CPPAction):
+	def __init__(self, toolset: CPPToolset|str,
+			  project: Project,
+			  source_code_path_relative_to_parent: str,
+			  output_path_relative_to_parent: str,
+			  sources: list[str]|NodeList=[],
+			  include_paths: list[str]|NodeList=[],
+			  libraries: list[str]|NodeList=[],
+			  library_paths: list[str]|NodeList=[],
+			  runtime_inputs: list[str]=[],
+			  timeout: float|None = 60.0,
+			  recursive: bool = True,
+			  test_patterns: list[str] = TEST_SOURCE_PATTERNS,
+			  add_action_to_project: bool = True):
+
+		if isinstance(toolset, str):
+			found_toolset = project.find_toolset(toolset)
+			if found_toolset is None:
+				raise Exception(f'Toolset with name {toolset} not found in the the project {project.name} or its parents. Exiting...')
+			if not isinstance(found_toolset, CPPToolset):
+				raise Exception('toolset must be an instance of CPPToolset')
+			else:
+				toolset = found_toolset
+
+		if not isinstance(toolset, CPPToolset):
+			raise Exception('toolset must be an instance of CPPToolset')
+
+		super().__init__(project, toolset, add_action_to_project)
+
+		self.output_path_relative_to_parent = output_path_relative_to_parent
+		self.source_code_path_relative_to_parent = source_code_path_relative_to_parent
+		self.runtime_inputs = [os.path.join(self.project.absolute_path, path) for path in runtime_inputs]
+		self.timeout = timeout
+		self.test_sources = sorted(self.sources_in_directory(self.absolute_source_code_path, recursive, test_patterns, []))
+		self.toolset.add_source(sources)
+		self.toolset.add_include_path(include_paths)
+		self.toolset.add_include_path([self.absolute_source_code_path])
+		self.toolset.add_library_path(library_paths)
+		self.toolset.add_library(libraries)
+
+		if len(self.test_sources) == 0:
+			raise Exception(f'No test sources found in {self.absolute_source_code_path}')
+
+	@property
+	def absolute_source_code_path(self) -> str:
+		return os.path.join(self.project.absolute_path, self.source_code_path_relative_to_parent)
+
+	@property
+	def absolute_output_path(self) -> str:
+		return os.path.join(self.project.absolute_output_path, self.output_path_relative_to_parent)
+
+	# output directory of the configuration being submitted
+	@property
+	def tests_output_path(self) -> str:
+		return self.variant_output_path()
+
+	def submit_action(self):
+		super().submit_action() # adds toolset to environment
+
+		shared_sources = self.compiled_sources()
+		tests = []
+		for source in self.test_sources:
+			name = os.path.splitext(os.path.relpath(source, self.absolute_source_code_path))[0].replace(os.sep, '_')
+			tests += self.env.Program(target=os.path.join(self.tests_output_path, name), source=list(self.compiled_sources(sources=[source])) + list(shared_sources)) # type: ignore
+		action = NodeList(tests)
+
+		# running the tests isn't part of the default build
+		alias = f'test-{self.project.name}' if self.configuration is None else f'test-{self.project.name}-{self.configuration.name}'
+		run_tests = self.env.Alias(alias, action + self.runtime_inputs, self.env.Action(self._run_tests, f'Running the tests of {self.project.name}')) # type: ignore
+		self.env.AlwaysBuild(run_tests) # the runner skips the tests that passed and didn't change
+		self.env.Alias('test', run_tests) # type: ignore
+
+		self._set_submitted_action(action)
+
+	def _run_tests(self, target, source, env) -> int:
+		from SCons.Script import GetOption
+		from .TestRunner import run_tests, shard_from_environment
+
+		output_path = os.path.dirname(str(source[0].abspath))
+		tests = [node.abspath for node in source if node.abspath not in self.runtime_inputs]
+		shard_index, shard_count = shard_from_environment()
+		passed = run_tests(tests, os.path.join(output_path, 'test_results.xml'), os.path.join(output_path, '.metascons', 'test_results.json'),
+							GetOption('num_jobs'), self.timeout, self.runtime_inputs, shard_index, shard_count)
+		return 0 if passed else 1
+
+
+# =================================================================================================
+# * C++ Profile Training
+# =================================================================================================
+
+def clear_profiles(target, source, env):
+	import shutil
+
+	profiles_path = env.subst('$PGO_PROFILES_PATH')
+	shutil.rmtree(profiles_path, ignore_errors=True)
+	os.makedirs(profiles_path)
+
+# merges the raw profiles of the training: into a .profdata file with Clang. GCC uses the .gcda files where the
+# training wrote them, so the target is a manifest of their contents (which changes when they do).
+def merge_profiles(target, source, env):
+	import hashlib
+	import subprocess
+
+	profiles_path = env.subst('$PGO_PROFILES_PATH')
+	extension = '.profraw' if env['PGO_COMPILER'] == CPPCompiler.CLANG.value else '.gcda'
+	profiles = sorted(os.path.join(root, name) for root, _, names in os.walk(profiles_path) for name in names if name.endswith(extension))
+	if len(profiles) == 0:
+		print(f'The training commands wrote no profiles to {profiles_path}', file=sys.stderr)
+		return 1
+
+	if extension == '.profraw':
+		return subprocess.run([env.subst('$LLVM_PROFDATA'), 'merge', f'-output={target[0].abspath}'] + profiles).returncode
+
+	with open(target[0].abspath, 'w', encoding='utf-8') as f:
+		for profile in profiles:
+			with open(profile, 'rb') as profile_file:
+				f.write(f'{hashlib.sha1(profile_file.read()).hexdigest()} {os.path.relpath(profile, profiles_path)}\n')
+	return 0
+
+
+# Profile guided optimization of a C++ program or shared library (GCC 12+ or Clang): builds an instrumented variant of
+# the action under <output path>/pgo-instrumented, runs the training commands ($SOURCE is the instrumented program or
+# library, whose directory is in LD_LIBRARY_PATH), merges the profiles they write into <output path>/pgo, and builds the
+# action optimized with them. The action's objects depend on the merged profiles, so they are optimized again when
+# the instrumented build or the training commands change the profiles.
+# The given action is changed: it builds with its own copy of its toolset, which uses the profiles, so changes made
+# to its toolset afterwards don't reach it. Must be created before the action is submitted.
+# Per configuration when the solution has configurations.
+class CPPProfileTraining(Action):
+	def __init__(self, project: Project, action: 'CPPProgram|CPPSharedLibrary', training_commands: list[str], add_action_to_project: bool = True):
+		if not isinstance(action, (CPPProgram, CPPSharedLibrary)):
+			raise ValueError(f'Only C++ programs and shared libraries can be trained, got {action}')
+		if action.toolset.compiler not in [CPPCompiler.GCC, CPPCompiler.CLANG]:
+			raise Exception(f'Profile guided optimization is not supported with {action.toolset.compiler}')
+
+		super().__init__(project, add_action_to_project)
+
+		self.action = action
+		self.training_commands = training_commands
+		self.compiler = action.toolset.compiler
+
+		instrumented_toolset = copy.copy(action.toolset)
+		instrumented_toolset.set_profile_guided_optimization(CPPProfileGuidedOptimization.Mode.GENERATE)
+		self.instrumented_action = action.variant_copy('pgo-instrumented', instrumented_toolset)
+
+		# the action's own toolset, as its toolset may be shared with other actions (this replaces the action's environment)
+		optimized_toolset = copy.copy(action.toolset)
+		optimized_toolset.set_profile_guided_optimization(CPPProfileGuidedOptimization.Mode.USE)
+		action._cpp_env = CPPEnvironment(action._env, optimized_toolset)
+
+	# directory of the merged profiles (and of the raw ones, under raw) of the configuration being submitted
+	@property
+	def profiles_output_path(self) -> str:
+		output_path = self.action.absolute_output_path
+		if self.configuration is not None:
+			output_path = self.configuration.output_path(output_path)
+		return os.path.join(output_path, 'pgo')
+
+	def submit_configurations(self):
+		configurations = self.project.solution.configurations
+		if len(configurations) == 0:
+			self.submit_action()
+			return
+
+		for configuration in configurations:
+			self.set_configuration(configuration)
+			try:
+				self.submit_action()
+			finally:
+				self.set_configuration(None)
+
+	def submit_action(self):
+		import SCons.Action
+
+		raw_profiles_path = os.path.join(self.profiles_output_path, 'raw')
+		profile = os.path.join(self.profiles_output_path, 'profile.profdata' if self.compiler == CPPCompiler.CLANG else 'profile.manifest')
+
+		# the instrumented build writes the raw profiles, the optimized build reads the merged ones
+		self.instrumented_action.set_configuration(self.configuration)
+		self.action.set_configuration(self.configuration)
+		try:
+			self.instrumented_action.env['PGO_PROFILE'] = raw_profiles_path
+			self.action.env['PGO_PROFILE'] = profile if self.compiler == CPPCompiler.CLANG else raw_profiles_path
+		finally:
+			self.instrumented_action.set_configuration(None)
+			self.action.set_configuration(None)
+
+		instrumented = self.instrumented_action.submitted_for(self.configuration)
+		optimized = self.action.submitted_for(self.configuration)
+
+		self.env.Replace(PGO_PROFILES_PATH=raw_profiles_path, PGO_COMPILER=self.compiler.value) # type: ignore
+		self.env.SetDefault(LLVM_PROFDATA='llvm-profdata') # type: ignore
+		self.env.PrependENVPath('LD_LIBRARY_PATH', os.path.dirname(instrumented[0].abspath)) # type: ignore
+
+		# command lines as such: SCons takes a lone variable (e.g. '$SOURCE') for the name of an action to look up
+		training_commands = [SCons.Action.CommandAction(command) if isinstance(command, str) else command for command in self.training_commands]
+		commands = [self.env.Action(clear_profiles, 'Clearing the profiles in $PGO_PROFILES_PATH')] + training_commands # type: ignore
+		commands.append(self.env.Action(merge_profiles, 'Merging the profiles of $PGO_PROFILES_PATH')) # type: ignore
+		action: NodeList = self.env.Command(profile, instrumented, commands) # type: ignore
+
+		# stale profiles optimize (compile and link) again
+		self.env.Depends(list(optimized) + [source for node in optimized for source in node.sources], action) # type: ignore
 		self._set_submitted_action(action)
 
+
+# =================================================================================================
+# * C++ Multi-Tier Library
+# =================================================================================================
+
+# x86-64 microarchitecture levels (-march) and the CPU features (of __builtin_cpu_supports) each requires
+X86_64_LEVELS = {
+	'x86-64-v2': ['ssse3', 'sse4.1', 'sse4.2', 'popcnt'],
+	'x86-64-v3': ['ssse3', 'sse4.1', 'sse4.2', 'popcnt', 'avx', 'avx2', 'bmi', 'bmi2', 'fma'],
+	'x86-64-v4': ['ssse3', 'sse4.1', 'sse4.2', 'popcnt', 'avx', 'avx2', 'bmi', 'bmi2', 'fma', 'avx512f', 'avx512bw', 'avx512cd', 'avx512dq', 'avx512vl'],
+}
+
+# environment variable that forces the tier the loaders select ("baseline" or a level)
+CPU_TIER_ENVIRONMENT_VARIABLE = 'METASCONS_CPU_TIER'
+
+# the loader's header and source, formatted and then written with Textfile (where $$ is a literal $)
+LOADER_HEADER = """#pragma once
+
+#ifdef __cplusplus
+extern "C" {{
+#endif
+
+/* the CPU tier of {file_name} for this machine (or $${environment_variable}): a microarchitecture level or "baseline" */
+const char *{prefix}_cpu_tier(void);
+
+/* dlopen()s the {file_name} of the CPU tier, from directory (<directory>/<tier>/{file_name}, or <directory>/{file_name}
+   for the baseline), or from the build's output directories if directory is NULL */
+void *{prefix}_load(const char *directory, int flags);
+
+#ifdef __cplusplus
+}}
+#endif
+"""
+
+LOADER_SOURCE = """#include "{header}"
+
+#include <dlfcn.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+static const char *const tiers[] = {{ {tiers} }}; /* best first */
+
+static int tier_supported(const char *tier)
+{{
+#if defined(__x86_64__)
+	__builtin_cpu_init();
+{checks}
+#endif
+	(void)tier;
+	return 0;
+}}
+
+const char *{prefix}_cpu_tier(void)
+{{
+	const char *forced = getenv("{environment_variable}");
+	if (forced != NULL && forced[0] != '\\0')
+		return forced;
+
+	for (size_t i = 0; i < sizeof(tiers) / sizeof(tiers[0]); i++)
+		if (tier_supported(tiers[i]))
+			return tiers[i];
+	return "baseline";
+}}
+
+void *{prefix}_load(const char *directory, int flags)
+{{
+	char path[4096];
+	const char *tier = {prefix}_cpu_tier();
+
+	if (strcmp(tier, "baseline") == 0)
+		snprintf(path, sizeof(path), "%s/{file_name}", directory != NULL ? directory : METASCONS_BASELINE_DIRECTORY);
+	else
+		snprintf(path, sizeof(path), "%s/%s/{file_name}", directory != NULL ? directory : METASCONS_TIERS_DIRECTORY, tier);
+	return dlopen(path, flags);
+}}
+"""
+
+# Builds a shared library once more per x86-64 microarchitecture level (e.g. with -march=x86-64-v3), each under
+# <output path>/<level> (per configuration), and a loader static library (self.loader, to link with) whose
+# <target>_load(directory, flags) dlopen()s the best build for the CPU, checked with CPUID. The tier can be forced
+# with $METASCONS_CPU_TIER, e.g. to test each build on a single machine. Must be created before the library is submitted.
+class CPPMultiTierLibrary(Action):
+	def __init__(self, project: Project, library: CPPSharedLibrary, levels: list[str] = list(X86_64_LEVELS.keys()), add_action_to_project: bool = True):
+		if not isinstance(library, CPPSharedLibrary):
+			raise ValueError(f'Only C++ shared libraries can be built for CPU tiers, got {library}')
+		if library.toolset.compiler not in [CPPCompiler.GCC, CPPCompiler.CLANG]:
+			raise Exception(f'CPU tiers are not supported with {library.toolset.compiler}')
+		for level in levels:
+			if level not in X86_64_LEVELS:
+				raise ValueError(f'Unknown microarchitecture level {level}, expected one of {list(X86_64_LEVELS.keys())}')
+
+		super().__init__(project, add_action_to_project)
+
+		self.library = library
+		self.levels = sorted(levels, key=lambda level: list(X86_64_LEVELS.keys()).index(level), reverse=True)
+		self.tier_libraries: list[tuple[str, CPPAction]] = []
+		for level in self.levels:
+			tier_library = library.variant_copy(level, library.toolset)
+			tier_library._env.Append(CCFLAGS=[f'-march={level}']) # type: ignore
+			self.tier_libraries.append((level, tier_library))
+
+		# the loader, with the output directories of the library (as they are submitted) as default directories
+		self.prefix = library.target.replace('-', '_').replace('.', '_')
+		self.generated_path = os.path.join(library.absolute_output_path, 'generated')
+		if len(project.solution.configurations) > 0:
+			baseline_directory = tiers_directory = os.path.join(library.absolute_output_path, '$CONFIGURATION')
+		else:
+			baseline_directory = os.path.dirname(os.path.abspath(library.target))
+			tiers_directory = library.absolute_output_path
+
+		loader_toolset = CPPToolset(library.toolset.compiler)
+		loader_toolset.set_positional_independent_code(True)
+		loader_toolset.add_preprocessor_definition([f'METASCONS_BASELINE_DIRECTORY=\\"{baseline_directory}\\"', f'METASCONS_TIERS_DIRECTORY=\\"{tiers_directory}\\"'])
+		self.loader = CPPStaticLibrary(loader_toolset, project, f'{library.target}_loader', library.output_path_relative_to_parent, sources=[os.path.join(self.generated_path, f'{self.prefix}_loader.c')])
+		self.loader.add_public_include_paths([self.generated_path])
+		self.loader.add_public_libraries(['dl'])
+		self._is_loader_generated = False
+
+	def submit_configurations(self):
+		configurations = self.project.solution.configurations
+		if len(configurations) == 0:
+			self.submit_action()
+			return
+
+		for configuration in configurations:
+			self.set_configuration(configuration)
+			try:
+				self.submit_action()
+			finally:
+				self.set_configuration(None)
+
+	def _generate_loader(self):
+		file_name = self.env.subst(f'${{SHLIBPREFIX}}{self.library.target}${{SHLIBSUFFIX}}')
+		checks = []
+		for level in self.levels:
+			features = ' && '.join(f'__builtin_cpu_supports("{feature}")' for feature in X86_64_LEVELS[level])
+			checks.append(f'\tif (strcmp(tier, "{level}") == 0)\n\t\treturn {features};')
+
+		values = {
+			'prefix': self.prefix,
+			'file_name': file_name,
+			'environment_variable': CPU_TIER_ENVIRONMENT_VARIABLE,
+			'header': f'{self.prefix}_loader.h',
+			'tiers': ', '.join(f'"{level}"' for level in self.levels),
+			'checks': '\n'.join(checks),
+		}
+		self.env.Textfile(os.path.join(self.generated_path, f'{self.prefix}_loader.h'), [LOADER_HEADER.format(**values)]) # type: ignore
+		self.env.Textfile(os.path.join(self.generated_path, f'{self.prefix}_loader.c'), [LOADER_SOURCE.format(**values)]) # type: ignore
+
+	def submit_action(self):
+		if not self._is_loader_generated:
+			self._generate_loader()
+			self._is_loader_generated = True
+
+		nodes = []
+		for _, tier_library in self.tier_libraries:
+			nodes += tier_library.submitted_for(self.configuration)
+		self._set_submitted_action(NodeList(nodes))
@@ -1,14 +1,59 @@
 
 from SCons.Environment import Environment
-from .CPPToolset import CPPToolset
-from .Toolset import ToolsetEnvironment
+from .CPPToolset import CPPToolset, CPPOptionalFlags, CStandard, CPPRuntimeLinking, CPPOutputType
+from .Toolset import ToolsetEnvironment, ToolsetAction
 from typing import cast
 
+# the (flags, language) candidates to probe for a toolset action
+def probed_flags(action: ToolsetAction) -> list[tuple[str, str]]:
+	from .ToolchainProbe import ToolchainProbe
+
+	if isinstance(action, CPPOptionalFlags):
+		return [(flags, ToolchainProbe.CPP) for flags in action.compile_flags] + [(flags, ToolchainProbe.LINK) for flags in action.link_flags]
+
+	if not hasattr(action, 'get_command_line'):
+		return []
+
+	flags = action.get_command_line() # type: ignore
+	if flags is None or flags == '':
+		return []
+
+	if isinstance(action, CStandard):
+		return [(flags, ToolchainProbe.C)]
+	elif isinstance(action, (CPPRuntimeLinking, CPPOutputType)):
+		return [(flags, ToolchainProbe.LINK)]
+	else:
+		return [(flags, ToolchainProbe.CPP)]
+
 class CPPEnvironment(ToolsetEnvironment):
 	def __init__(self, env: Environment, toolset: CPPToolset):
 		super().__init__(env, toolset)
-		
+
 	@property
 	def toolset(self) -> CPPToolset:
 		# cast super().toolset to CPPToolset
 		return cast(CPPToolset, super().toolset)
+
+	# adds the toolset to the environment, dropping the flags the compiler doesn't support if probing is enabled
+	def add_to_environment(self):
+		probe = self.toolset.probe
+		if probe is None:
+			super().add_to_environment()
+			return
+
+		from .ToolchainProbe import ToolchainProbe
+
+		actions = [action for action in self.toolset if action is not None] # type: ignore
+		supported = probe.check_flags([candidate for action in actions for candidate in probed_flags(action)])
+
+		for action in actions:
+			if isinstance(action, CPPOptionalFlags):
+				action.add_to_environment(self.env, lambda flags, link: supported[(flags, ToolchainProbe.LINK if link else ToolchainProbe.CPP)])
+				continue
+
+			unsupported = [flags for flags, language in probed_flags(action) if not supported[(flags, language)]]
+			if len(unsupported) > 0:
+				probe.warn_unsupported(unsupported)
+				continue
+
+			action.add_to_environment(self.env)
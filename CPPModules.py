@@ -0,0 +1,182 @@
+import os
+import re
+import threading
+
+from .CPPToolset import CPPCompiler
+
+# suffixes of module interface units, which compilers don't all recognize as C++
+MODULE_INTERFACE_SUFFIXES = ('.cppm', '.ixx', '.mpp', '.cxxm', '.ccm', '.c++m')
+
+# scanners of the module dependencies of a source
+P1689_GCC = 'gcc-p1689'
+P1689_CLANG = 'clang-scan-deps'
+PREAMBLE = 'preamble'
+
+# file name of a module's BMI (built module interface) for the compiler
+def module_file_name(module: str, compiler: CPPCompiler) -> str:
+	return module.replace(':', '-') + ('.pcm' if compiler in [CPPCompiler.CLANG, CPPCompiler.CLCLANG] else '.gcm')
+
+
+# The modules a source provides and requires
+class ModuleDependencies:
+	def __init__(self, provides: str|None = None, is_interface: bool = False, requires: list[str]|None = None):
+		self.provides = provides
+		self.is_interface = is_interface
+		self.requires = requires if requires is not None else []
+
+	def to_dict(self) -> dict:
+		return {'provides': self.provides, 'is_interface': self.is_interface, 'requires': self.requires}
+
+	@staticmethod
+	def from_dict(data: dict) -> 'ModuleDependencies':
+		return ModuleDependencies(data['provides'], data['is_interface'], data['requires'])
+
+# the dependencies of the (single) rule of a P1689 file
+def parse_p1689(text: str) -> ModuleDependencies:
+	import json
+
+	rules = json.loads(text).get('rules', [])
+	if len(rules) == 0:
+		return ModuleDependencies()
+
+	rule = rules[0]
+	provides = rule.get('provides', [])
+	requires = [required['logical-name'] for required in rule.get('requires', []) if 'logical-name' in required]
+	if len(provides) == 0:
+		return ModuleDependencies(None, False, requires)
+	return ModuleDependencies(provides[0]['logical-name'], provides[0].get('is-interface', True), requires)
+
+_comment_pattern = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_declaration_pattern = re.compile(r'^\s*(export\s+)?(module|import)\s+([\w.]*(?::[\w.]+)?)\s*;', re.MULTILINE)
+
+# the dependencies of a source from its module and import declarations, for compilers without a P1689 scanner.
+# Unlike a scanner, this doesn't preprocess the source (conditional imports are all required) and ignores header units.
+def scan_preamble(text: str) -> ModuleDependencies:
+	dependencies = ModuleDependencies()
+	module = None
+	for match in _declaration_pattern.finditer(_comment_pattern.sub('', text)):
+		is_export, keyword, name = match.group(1) is not None, match.group(2), match.group(3)
+		if name == '' or name == 'private' or name.startswith(':private'):
+			continue # global or private module fragment
+
+		if keyword == 'module':
+			module = name.split(':')[0]
+			if is_export or ':' in name:
+				dependencies.provides = name
+				dependencies.is_interface = is_export
+			else:
+				dependencies.requires.append(name) # implementation units implicitly import their module
+		else:
+			dependencies.requires.append(f'{module}{name}' if name.startswith(':') and module is not None else name)
+	return dependencies
+
+
+# Scans the module dependencies of sources with the compiler's P1689 scanner (GCC's -fdeps-format=p1689r5 or
+# clang-scan-deps), or from their module and import declarations if it has none. Results are cached by the hash of the
+# source's content and of the scan command's flags (under the output root), so unchanged sources aren't scanned again.
+# Its modules are imported when it's used, as CPPActions imports this module at startup.
+class ModuleScanner:
+	def __init__(self, cache_path: str, max_workers: int|None = None):
+		self.cache_path = cache_path
+		self.max_workers = max_workers or min(32, os.cpu_count() or 1)
+		self._lock = threading.Lock()
+		self._cache: dict[str, dict] = self._load_cache()
+		self._used: dict[str, dict] = {}
+		self._scanners: dict[str, str] = {}
+
+	def _load_cache(self) -> dict[str, dict]:
+		import json
+
+		try:
+			with open(self.cache_path, 'r', encoding='utf-8') as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	# keeps the results used by this build
+	def save(self):
+		import json
+
+		with self._lock:
+			if self._used == self._cache:
+				return
+			cache = dict(self._used)
+
+		os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+		temp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+		with open(temp_path, 'w', encoding='utf-8') as f:
+			json.dump(cache, f)
+		os.replace(temp_path, self.cache_path)
+
+	# the scanner of the compiler (executable), probed once per build
+	def scanner(self, compiler: CPPCompiler, executable: str) -> str:
+		import shutil
+
+		key = f'{compiler.value}|{executable}'
+		if key not in self._scanners:
+			scanner = PREAMBLE
+			if compiler == CPPCompiler.CLANG and shutil.which('clang-scan-deps') is not None:
+				scanner = P1689_CLANG
+			elif compiler == CPPCompiler.GCC and shutil.which(executable) is not None:
+				from .ToolchainProbe import ToolchainProbe
+				if ToolchainProbe(compiler, executable).is_supported('-std=c++20 -fmodules-ts -fdeps-format=p1689r5 -fdeps-file=probe.ddi -fdeps-target=probe.o'):
+					scanner = P1689_GCC
+			self._scanners[key] = scanner
+		return self._scanners[key]
+
+	# the dependencies of each source, compiled by the compiler (executable) with the flags
+	def scan(self, sources: list[str], compiler: CPPCompiler, executable: str, flags: list[str]) -> list[ModuleDependencies]:
+		from concurrent.futures import ThreadPoolExecutor
+
+		scanner = self.scanner(compiler, executable)
+		if len(sources) <= 1:
+			return [self._scan(source, scanner, executable, flags) for source in sources]
+		with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+			return list(executor.map(lambda source: self._scan(source, scanner, executable, flags), sources))
+
+	def _scan(self, source: str, scanner: str, executable: str, flags: list[str]) -> ModuleDependencies:
+		import hashlib
+
+		digest = hashlib.sha1()
+		with open(source, 'rb') as f:
+			digest.update(f.read())
+		digest.update('\0'.join([scanner, executable] + flags).encode())
+		key = digest.hexdigest()
+
+		with self._lock:
+			cached = self._cache.get(key)
+		if cached is None:
+			cached = self._run_scanner(source, scanner, executable, flags).to_dict()
+
+		with self._lock:
+			self._used[key] = cached
+		return ModuleDependencies.from_dict(cached)
+
+	def _run_scanner(self, source: str, scanner: str, executable: str, flags: list[str]) -> ModuleDependencies:
+		if scanner == PREAMBLE:
+			with open(source, 'r', encoding='utf-8', errors='replace') as f:
+				return scan_preamble(f.read())
+
+		import shlex
+		import shutil
+		import subprocess
+		import tempfile
+
+		language = 'c++-module' if scanner == P1689_CLANG and source.endswith(MODULE_INTERFACE_SUFFIXES) else 'c++'
+		with tempfile.TemporaryDirectory(prefix='metascons_scan_') as directory:
+			object_path = os.path.join(directory, 'scan.o')
+			if scanner == P1689_CLANG:
+				arguments = [shutil.which('clang-scan-deps') or 'clang-scan-deps', '-format=p1689', '--', executable] + flags + ['-x', language, '-c', source, '-o', object_path]
+			else:
+				ddi_path = os.path.join(directory, 'scan.ddi')
+				arguments = [executable] + flags + ['-E', '-x', language, source, '-MT', ddi_path, '-MD', '-MF', os.devnull,
+					'-fmodules-ts', f'-fdeps-file={ddi_path}', f'-fdeps-target={object_path}', '-fdeps-format=p1689r5', '-o', os.devnull]
+
+			process = subprocess.run(arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+			if process.returncode != 0:
+				raise Exception(f'Failed to scan the module dependencies of {source}: {shlex.join(arguments)}\n{process.stderr}')
+
+			if scanner == P1689_CLANG:
+				return parse_p1689(process.stdout)
+			with open(ddi_path, 'r', encoding='utf-8') as f:
+				return parse_p1689(f.read())
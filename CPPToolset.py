@@ -1,11 +1,15 @@
 from enum import Enum
 import os
 import platform
+from typing import TYPE_CHECKING
 from SCons.Node import NodeList
 from SCons.Environment import Environment
 from .Toolset import Toolset
 from .Toolset import ToolsetAction
+from .UsageRequirements import LinkGroup, unique_first, unique_last, expand_link_groups
 
+if TYPE_CHECKING:
+	from .ToolchainProbe import ToolchainProbe
 
 class CPPCompiler(Enum):
 	GCC = 'g++'
@@ -120,7 +124,9 @@ class CPPArchitecture(ToolsetAction):
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
+		if self.compiler in [CPPCompiler.GCC, CPPCompiler.CLANG, CPPCompiler.CLCLANG]:
+			env.Append(LINKFLAGS=self.get_command_line())
 
 class CPPWarningLevels(ToolsetAction):
 	def __init__(self, compiler: CPPCompiler, level: 'CPPWarningLevels.WarningLevels'):
@@ -157,7 +163,7 @@ class CPPWarningLevels(ToolsetAction):
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
 
 class CPPWarningAsError(ToolsetAction):
 	def __init__(self, compiler: CPPCompiler, enabled: bool):
@@ -173,7 +179,7 @@ class CPPWarningAsError(ToolsetAction):
 		return ''
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
 
 class CPPPositionalIndependentCode(ToolsetAction):
 	def __init__(self, compiler: CPPCompiler, enabled: bool):
@@ -191,7 +197,7 @@ class CPPPositionalIndependentCode(ToolsetAction):
 		return ''
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
 
 class CPPOptimizationLevel(ToolsetAction):
 	def __init__(self, compiler: CPPCompiler, level: 'CPPOptimizationLevel.OptimizationLevel'):
@@ -230,7 +236,7 @@ class CPPOptimizationLevel(ToolsetAction):
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
 
 class CPPDebugInformation(ToolsetAction):
 	def __init__(self, compiler: CPPCompiler, level: 'CPPDebugInformation.DebugInformation'):
@@ -268,7 +274,7 @@ class CPPDebugInformation(ToolsetAction):
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
 
 class CPPRuntimeLinking(ToolsetAction):
 	def __init__(self, compiler: CPPCompiler, linking: 'CPPRuntimeLinking.RuntimeLinking'):
@@ -365,7 +371,47 @@ class CPPBuildType(ToolsetAction):
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CFLAGS=self.get_command_line())
+		env.Append(CCFLAGS=self.get_command_line())
+
+# * Profile guided optimization: instrumented builds write profiles to the profile path when they run (a directory),
+# optimized builds use them (the same directory with GCC, the merged .profdata file with Clang). See CPPProfileTraining.
+# GCC finds the profile of an object by its path relative to $PGO_OBJECTS_PATH (set by the C++ actions), which requires GCC 12.
+class CPPProfileGuidedOptimization(ToolsetAction):
+	class Mode(Enum):
+		NONE = 'none'
+		GENERATE = 'generate'
+		USE = 'use'
+
+	def __init__(self, compiler: CPPCompiler, mode: 'CPPProfileGuidedOptimization.Mode', profile_path: str = '$PGO_PROFILE'):
+		self.compiler = compiler
+		self.mode = mode
+		self.profile_path = profile_path
+
+		if mode != self.Mode.NONE and compiler not in [CPPCompiler.GCC, CPPCompiler.CLANG]:
+			raise Exception(f'Profile guided optimization is not supported with {compiler}')
+
+	# not get_command_line: the flags refer to construction variables, so they can't be probed
+	def compile_flags(self) -> list[str]:
+		if self.mode == self.Mode.NONE:
+			return []
+		elif self.compiler == CPPCompiler.GCC:
+			if self.mode == self.Mode.GENERATE:
+				return [f'-fprofile-generate={self.profile_path}', '-fprofile-update=atomic', '-fprofile-prefix-path=$PGO_OBJECTS_PATH']
+			return [f'-fprofile-use={self.profile_path}', '-fprofile-partial-training', '-fprofile-prefix-path=$PGO_OBJECTS_PATH', '-Wno-missing-profile']
+		else:
+			if self.mode == self.Mode.GENERATE:
+				return [f'-fprofile-generate={self.profile_path}']
+			return [f'-fprofile-use={self.profile_path}', '-Wno-profile-instr-unprofiled']
+
+	def link_flags(self) -> list[str]:
+		if self.mode == self.Mode.NONE:
+			return []
+		elif self.mode == self.Mode.GENERATE:
+			return [f'-fprofile-generate={self.profile_path}']
+		return [f'-fprofile-use={self.profile_path}'] if self.compiler == CPPCompiler.GCC else []
+
+	def add_to_environment(self, env: Environment):
+		env.Append(CCFLAGS=self.compile_flags(), LINKFLAGS=self.link_flags())
 
 # * CPP Includes paths
 class CPPIncludesPath(ToolsetAction):
@@ -392,14 +438,14 @@ class CPPIncludesPath(ToolsetAction):
 
 	def __str__(self):
 		if self.compiler == CPPCompiler.GCC or self.compiler == CPPCompiler.CLANG or self.compiler == CPPCompiler.CLCLANG:
-			return ' '.join(['-I' + path for path in self.paths])
+			return ' '.join(['-I' + path for path in unique_first(self.paths)])
 		elif self.compiler == CPPCompiler.CL:
-			return ' '.join(['/I' + path for path in self.paths])
+			return ' '.join(['/I' + path for path in unique_first(self.paths)])
 		else:
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(CPPPATH=self.paths)
+		env.AppendUnique(CPPPATH=unique_first(self.paths))
 		
 
 # * CPP Sources
@@ -466,14 +512,14 @@ class CPPLinkLibrariesPaths(ToolsetAction):
 
 	def __str__(self):
 		if self.compiler == CPPCompiler.GCC or self.compiler == CPPCompiler.CLANG or self.compiler == CPPCompiler.CLCLANG:
-			return ' '.join(['-L' + path for path in self.paths])
+			return ' '.join(['-L' + path for path in unique_first(self.paths)])
 		elif self.compiler == CPPCompiler.CL:
-			return ' '.join(['/LIBPATH:' + path for path in self.paths])
+			return ' '.join(['/LIBPATH:' + path for path in unique_first(self.paths)])
 		else:
 			raise Exception(f'Unknown compiler {self.compiler}')
 
 	def add_to_environment(self, env: Environment):
-		env.Append(LIBPATH=self.paths)
+		env.AppendUnique(LIBPATH=unique_first(self.paths))
 
 
 # * CPP Link Libraries
@@ -501,29 +547,44 @@ class CPPLinkLibraries(ToolsetAction):
 
 	def __str__(self):
 		if self.compiler == CPPCompiler.GCC or self.compiler == CPPCompiler.CLANG or self.compiler == CPPCompiler.CLCLANG:
-			library_flags = []
-			for lib in self.libraries:
-				if os.path.isabs(lib):
-					library_flags.append('-L' + os.path.dirname(lib))
-					library_flags.append('-l' + os.path.basename(lib))
-				else:
-					library_flags.append('-l' + lib)
-			return ' '.join(library_flags)
+			library_paths, libraries = self.split_libraries()
+			return ' '.join(['-L' + path for path in library_paths] + ['-l' + lib for lib in expand_link_groups(libraries)])
 		elif self.compiler == CPPCompiler.CL:
-			return ' '.join(self.libraries)
+			return ' '.join(expand_link_groups(unique_last(self.libraries)))
 		else:
 			raise Exception(f'Unknown compiler {self.compiler}')
 
+	# library paths (of the libraries given by absolute path, each once) and library names
+	# (each once, at its last occurrence, so every library still comes after the libraries using it; link groups are kept)
+	def split_libraries(self) -> 'tuple[list[str], list[str|LinkGroup]]':
+		library_paths, libraries = self._split_libraries(self.libraries)
+		return unique_first(library_paths), unique_last(libraries)
+
+	@staticmethod
+	def _split_libraries(libraries: 'list[str|LinkGroup]') -> 'tuple[list[str], list[str|LinkGroup]]':
+		library_paths = []
+		names = []
+		for lib in libraries:
+			if isinstance(lib, LinkGroup):
+				group_paths, group_names = CPPLinkLibraries._split_libraries(list(lib.libraries))
+				library_paths.extend(group_paths)
+				names.append(LinkGroup(group_names))
+			elif os.path.isabs(lib):
+				library_paths.append(os.path.dirname(lib))
+				names.append(os.path.basename(lib))
+			else:
+				names.append(lib)
+		return library_paths, names
+
 	def add_to_environment(self, env: Environment):
 		if self.compiler == CPPCompiler.GCC or self.compiler == CPPCompiler.CLANG or self.compiler == CPPCompiler.CLCLANG:
-			for lib in self.libraries:
-				if os.path.isabs(lib):
-					env.Append(LIBPATH=os.path.dirname(lib))
-					env.Append(LIBS=[os.path.basename(lib)])
-				else:
-					env.Append(LIBS=[lib])
+			library_paths, libraries = self.split_libraries()
+			env.AppendUnique(LIBPATH=library_paths)
+			env.Append(LIBS=libraries)
+			env.Replace(LIBS=unique_last(env['LIBS']))
 		elif self.compiler == CPPCompiler.CL:
 			env.Append(LIBS=self.libraries)
+			env.Replace(LIBS=unique_last(env['LIBS']))
 		else:
 			raise Exception(f'Unknown compiler {self.compiler}')
 
@@ -639,6 +700,29 @@ class CPPPreprocessorDefinitions:
 			raise Exception(f'Unknown compiler {self.compiler}')
 		
 
+# * Flags added only if the compiler supports them (requires flag probing, see CPPToolset.enable_flag_probing)
+class CPPOptionalFlags(ToolsetAction):
+	def __init__(self, compiler: CPPCompiler) -> None:
+		self.compiler = compiler
+		self.compile_flags: list[str] = []
+		self.link_flags: list[str] = []
+
+	def add_flags(self, flags: str | list[str], link: bool = False):
+		flags = [flags] if isinstance(flags, str) else flags
+		if link:
+			self.link_flags.extend(flags)
+		else:
+			self.compile_flags.extend(flags)
+
+	def add_to_environment(self, env: Environment, is_supported = lambda flags, link: True):
+		for flags in self.compile_flags:
+			if is_supported(flags, False):
+				env.Append(CCFLAGS=flags.split())
+		for flags in self.link_flags:
+			if is_supported(flags, True):
+				env.Append(LINKFLAGS=flags.split())
+
+
 class CPPToolset(Toolset):
 	def __init__(self, compiler: CPPCompiler):
 		self.compiler = compiler
@@ -662,29 +746,34 @@ class CPPToolset(Toolset):
 		self.runtime_linking = CPPRuntimeLinking(compiler, CPPRuntimeLinking.RuntimeLinking.COMPILER_DEFAULT)
 		self.output_type = CPPOutputType(compiler, CPPOutputType.OutputType.COMPIER_DEFAULT)
 		self.build_type = CPPBuildType(compiler, CPPBuildType.BuildType.COMPILER_DEFAULT)
+		self.optional_flags = CPPOptionalFlags(compiler)
+		self.profile_guided_optimization = CPPProfileGuidedOptimization(compiler, CPPProfileGuidedOptimization.Mode.NONE)
+		self.probe: 'ToolchainProbe|None' = None
 
-		# prepare for iteration
+		# prepare for iteration (by name, as the setters replace the attributes)
 		self._iterable_attributes = [
-			self.includes_path,
-			self.sources,
-			self.link_libraries_paths,
-			self.link_libraries,
-			self.output_bin_directory,
-			self.output_obj_directory,
-			self.output_lib_directory,
-			self.output_pdb_directory,
-			self.preprocessor_definitions,
-			self.cpp_standard,
-			self.c_standard,
-			self.architecture,
-			self.warning_levels,
-			self.warning_as_error,
-			self.positional_independent_code,
-			self.optimization_level,
-			self.debug_information,
-			self.runtime_linking,
-			self.output_type,
-			self.build_type
+			'includes_path',
+			'sources',
+			'link_libraries_paths',
+			'link_libraries',
+			'output_bin_directory',
+			'output_obj_directory',
+			'output_lib_directory',
+			'output_pdb_directory',
+			'preprocessor_definitions',
+			'cpp_standard',
+			'c_standard',
+			'architecture',
+			'warning_levels',
+			'warning_as_error',
+			'positional_independent_code',
+			'optimization_level',
+			'debug_information',
+			'runtime_linking',
+			'output_type',
+			'build_type',
+			'optional_flags',
+			'profile_guided_optimization'
 		]
 		self._current_index = 0
 
@@ -695,7 +784,7 @@ class CPPToolset(Toolset):
 	def __next__(self):
 		if self._current_index < len(self._iterable_attributes):
 			self._current_index += 1
-			return self._iterable_attributes[self._current_index - 1]
+			return getattr(self, self._iterable_attributes[self._current_index - 1])
 		else:
 			raise StopIteration	
 
@@ -758,4 +847,17 @@ class CPPToolset(Toolset):
 
 	def set_build_type(self, build_type: CPPBuildType.BuildType):
 		self.build_type = CPPBuildType(self.compiler, build_type)
-		
\ No newline at end of file
+		
+
+	def set_profile_guided_optimization(self, mode: CPPProfileGuidedOptimization.Mode, profile_path: str = '$PGO_PROFILE'):
+		self.profile_guided_optimization = CPPProfileGuidedOptimization(self.compiler, mode, profile_path)
+
+	# flags added only if the compiler supports them, e.g. '-flto' or '-fuse-ld=lld' (link=True)
+	def add_optional_flags(self, flags: str | list[str], link: bool = False):
+		self.optional_flags.add_flags(flags, link)
+
+	# probes the compiler for the flags of this toolset and drops the unsupported ones.
+	# Results are cached per compiler (see ToolchainProbe), so warm runs spawn nothing.
+	def enable_flag_probing(self, executable: str | None = None, cache_path: str | None = None):
+		from .ToolchainProbe import ToolchainProbe
+		self.probe = ToolchainProbe(self.compiler, executable, cache_path)
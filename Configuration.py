@@ -0,0 +1,29 @@
+import copy
+import os
+
+from .CPPToolset import CPPToolset, CPPBuildType, CPPArchitecture
+
+# A build variant of the solution (e.g. Debug x64). When the solution declares configurations,
+# every C++ action is submitted once per configuration, with the configuration's build type and
+# architecture applied to a copy of its toolset, and its outputs under <output path>/<name>
+class Configuration:
+	def __init__(self, build_type: CPPBuildType.BuildType, architecture: CPPArchitecture.Architecture, name: str|None = None):
+		self.build_type = build_type
+		self.architecture = architecture
+		self.name = name if name is not None else f'{build_type.value}-{architecture.value}'
+
+	# copy of the toolset with the configuration's settings (sources, include paths, etc. are shared)
+	def configure_toolset(self, toolset: CPPToolset) -> CPPToolset:
+		configured = copy.copy(toolset)
+		if self.build_type != CPPBuildType.BuildType.COMPILER_DEFAULT:
+			configured.set_build_type(self.build_type)
+		if self.architecture != CPPArchitecture.Architecture.COMPILER_DEFAULT:
+			configured.set_architecture(self.architecture)
+		return configured
+
+	# output directory of the configuration under the given output path
+	def output_path(self, output_path: str) -> str:
+		return os.path.join(output_path, self.name)
+
+	def __str__(self):
+		return self.name
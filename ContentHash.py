@@ -0,0 +1,155 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+# files modified this recently may still change within the same mtime tick, so their
+# hashes are not cached (like git's "racily clean" entries)
+RACY_INTERVAL = 2.0
+
+# xxh3 (if the optional xxhash package is installed), otherwise SHA-1, which is hardware
+# accelerated on most current CPUs (signatures only detect changes, they are not a security boundary)
+def default_hasher() -> tuple[str, Callable[[], Any]]:
+	try:
+		import xxhash
+		return 'xxh3_128', xxhash.xxh3_128
+	except ImportError:
+		return 'sha1', hashlib.sha1
+
+
+# Content hashing for large files: reads them through mmap with a fast hash, skips
+# re-hashing files whose size, mtime and inode are unchanged since the last run, and
+# hashes independent files concurrently (hashlib and xxhash release the GIL).
+class ContentHasher:
+	def __init__(self, cache_path: str, mmap_threshold: int = 1024 * 1024, max_workers: int|None = None):
+		self.cache_path = cache_path
+		self.mmap_threshold = mmap_threshold
+		self.algorithm, self._new_hash = default_hasher()
+		self.max_workers = max_workers or min(32, os.cpu_count() or 1)
+		self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+		self._lock = threading.Lock()
+		self._pending: dict[str, Future] = {}
+		self._entries: dict[str, list] = {}
+		self._dirty = False
+		self.hashed_bytes = 0
+		self.load()
+		_hashers.add(self)
+
+	# a forked child has none of the pool's threads: start a new pool, forgetting the hashes in progress
+	def _after_fork_in_child(self):
+		self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+		self._lock = threading.Lock()
+		self._pending = {path: future for path, future in self._pending.items() if future.done()}
+
+	def load(self):
+		try:
+			with open(self.cache_path, 'r', encoding='utf-8') as f:
+				cache = json.load(f)
+			if cache.get('algorithm') == self.algorithm:
+				self._entries = cache['entries']
+		except (OSError, ValueError, KeyError):
+			self._entries = {}
+
+	def save(self):
+		if not self._dirty:
+			return
+
+		os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+		temp_path = self.cache_path + '.tmp'
+		with self._lock:
+			with open(temp_path, 'w', encoding='utf-8') as f:
+				json.dump({'algorithm': self.algorithm, 'entries': self._entries}, f)
+			self._dirty = False
+		os.replace(temp_path, self.cache_path)
+
+	# hex digest of the file's content
+	def hash_file(self, path: str) -> str:
+		with self._lock:
+			pending = self._pending.pop(path, None)
+		if pending is not None:
+			digest = pending.result()
+			if digest is not None:
+				return digest
+
+		return self._hash_file(path, os.stat(path))
+
+	# starts hashing the given files (of at least min_size bytes) in the background
+	def prefetch(self, paths: list[str], min_size: int = 0):
+		with self._lock:
+			paths = [path for path in paths if path not in self._pending]
+			for path in paths:
+				self._pending[path] = self._executor.submit(self._prefetch_file, path, min_size)
+
+	def _prefetch_file(self, path: str, min_size: int) -> str|None:
+		try:
+			stat = os.stat(path)
+			if stat.st_size < min_size:
+				return None
+			return self._hash_file(path, stat)
+		except OSError:
+			return None
+
+	def _hash_file(self, path: str, stat: os.stat_result) -> str:
+		key = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+		entry = self._entries.get(path)
+		if entry is not None and entry[:3] == key:
+			return entry[3]
+
+		digest = self._hash_content(path, stat.st_size)
+		if time.time() - stat.st_mtime > RACY_INTERVAL:
+			with self._lock:
+				self._entries[path] = key + [digest]
+				self._dirty = True
+		return digest
+
+	def _hash_content(self, path: str, size: int) -> str:
+		hasher = self._new_hash()
+		with open(path, 'rb') as f:
+			if size >= self.mmap_threshold:
+				with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+					hasher.update(mapped)
+			elif size > 0:
+				hasher.update(f.read())
+		with self._lock:
+			self.hashed_bytes += size
+		return hasher.hexdigest()
+
+	# waits for the background hashes to complete
+	def wait(self):
+		with self._lock:
+			pending = list(self._pending.values())
+		for future in pending:
+			future.exception()
+
+	def shutdown(self):
+		self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# the hashers of the process, which a forked child restarts (registered once, not per hasher)
+_hashers: 'weakref.WeakSet[ContentHasher]' = weakref.WeakSet()
+
+def _after_fork_in_child():
+	for hasher in list(_hashers):
+		hasher._after_fork_in_child()
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# makes SCons use the hasher for the content signature of large files
+# (SCons hashes files smaller than its hash chunk size from memory itself)
+def install_content_hasher(hasher: ContentHasher):
+	import SCons.Node.FS
+	import SCons.Util
+
+	def get_content_hash(node: Any) -> str:
+		if not node.rexists():
+			return SCons.Util.hash_signature(SCons.Util.NOFILE)
+		return hasher.hash_file(node.rfile().get_abspath())
+
+	SCons.Node.FS.File.get_content_hash = get_content_hash
@@ -1,22 +1,89 @@
+import sys
+import time
 from typing import Any, Callable
 import SCons
+import SCons.Action
+import SCons.Errors
 from SCons.Environment import Environment
 from .Action import Action
 from .Project import Project
 
+# SCons function action that runs the builder function on behalf of a CustomBuildAction,
+# in the solution's builder process pool if the action uses it, unless its targets are in the builder cache.
+# The signature is still computed from the user's function only.
+class CustomFunctionAction(SCons.Action.FunctionAction):
+	def __init__(self, func: Callable[..., Any], action: 'CustomBuildAction'):
+		super().__init__(func, {})
+		self.action = action
+
+	def execute(self, target, source, env, executor=None):
+		cache = self.action.project.solution.builder_cache if self.action.use_cache else None
+		if cache is None:
+			return self._execute(target, source, env, executor)
+
+		if executor:
+			target = executor.get_all_targets()
+			source = executor.get_all_sources()
+		key = cache.key(self.get_presig(target, source, env), target, source)
+		if cache.restore(key, target):
+			return 0
+
+		start = time.perf_counter()
+		result = self._execute(target, source, env, executor)
+		if not result:
+			cache.store(key, target, time.perf_counter() - start)
+		return result
+
+	def _execute(self, target, source, env, executor=None):
+		if not self.action.use_process_pool:
+			return super().execute(target, source, env, executor)
+		return self._execute_in_process_pool(target, source, env, executor)
+
+	# as FunctionAction.execute, with the function run in a worker process
+	def _execute_in_process_pool(self, target, source, env, executor=None):
+		if executor:
+			target = executor.get_all_targets()
+			source = executor.get_all_sources()
+		rsources = list(map(SCons.Action.rfile, source))
+
+		worker_result = self.action.project.solution._ensure_builder_process_pool().run(self.execfunction, target, rsources, env)
+		if worker_result is None: # the function was registered after the workers started
+			return super().execute(target, source, env, executor)
+
+		sys.stdout.write(worker_result.stdout)
+		sys.stderr.write(worker_result.stderr)
+
+		result = worker_result.result
+		exc_info = (None, None, None)
+		if worker_result.exception is not None:
+			result = worker_result.exception
+			exc_info = (type(result), result, None)
+			if worker_result.traceback_text != '':
+				sys.stderr.write(worker_result.traceback_text)
+
+		if result:
+			result = SCons.Errors.convert_to_BuildError(result, exc_info)
+			result.node = target
+			result.action = self
+			result.command = self.strfunction(target, source, env, executor)
+		return result
+
 class CustomBuildAction(Action):
 	
-	def __init__(self, project: Project, func: Callable[..., Any], target: Any = None, source: Any = None):
+	def __init__(self, project: Project, func: Callable[..., Any], target: Any = None, source: Any = None, use_process_pool: bool = False, use_cache: bool = False):
 		super().__init__(project)
 		
 		self.func_name = func.__name__
+		self.func = func
 
 		self.env.Append(BUILDERS = {
-			self.func_name: self.env.Builder(action = func)
+			self.func_name: self.env.Builder(action = CustomFunctionAction(func, self))
 		})
 
-		self._target = None
-		self._source = None
+		self._target = target
+		self._source = source
+		self.use_process_pool = use_process_pool
+		self.use_cache = use_cache
 
 	@property
 	def target(self):
@@ -34,9 +101,23 @@ class CustomBuildAction(Action):
 	def source(self, value):
 		self._source = value
 
+	# runs the function in the solution's pool of worker processes (see BuilderProcessPool), so CPU heavy functions
+	# run in parallel. The function gets targets and sources as paths (PathShim) and a snapshot of the environment
+	# (EnvironmentSnapshot), and its output, return value and exceptions are passed back.
+	def set_use_process_pool(self, use_process_pool: bool):
+		self.use_process_pool = use_process_pool
+
+	# restores the targets from the solution's builder cache (see Solution.enable_builder_cache) when the function's code
+	# and the sources' contents were built before, instead of running the function.
+	# The function must only depend on its sources (not on construction variables or other files).
+	def set_use_cache(self, use_cache: bool):
+		self.use_cache = use_cache
+
 	def submit_action(self):
+		if self.use_process_pool:
+			from .BuilderProcessPool import register_function
+			register_function(self.func) # before the workers are forked, at the first execute
+
 		action = getattr(self.env, self.func_name)(self._target, self._source)
 		self._set_submitted_action(action)
 		
-
-
@@ -0,0 +1,579 @@
+import json
+import os
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+import traceback
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+	from .Solution import Solution
+
+# set (to 1) in the environment of the SCons process started by the client, which then serves instead of building
+DAEMON_ENVIRONMENT_VARIABLE = 'METASCONS_DAEMON'
+
+SOURCE_EXTENSIONS = ['.c', '.cc', '.cpp', '.cxx']
+HEADER_EXTENSIONS = ['.h', '.hh', '.hpp', '.hxx', '.inl', '.ipp']
+
+def metascons_directory(top_dir: str) -> str:
+	return os.path.join(top_dir, '.metascons')
+
+def socket_path(top_dir: str) -> str:
+	return os.path.join(metascons_directory(top_dir), 'daemon.sock')
+
+# newline delimited JSON messages, optionally passing file descriptors along
+def send_message(connection: socket.socket, message: dict, fds: list[int] = []):
+	data = (json.dumps(message) + '\n').encode()
+	if len(fds) > 0:
+		socket.send_fds(connection, [data], fds)
+	else:
+		connection.sendall(data)
+
+def receive_message(connection: socket.socket, buffer: bytearray, max_fds: int = 0) -> tuple[dict|None, list[int]]:
+	fds = []
+	while b'\n' not in buffer:
+		if max_fds > 0:
+			data, received_fds, _, _ = socket.recv_fds(connection, 65536, max_fds)
+			fds.extend(received_fds)
+		else:
+			data = connection.recv(65536)
+		if data == b'':
+			return None, fds
+		buffer.extend(data)
+
+	line, _, rest = bytes(buffer).partition(b'\n')
+	buffer[:] = rest
+	return json.loads(line), fds
+
+
+# =================================================================================================
+# * inotify
+# =================================================================================================
+
+# Minimal inotify binding (Linux) through ctypes
+class Inotify:
+	IN_MODIFY = 0x2
+	IN_ATTRIB = 0x4
+	IN_CLOSE_WRITE = 0x8
+	IN_MOVED_FROM = 0x40
+	IN_MOVED_TO = 0x80
+	IN_CREATE = 0x100
+	IN_DELETE = 0x200
+	IN_DELETE_SELF = 0x400
+	IN_MOVE_SELF = 0x800
+	IN_Q_OVERFLOW = 0x4000
+	IN_ISDIR = 0x40000000
+
+	WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+	# events that add or remove a file from a directory
+	LISTING_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+	EVENT_HEADER = struct.Struct('iIII')
+
+	def __init__(self):
+		import ctypes
+		self._ctypes = ctypes
+		self._libc = ctypes.CDLL(None, use_errno=True)
+		self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self.fd < 0:
+			error = self._ctypes.get_errno()
+			raise OSError(error, f'inotify_init1 failed: {os.strerror(error)}')
+		self._directories: dict[int, str] = {}
+
+	def add_watch(self, directory: str):
+		descriptor = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+		if descriptor < 0:
+			error = self._ctypes.get_errno()
+			raise OSError(error, f'inotify_add_watch failed for {directory}: {os.strerror(error)}')
+		self._directories[descriptor] = directory
+
+	# (path, mask) of the pending events. An overflow is reported with an empty path.
+	def read_events(self) -> list[tuple[str, int]]:
+		events = []
+		while True:
+			try:
+				data = os.read(self.fd, 65536)
+			except BlockingIOError:
+				return events
+
+			offset = 0
+			while offset < len(data):
+				descriptor, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+				offset += self.EVENT_HEADER.size
+				name = data[offset:offset + length].rstrip(b'\0')
+				offset += length
+
+				if mask & self.IN_Q_OVERFLOW:
+					events.append(('', mask))
+				elif descriptor in self._directories:
+					events.append((os.path.join(self._directories[descriptor], os.fsdecode(name)), mask))
+
+	def close(self):
+		os.close(self.fd)
+
+
+# =================================================================================================
+# * Daemon (server)
+# =================================================================================================
+
+# task of the daemon's builds: SCons' build task, without the options the daemon doesn't support
+def create_task_class(keep_going: bool, failures: list) -> Any:
+	import SCons.Errors
+	import SCons.Taskmaster
+
+	class DaemonTask(SCons.Taskmaster.OutOfDateTask):
+		def display(self, message: str):
+			print(f'scons: {message}')
+
+		def needs_execute(self) -> bool:
+			if super().needs_execute():
+				return True
+			if self.top and self.targets[0].has_builder():
+				print(f"scons: `{self.node}' is up to date.")
+			return False
+
+		def executed(self):
+			target = self.targets[0]
+			if self.top and not target.has_builder() and not target.side_effect and not target.exists():
+				try:
+					raise SCons.Errors.BuildError(target, f"Do not know how to make {target.__class__.__name__} target `{target}'.")
+				except SCons.Errors.BuildError:
+					self.exception_set()
+				self.failed()
+			else:
+				super().executed()
+
+		def failed(self):
+			error = SCons.Errors.convert_to_BuildError(self.exc_info()[1])
+			nodes = error.node or self.node
+			nodes = nodes if isinstance(nodes, list) else [nodes]
+			sys.stderr.write(f'scons: *** [{", ".join(map(str, nodes))}] {error}\n')
+			failures.append(error)
+			if keep_going:
+				self.fail_continue()
+			else:
+				self.fail_stop()
+
+	return DaemonTask
+
+# Serves build requests from the client (see main) over a Unix socket once the SConstruct is read.
+# The configured graph and the signatures SCons computed stay in memory: requests are built in this
+# process with SCons' taskmaster (as SConf does), with the client's stdout and stderr, and the nodes
+# a build left up to date are not examined again by the next builds.
+# Source directories are watched with inotify, and a build resets only the nodes that depend on the
+# files changed since the previous build (every node after a failed build, or when a header appears,
+# as it may shadow another one). A change of a build script, or of the set of C/C++ source files,
+# makes the client start a new daemon.
+# Only -j and -k are supported on the client's command line, and the atexit hooks (summaries, build
+# history) run once, when the daemon exits.
+class Daemon:
+	def __init__(self, solution: 'Solution', build_scripts: list[str], idle_timeout: float|None):
+		import SCons.Node
+		import SCons.Node.FS
+		import SCons.Script
+
+		# keeps the dependencies and build environments of the built nodes, as SCons' interactive mode does
+		SCons.Node.interactive = True
+
+		self.solution = solution
+		self.fs = SCons.Node.FS.get_default_fs()
+		self.idle_timeout = idle_timeout
+		self.top_dir = self.fs.Top.get_abspath()
+		self.socket_path = socket_path(self.top_dir)
+		self.arguments = list(SCons.Script.ARGLIST)
+
+		self.build_scripts = set(os.path.abspath(script) for script in build_scripts)
+		self.sources: set[str] = set()
+		self.outputs: set[str] = set()
+		self._index_graph()
+
+		self.reconfigure = False
+		self.pending_events: list[tuple[str, int]] = []
+		self.changed: set[str] = set() # paths changed since the previous build
+		self.reset_all = False
+
+		# the nodes walked by the previous builds, their parents, and the nodes of their paths
+		self.indexed: set = set()
+		self.parents: dict[Any, set] = {}
+		self.nodes_by_path: dict[str, list] = {}
+
+	# the source and output files of the submitted graph, and the directories to watch
+	def _index_graph(self):
+		import SCons.Node.FS
+
+		visited = set()
+		include_paths = set()
+		pending = [node for action in self.solution.all_actions() if action.submitted_action is not None for node in action.submitted_action]
+		while len(pending) > 0:
+			node = pending.pop()
+			if id(node) in visited:
+				continue
+			visited.add(id(node))
+
+			if node.has_builder():
+				self.outputs.add(node.get_abspath())
+				pending.extend(node.sources + (node.depends or []))
+
+				env = node.get_build_env()
+				if id(env) not in visited:
+					visited.add(id(env))
+					include_paths.update(env.Dir(path).get_abspath() for path in env.Flatten([env.get('CPPPATH', [])]))
+			elif isinstance(node, SCons.Node.FS.File):
+				self.sources.add(node.get_abspath())
+
+		self.directories = include_paths | set(os.path.dirname(path) for path in self.sources | self.build_scripts)
+
+	def serve(self) -> int:
+		os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+		if os.path.exists(self.socket_path):
+			os.unlink(self.socket_path)
+
+		# the client interrupts a build with SIGINT, which SCons' jobs handle while building
+		signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+		self.inotify = Inotify()
+		for directory in sorted(self.directories):
+			if os.path.isdir(directory):
+				self.inotify.add_watch(directory)
+
+		server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		server.bind(self.socket_path)
+		server.listen(8)
+		print(f'MetaSCons daemon {os.getpid()} is serving on {self.socket_path} ({len(self.sources)} sources in {len(self.directories)} directories)', flush=True)
+
+		selector = selectors.DefaultSelector()
+		selector.register(server, selectors.EVENT_READ)
+		selector.register(self.inotify.fd, selectors.EVENT_READ)
+		try:
+			while not self.reconfigure:
+				ready = selector.select(self.idle_timeout)
+				if len(ready) == 0:
+					print('Idle timeout, exiting', flush=True)
+					break
+
+				for key, _ in ready:
+					if key.fileobj is server:
+						connection, _ = server.accept()
+						with connection:
+							if not self._handle(connection):
+								return 0
+					else:
+						self.pending_events.extend(self.inotify.read_events())
+		finally:
+			selector.close()
+			server.close()
+			self.inotify.close()
+			if os.path.exists(self.socket_path):
+				os.unlink(self.socket_path)
+		return 0
+
+	# classifies the pending file events: a change of a build script, the removal of a source file or
+	# a new C/C++ source file (which globbing may pick up) needs a reconfigure, a new header resets every
+	# node, and any other changed file resets the nodes depending on it (see _affected_nodes).
+	# The outputs written by a build are ignored once it finished (ignore_outputs).
+	def _process_events(self, ignore_outputs: bool = False):
+		self.pending_events.extend(self.inotify.read_events())
+		events, self.pending_events = self.pending_events, []
+
+		for path, mask in events:
+			if path == '' or path in self.build_scripts:
+				self.reconfigure = True
+			elif mask & Inotify.IN_ISDIR or (ignore_outputs and path in self.outputs):
+				continue
+			elif mask & Inotify.LISTING_MASK and path in self.sources and not os.path.exists(path):
+				self.reconfigure = True
+			elif mask & Inotify.LISTING_MASK and path not in self.sources | self.outputs and os.path.exists(path):
+				extension = os.path.splitext(path)[1]
+				if extension in SOURCE_EXTENSIONS:
+					self.reconfigure = True
+				elif extension in HEADER_EXTENSIONS:
+					self.reset_all = True
+			else:
+				self.changed.add(path)
+
+	# handles a request, returns False to stop serving
+	def _handle(self, connection: socket.socket) -> bool:
+		message, fds = receive_message(connection, bytearray(), max_fds=2)
+		try:
+			if message is None:
+				return True
+
+			if message.get('command') == 'stop':
+				send_message(connection, {'status': 'stopped'})
+				return False
+
+			self._process_events()
+			if self.reconfigure or message.get('arguments', []) != self.arguments:
+				self.reconfigure = True
+				send_message(connection, {'status': 'reconfigure'})
+				return False
+
+			exit_code = self._build(connection, message.get('argv', []), fds)
+			send_message(connection, {'status': 'finished', 'exit_code': exit_code})
+			return True
+		finally:
+			for fd in fds:
+				os.close(fd)
+
+	# targets, job count and keep going of the client's command line. The other options of SCons change
+	# how it reads the SConstruct or what it does with the targets, which the daemon can't honor per build.
+	def _parse_argv(self, argv: list[str]) -> tuple[list[str], int, bool]:
+		import argparse
+		from SCons.Script import GetOption
+
+		parser = argparse.ArgumentParser(prog='scons', add_help=False, exit_on_error=False)
+		parser.add_argument('-j', '--jobs', type=int, default=GetOption('num_jobs'))
+		parser.add_argument('-k', '--keep-going', action='store_true')
+		options, targets = parser.parse_known_args(argv)
+
+		unsupported = [arg for arg in targets if arg.startswith('-')]
+		if len(unsupported) > 0:
+			raise ValueError(f'The daemon does not support the options {" ".join(unsupported)} (only -j and -k)')
+		return targets, options.jobs, options.keep_going
+
+	def _build(self, connection: socket.socket, argv: list[str], fds: list[int]) -> int:
+		import argparse
+
+		try:
+			targets, jobs, keep_going = self._parse_argv(argv)
+		except (ValueError, argparse.ArgumentError) as e:
+			os.write(fds[1], f'scons: *** {e}\n'.encode())
+			return 2
+
+		send_message(connection, {'status': 'started', 'pid': os.getpid()})
+		sys.stdout.flush()
+		sys.stderr.flush()
+		saved_fds = [os.dup(1), os.dup(2)]
+		os.dup2(fds[0], 1)
+		os.dup2(fds[1], 2)
+		try:
+			return self._build_targets(targets, jobs, keep_going)
+		except Exception:
+			traceback.print_exc()
+			self.reset_all = True
+			return 2
+		finally:
+			sys.stdout.flush()
+			sys.stderr.flush()
+			os.dup2(saved_fds[0], 1)
+			os.dup2(saved_fds[1], 2)
+			for fd in saved_fds:
+				os.close(fd)
+			self._process_events(ignore_outputs=True)
+
+	# the nodes of the targets, looked up like SCons does (aliases first), or the default targets
+	def _target_nodes(self, targets: list[str]) -> list:
+		import SCons.Node
+		import SCons.Script
+
+		if len(targets) == 0:
+			return list(SCons.Script.DEFAULT_TARGETS) or [self.fs.Dir('.')]
+
+		nodes = []
+		for target in targets:
+			node = None
+			for lookup in SCons.Node.arg2nodes_lookups:
+				node = lookup(target, curdir=self.top_dir)
+				if node is not None:
+					break
+			nodes.append(node if node is not None else self.fs.Entry(target, directory=self.fs.Top, create=1))
+		return nodes
+
+	def _build_targets(self, targets: list[str], jobs: int, keep_going: bool) -> int:
+		import SCons.Node
+		import SCons.SConsign
+		import SCons.Taskmaster
+		import SCons.Taskmaster.Job
+
+		changed, self.changed = self.changed, set()
+		reset = set(self.indexed) if self.reset_all else self._affected_nodes(changed)
+		self.reset_all = False
+
+		# the nodes left with a state are not walked again, so they keep what was computed for them
+		for node in reset:
+			node.clear()
+			node.set_state(SCons.Node.no_state)
+			node.implicit = None
+
+		nodes = self._target_nodes(targets)
+		for node in nodes:
+			if node.get_state() in [SCons.Node.up_to_date, SCons.Node.executed] and node.has_builder():
+				print(f"scons: `{node}' is up to date.")
+
+		failures = []
+		taskmaster = SCons.Taskmaster.Taskmaster(nodes, create_task_class(keep_going, failures))
+		jobs = SCons.Taskmaster.Job.Jobs(jobs, taskmaster)
+		jobs.run(postfunc=SCons.SConsign.write)
+		self._index(nodes, set(node for node in reset if node.get_state() != SCons.Node.no_state))
+
+		if jobs.were_interrupted():
+			sys.stderr.write('scons: Build interrupted.\n')
+		if jobs.were_interrupted() or len(failures) > 0:
+			# the failed and interrupted nodes are walked again, with everything else
+			self.reset_all = True
+			return 2
+		return 0
+
+	# the indexed nodes of the changed paths, and the nodes depending on them
+	def _affected_nodes(self, paths: set[str]) -> set:
+		affected = set()
+		pending = [node for path in paths for node in self.nodes_by_path.get(path, [])]
+		while len(pending) > 0:
+			node = pending.pop()
+			if node not in affected:
+				affected.add(node)
+				pending.extend(self.parents.get(node, []))
+		return affected
+
+	# indexes the nodes walked from nodes that are not yet indexed, or that were walked again (reindex)
+	def _index(self, nodes: list, reindex: set):
+		import SCons.Node.FS
+
+		pending = list(nodes)
+		while len(pending) > 0:
+			node = pending.pop()
+			if node in self.indexed and node not in reindex:
+				continue
+			self.indexed.add(node)
+			reindex.discard(node)
+
+			if isinstance(node, SCons.Node.FS.Base):
+				for path in set([node.get_abspath(), node.srcnode().get_abspath()]):
+					self.nodes_by_path.setdefault(path, []).append(node)
+
+			for child in node.children() + list(node.prerequisites or []):
+				self.parents.setdefault(child, set()).add(node)
+				pending.append(child)
+
+# serves build requests (see Daemon) if the process was started by the daemon client
+def serve(solution: 'Solution', build_scripts: list[str], idle_timeout: float|None):
+	exit_code = Daemon(solution, build_scripts, idle_timeout).serve()
+	sys.stdout.flush()
+	sys.stderr.flush()
+	sys.exit(exit_code)
+
+
+# =================================================================================================
+# * Client
+# =================================================================================================
+
+def find_top_dir(directory: str) -> str|None:
+	while True:
+		if os.path.isfile(os.path.join(directory, 'SConstruct')):
+			return directory
+		parent = os.path.dirname(directory)
+		if parent == directory:
+			return None
+		directory = parent
+
+def connect(path: str) -> socket.socket|None:
+	connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		connection.connect(path)
+		return connection
+	except (FileNotFoundError, ConnectionRefusedError):
+		connection.close()
+		return None
+
+# starts a daemon (SCons with the daemon environment variable) and connects to it once it serves
+def start_daemon(top_dir: str, arguments: list[str], timeout: float) -> socket.socket|None:
+	os.makedirs(metascons_directory(top_dir), exist_ok=True)
+	path = socket_path(top_dir)
+	if os.path.exists(path):
+		os.unlink(path) # stale, nothing is listening on it
+
+	log_path = os.path.join(metascons_directory(top_dir), 'daemon.log')
+	env = dict(os.environ)
+	env[DAEMON_ENVIRONMENT_VARIABLE] = '1'
+	with open(log_path, 'w', encoding='utf-8') as log:
+		process = subprocess.Popen([sys.executable, '-m', 'SCons', '-Q'] + arguments, cwd=top_dir, env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		connection = connect(path)
+		if connection is not None:
+			return connection
+		if process.poll() is not None:
+			break
+		time.sleep(0.01)
+
+	with open(log_path, 'r', encoding='utf-8') as log:
+		sys.stderr.write(log.read())
+	if process.poll() is None:
+		print(f'MetaSCons daemon did not start within {timeout} seconds', file=sys.stderr)
+	else:
+		print(f'MetaSCons daemon exited with code {process.returncode} (does the SConstruct call Solution.enable_daemon()?)', file=sys.stderr)
+	return None
+
+# sends a build request, returns the exit code, or None if the daemon must be restarted
+def request_build(connection: socket.socket, argv: list[str], arguments: list[str]) -> int|None:
+	send_message(connection, {'command': 'build', 'argv': argv, 'arguments': arguments}, [sys.stdout.fileno(), sys.stderr.fileno()])
+
+	buffer = bytearray()
+	pid = None
+	while True:
+		try:
+			message, _ = receive_message(connection, buffer)
+		except KeyboardInterrupt:
+			if pid is not None:
+				os.kill(pid, signal.SIGINT)
+			continue
+
+		if message is None:
+			print('MetaSCons daemon closed the connection', file=sys.stderr)
+			return 2
+		if message['status'] == 'started':
+			pid = message['pid']
+		elif message['status'] == 'finished':
+			return message['exit_code']
+		elif message['status'] == 'reconfigure':
+			return None
+
+# thin client: python -m MetaSCons.Daemon [SCons options and targets] [NAME=VALUE ...]
+# builds through the daemon of the SConstruct above the current directory, starting it if needed
+def main(argv: list[str]|None = None) -> int:
+	argv = sys.argv[1:] if argv is None else argv
+
+	top_dir = find_top_dir(os.getcwd())
+	if top_dir is None:
+		print('No SConstruct found', file=sys.stderr)
+		return 2
+
+	if argv == ['--stop']:
+		connection = connect(socket_path(top_dir))
+		if connection is not None:
+			with connection:
+				send_message(connection, {'command': 'stop'})
+				receive_message(connection, bytearray())
+		return 0
+
+	# NAME=VALUE arguments are read by the SConstruct, the daemon is configured with them
+	arguments = [arg for arg in argv if '=' in arg and not arg.startswith('-')]
+	build_argv = [arg for arg in argv if arg not in arguments]
+	if os.getcwd() != top_dir: # targets are looked up from the top directory
+		build_argv = [arg if arg.startswith('-') or arg.isdigit() else os.path.relpath(os.path.abspath(arg), top_dir) for arg in build_argv]
+
+	for _ in range(2):
+		connection = connect(socket_path(top_dir)) or start_daemon(top_dir, arguments, timeout=600)
+		if connection is None:
+			return 2
+
+		with connection:
+			exit_code = request_build(connection, build_argv, arguments)
+		if exit_code is not None:
+			return exit_code
+
+		# the daemon exits to be reconfigured, wait for it to release the socket
+		deadline = time.monotonic() + 10
+		while os.path.exists(socket_path(top_dir)) and time.monotonic() < deadline:
+			time.sleep(0.01)
+
+	print('MetaSCons daemon keeps requesting to be reconfigured', file=sys.stderr)
+	return 2
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import statistics
+import subprocess
+import sys
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+	from .Solution import Solution
+
+# suffixes of the sources of translation units and of the headers they include
+# (standard headers without suffix are counted when they are under the solution's path)
+SOURCE_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.c++', '.C', '.m', '.mm')
+HEADER_SUFFIXES = ('.h', '.hh', '.hpp', '.hxx', '.h++', '.H', '.inl', '.ipp', '.tpp', '.inc')
+
+# set (to the JSON of analyze_header_impact's arguments) in the environment of the SCons process started by main,
+# whose Solution then analyzes the submitted graph when SCons exits
+HEADER_IMPACT_ENVIRONMENT_VARIABLE = 'METASCONS_HEADER_IMPACT'
+
+
+class HeaderImpact:
+	def __init__(self, path: str, translation_units: list[str], compile_cost: float, changes: int):
+		self.path = path
+		self.translation_units = translation_units
+		self.compile_cost = compile_cost
+		self.changes = changes
+
+	# the compile time spent rebuilding after the header's changes in the history
+	@property
+	def rebuild_cost(self) -> float:
+		return self.compile_cost * self.changes
+
+	def to_dict(self) -> dict:
+		return {'path': self.path, 'translation_units': len(self.translation_units), 'compile_cost': self.compile_cost, 'changes': self.changes, 'rebuild_cost': self.rebuild_cost}
+
+
+# the object nodes compiled from a single source under the nodes (through their sources and dependencies), by path
+def translation_units(nodes: Any) -> dict[str, Any]:
+	units = {}
+	visited = set()
+	pending = list(nodes)
+	while len(pending) > 0:
+		node = pending.pop()
+		if id(node) in visited or not node.has_builder():
+			continue
+		visited.add(id(node))
+
+		sources = [source for source in node.sources if str(source).endswith(SOURCE_SUFFIXES)]
+		if len(sources) > 0:
+			units[str(node)] = node
+		else:
+			pending.extend(node.sources + (node.depends or []))
+	return units
+
+def is_header(path: str, root: str) -> bool:
+	if path.endswith(HEADER_SUFFIXES):
+		return True
+	return os.path.splitext(path)[1] == '' and path.startswith(root + os.sep)
+
+# header (absolute path) -> objects that include it, directly or not, found by SCons' scanners
+def reverse_include_index(units: dict[str, Any], root: str) -> dict[str, set[str]]:
+	index: dict[str, set[str]] = {}
+	for object_path, node in units.items():
+		node.scan()
+		for dependency in node.implicit or []:
+			path = dependency.get_abspath()
+			if is_header(path, root):
+				index.setdefault(path, set()).add(object_path)
+	return index
+
+# number of commits of the last max_commits that changed each file (absolute path) under path, empty if not in git
+def git_change_counts(path: str, max_commits: int = 1000, since: str|None = None) -> dict[str, int]:
+	command = ['git', '-C', path, 'log', f'--max-count={max_commits}', '--format=', '--name-only', '--no-renames']
+	if since is not None:
+		command.append(f'--since={since}')
+	try:
+		top_level = subprocess.run(['git', '-C', path, 'rev-parse', '--show-toplevel'], capture_output=True, text=True, check=True).stdout.strip()
+		log = subprocess.run(command + ['--', '.'], capture_output=True, text=True, check=True).stdout
+	except (OSError, subprocess.CalledProcessError):
+		return {}
+
+	counts: dict[str, int] = {}
+	for line in log.splitlines():
+		if line != '':
+			file_path = os.path.normpath(os.path.join(top_level, line))
+			counts[file_path] = counts.get(file_path, 0) + 1
+	return counts
+
+# headers ranked by the compile time their changes caused (or would cause, if they never changed):
+# the compile cost of a header is the sum of the compile costs of the objects including it
+# (seconds from the build history, the median of the known costs for objects without history, or 1 per object
+# without any history)
+def rank_headers(index: dict[str, set[str]], costs: dict[str, float], changes: dict[str, int]) -> list[HeaderImpact]:
+	default_cost = statistics.median(costs.values()) if len(costs) > 0 else 1.0
+	impacts = []
+	for path, objects in index.items():
+		compile_cost = sum(costs.get(object_path, default_cost) for object_path in objects)
+		impacts.append(HeaderImpact(path, sorted(objects), compile_cost, changes.get(path, 0)))
+	impacts.sort(key=lambda impact: (impact.rebuild_cost, impact.compile_cost, len(impact.translation_units)), reverse=True)
+	return impacts
+
+def format_report(impacts: list[HeaderImpact], root: str, has_history: bool, top: int|None = None) -> str:
+	unit = 's' if has_history else ' TUs'
+	lines = [f'{"rebuild cost":>14} {"compile cost":>14} {"TUs":>6} {"changes":>7}  header']
+	for impact in impacts[:top]:
+		path = os.path.relpath(impact.path, root) if impact.path.startswith(root + os.sep) else impact.path
+		lines.append(f'{impact.rebuild_cost:>{14 - len(unit)}.2f}{unit} {impact.compile_cost:>{14 - len(unit)}.2f}{unit} {len(impact.translation_units):>6} {impact.changes:>7}  {path}')
+	return '\n'.join(lines)
+
+# analyzes the headers of the translation units of a submitted solution (see Solution.analyze_header_impact),
+# including the ones of the copies actions build (CPU tiers, PGO instrumented builds)
+def analyze_header_impact(solution: 'Solution', history_path: str|None = None, max_commits: int = 1000, since: str|None = None) -> tuple[list[HeaderImpact], bool]:
+	from .BuildHistory import compile_costs
+
+	nodes = []
+	for action in solution.all_actions():
+		if action.submitted_action is not None:
+			nodes.extend(action.submitted_action)
+
+	costs = compile_costs(history_path) if history_path is not None and os.path.isfile(history_path) else {}
+	index = reverse_include_index(translation_units(nodes), solution.absolute_path)
+	return rank_headers(index, costs, git_change_counts(solution.absolute_path, max_commits, since)), len(costs) > 0
+
+# python -m MetaSCons.HeaderImpact [--top N] [--report PATH] [--max-commits N] [--since DATE] [SCons arguments]
+# reads the SConstruct of the current directory with a silent dry run of SCons, and prints the ranking of its headers
+def main(argv: list[str]|None = None) -> int:
+	import argparse
+	import json
+
+	parser = argparse.ArgumentParser(prog=f'python -m {__package__}.HeaderImpact', description='Ranks the headers of an SConstruct by the compile time their changes cost')
+	parser.add_argument('--top', type=int, default=50, help='number of headers to print')
+	parser.add_argument('--report', help='path of a JSON report of all the headers')
+	parser.add_argument('--max-commits', type=int, default=1000, help='number of git commits to count the changes in')
+	parser.add_argument('--since', help='count the changes of the git commits since this date')
+	args, scons_arguments = parser.parse_known_args(argv)
+
+	env = dict(os.environ)
+	env[HEADER_IMPACT_ENVIRONMENT_VARIABLE] = json.dumps({
+		'report_path': os.path.abspath(args.report) if args.report is not None else None,
+		'top': args.top,
+		'max_commits': args.max_commits,
+		'since': args.since,
+	})
+	return subprocess.run([sys.executable, '-m', 'SCons', '-n', '-s'] + scons_arguments, env=env).returncode
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,195 @@
+import os
+import sys
+from typing import TYPE_CHECKING, Any, Iterator
+
+import SCons.Action
+import SCons.Node.FS
+import SCons.Subst
+
+if TYPE_CHECKING:
+	from .Solution import Solution
+
+COMPILE_BUILDERS = ['Object', 'StaticObject', 'SharedObject']
+ARCHIVE_BUILDERS = ['StaticLibrary', 'Library']
+
+def escape_path(path: str) -> str:
+	return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+def escape_value(value: str) -> str:
+	return value.replace('$', '$$').replace('\n', '$\n')
+
+# returns the fully substituted (and escaped) arguments of the command lines of an SCons action,
+# or None if the action (or part of it) is a Python function
+def command_lines(action: Any, targets: list[Any], sources: list[Any], env: Any, executor: Any) -> list[list[str]]|None:
+	if isinstance(action, SCons.Action.ListAction):
+		lines = []
+		for sub_action in action.list:
+			sub_lines = command_lines(sub_action, targets, sources, env, executor)
+			if sub_lines is None:
+				return None
+			lines.extend(sub_lines)
+		return lines
+
+	if isinstance(action, SCons.Action.CommandGeneratorAction):
+		generated = action._generate(targets, sources, env, 0, executor)
+		return command_lines(generated, targets, sources, env, executor)
+
+	if isinstance(action, SCons.Action.CommandAction):
+		cmd_list, _, _ = action.process(targets, sources, env, executor)
+		escape = env.get('ESCAPE', lambda x: x)
+		return [SCons.Subst.escape_list(cmd_line, escape) for cmd_line in cmd_list if len(cmd_line) > 0]
+
+	return None
+
+# the command line running the compiler: the last one starting with $CC or $CXX, else the last one
+def compiler_line(lines: list[list[str]], env: Any) -> list[str]:
+	compilers = {os.path.basename(env.subst(variable)) for variable in ['$CC', '$CXX', '$SHCC', '$SHCXX']}
+	for line in reversed(lines):
+		if os.path.basename(line[0].strip('"')) in compilers:
+			return line
+	return lines[-1]
+
+
+# Writes a build.ninja equivalent to the submitted graph of a solution.
+# Commands are taken verbatim from SCons (so the outputs are identical), compile commands
+# additionally produce depfiles for header dependencies, and build.ninja regenerates
+# itself by re-running SCons when one of the build scripts changes.
+class NinjaWriter:
+	def __init__(self, solution: 'Solution', path: str, regenerate_command: str, build_scripts: list[str]):
+		self.solution = solution
+		self.path = os.path.abspath(path)
+		self.regenerate_command = regenerate_command
+		self.build_scripts = build_scripts
+		self.top_dir = SCons.Node.FS.get_default_fs().Top.get_abspath()
+
+	# path of a node relative to the top directory, or absolute if it is outside of it
+	def relative(self, node: Any) -> str:
+		path = str(node.get_abspath())
+		relative_path = os.path.relpath(path, self.top_dir)
+		if relative_path.startswith('..'):
+			return path
+		return relative_path
+
+	# all derived nodes reachable from the submitted actions, dependencies first
+	def derived_nodes(self) -> Iterator[Any]:
+		visited = set()
+
+		def visit(node: Any) -> Iterator[Any]:
+			if id(node) in visited:
+				return
+			visited.add(id(node))
+
+			if not node.has_builder():
+				return
+
+			for child in node.sources + (node.depends or []):
+				yield from visit(child)
+			yield node
+
+		for action in self.solution.all_actions():
+			if action.submitted_action is not None:
+				for node in action.submitted_action:
+					yield from visit(node)
+
+	def compiler_rule(self, env: Any) -> str:
+		if os.path.basename(env.subst('$CXX')).lower() in ['cl', 'cl.exe']:
+			return 'compile_msvc'
+		return 'compile'
+
+	def build_statements(self) -> Iterator[str]:
+		executors = set()
+
+		for node in self.derived_nodes():
+			executor = node.get_executor()
+			if id(executor) in executors:
+				continue
+			executors.add(id(executor))
+
+			env = executor.get_build_env()
+			targets = executor.get_all_targets()
+			sources = executor.get_all_sources()
+			builder_name = node.get_builder().get_name(env)
+
+			implicit = [dep for target in targets for dep in (target.depends or [])]
+			if builder_name not in COMPILE_BUILDERS:
+				node.scan()
+				implicit.extend(dep for target in targets for dep in (target.implicit or []) if isinstance(dep, SCons.Node.FS.File))
+
+			outputs = ' '.join(escape_path(self.relative(target)) for target in targets)
+			inputs = ' '.join(escape_path(self.relative(source)) for source in sources)
+			implicit_inputs = ' '.join(escape_path(self.relative(dep)) for dep in implicit if dep not in sources)
+			if implicit_inputs != '':
+				inputs += ' | ' + implicit_inputs
+
+			lines = None
+			for action in executor.get_action_list():
+				action_lines = command_lines(action, targets, sources, env, executor)
+				if action_lines is None:
+					lines = None
+					break
+				lines = (lines or []) + action_lines
+
+			if lines is None:
+				yield f'build {outputs}: scons {inputs}\n'
+				continue
+
+			rule = 'command'
+			depfile = None
+			if builder_name in COMPILE_BUILDERS and len(lines) > 0:
+				# header dependencies are written by the compiler itself, not by the whole chain of commands
+				rule = self.compiler_rule(env)
+				if rule == 'compile':
+					depfile = f'{self.relative(targets[0])}.d'
+					line = compiler_line(lines, env)
+					line.extend(['-MMD', '-MF', env.get('ESCAPE', lambda x: x)(depfile)])
+					if '-fmodules-ts' in line:
+						line.append('-Mno-modules') # the BMIs are implicit inputs, and Ninja can't parse GCC's module rules
+				else:
+					compiler_line(lines, env).append('/showIncludes')
+			elif builder_name in ARCHIVE_BUILDERS and os.name == 'posix':
+				rule = 'archive'
+
+			command = ' && '.join(' '.join(line) for line in lines)
+			statement = f'build {outputs}: {rule} {inputs}\n  cmd = {escape_value(command)}\n'
+			if depfile is not None:
+				statement += f'  depfile = {escape_value(depfile)}\n'
+			yield statement
+
+	def rules(self) -> str:
+		scons = f'{sys.executable} {os.path.abspath(sys.argv[0])} -Q'
+		return (
+			f'ninja_required_version = 1.5\n'
+			f'builddir = {escape_path(os.path.join(self.solution.absolute_output_path, ".metascons", "ninja"))}\n\n'
+			f'rule compile\n  command = $cmd\n  depfile = $depfile\n  deps = gcc\n  description = Compiling $out\n\n'
+			f'rule compile_msvc\n  command = $cmd\n  deps = msvc\n  description = Compiling $out\n\n'
+			f'rule archive\n  command = rm -f $out && $cmd\n  description = Archiving $out\n\n'
+			f'rule command\n  command = $cmd\n  description = Building $out\n\n'
+			f'rule scons\n  command = cd {escape_value(self.top_dir)} && {escape_value(scons)} $out\n  description = SCons $out\n  restat = 1\n\n'
+			f'rule regenerate\n  command = cd {escape_value(self.top_dir)} && {escape_value(self.regenerate_command)}\n  description = Regenerating build.ninja\n  generator = 1\n\n'
+		)
+
+	def generate(self) -> str:
+		build_ninja = os.path.relpath(self.path, self.top_dir)
+		scripts = ' '.join(escape_path(os.path.relpath(os.path.abspath(script), self.top_dir)) for script in self.build_scripts)
+
+		content = self.rules()
+		content += f'build {escape_path(build_ninja)}: regenerate | {scripts}\n\n'
+		content += ''.join(self.build_statements())
+		return content
+
+	# writes build.ninja, touching it instead when the content didn't change
+	def write(self) -> bool:
+		content = self.generate()
+
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				if f.read() == content:
+					os.utime(self.path)
+					return False
+		except OSError:
+			pass
+
+		os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		with open(self.path, 'w', encoding='utf-8') as f:
+			f.write(content)
+		return True
@@ -0,0 +1,119 @@
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from typing import BinaryIO
+
+
+# Collects the stdout/stderr of every spawned command into per-thread temporary
+# files (so memory stays bounded no matter how chatty a target is) and emits it
+# as one block when the command finishes, so parallel jobs never interleave.
+# The commands of a target are appended to its log, which the first command of each build starts anew.
+class OutputCapture:
+	def __init__(self, log_directory: str|None, console_limit: int|None = None, root_path: str|None = None):
+		self.log_directory = log_directory
+		self.console_limit = console_limit
+		self.root_path = root_path
+		self.lock = threading.Lock()
+		self._local = threading.local()
+		self._logged_paths: set[str] = set()
+
+	# returns the calling thread's (stdout, stderr) buffers, emptied
+	def buffers(self) -> tuple[BinaryIO, BinaryIO]:
+		if not hasattr(self._local, 'stdout'):
+			self._local.stdout = tempfile.TemporaryFile()
+			self._local.stderr = tempfile.TemporaryFile()
+
+		for buffer in (self._local.stdout, self._local.stderr):
+			buffer.seek(0)
+			buffer.truncate()
+
+		return self._local.stdout, self._local.stderr
+
+	def write_line(self, text: str):
+		with self.lock:
+			sys.stdout.write(text + '\n')
+			sys.stdout.flush()
+
+	# emits the captured output of a finished command atomically and writes its log file
+	def emit(self, target: str|None, command_line: str, stdout: BinaryIO, stderr: BinaryIO, exit_code: int):
+		stdout.flush()
+		stderr.flush()
+
+		log_path = self.log_path(target) if target is not None else None
+		if log_path is not None:
+			self._write_log(log_path, command_line, stdout, stderr, exit_code)
+
+		if stdout.tell() == 0 and stderr.tell() == 0:
+			return
+
+		with self.lock:
+			remaining = self.console_limit
+			for buffer, stream in ((stdout, sys.stdout), (stderr, sys.stderr)):
+				remaining = self._emit_stream(buffer, stream, remaining)
+
+			if remaining is not None and remaining < 0:
+				sys.stderr.write(f'[output of {target} truncated, see {log_path}]\n')
+
+			sys.stdout.flush()
+			sys.stderr.flush()
+
+	# the log of a target, named by its path relative to the log directory, or to the solution's root
+	# (or by its absolute path, for targets outside of both)
+	def log_path(self, target: str) -> str|None:
+		if self.log_directory is None:
+			return None
+
+		target = os.path.abspath(target)
+		relative_target = os.path.splitdrive(target)[1].lstrip(os.sep)
+		for base_path in [self.log_directory, self.root_path]:
+			if base_path is not None and target.startswith(base_path + os.sep):
+				relative_target = os.path.relpath(target, base_path)
+				break
+
+		return os.path.join(self.log_directory, relative_target + '.log.gz')
+
+	# streams a buffer line by line, so color patterns are matched per line
+	def _emit_stream(self, buffer: BinaryIO, stream, remaining: int|None) -> int|None:
+		size = buffer.tell()
+		if size == 0:
+			return remaining
+
+		buffer.seek(0)
+		text = io.TextIOWrapper(buffer, encoding='utf-8', errors='replace', newline='')
+		try:
+			for line in text:
+				if remaining is not None:
+					remaining -= len(line)
+					if remaining < 0:
+						break
+				stream.write(line)
+			else:
+				if not line.endswith('\n'):
+					stream.write('\n')
+		finally:
+			text.detach()
+			buffer.seek(size)
+
+		return remaining
+
+	def _write_log(self, log_path: str, command_line: str, stdout: BinaryIO, stderr: BinaryIO, exit_code: int):
+		os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+		# a gzip member per command, which gzip readers concatenate
+		with self.lock:
+			mode = 'ab' if log_path in self._logged_paths else 'wb'
+			self._logged_paths.add(log_path)
+
+		with gzip.open(log_path, mode, compresslevel=1) as log:
+			log.write(f'$ {command_line}\n'.encode('utf-8'))
+			for name, buffer in (('stdout', stdout), ('stderr', stderr)):
+				size = buffer.tell()
+				log.write(f'--- {name} ---\n'.encode('utf-8'))
+				buffer.seek(0)
+				shutil.copyfileobj(buffer, log)
+				buffer.seek(size)
+			log.write(f'--- exit code {exit_code} ---\n'.encode('utf-8'))
@@ -0,0 +1,87 @@
+import SCons.Taskmaster
+from SCons.Taskmaster import NODE_EXECUTING
+
+
+# Named resource pool (like Ninja's pools): no more than `capacity` targets of the
+# actions assigned to the pool are built concurrently, regardless of the global -j
+class Pool:
+	def __init__(self, name: str, capacity: int):
+		if capacity < 1:
+			raise ValueError(f'Pool "{name}" must have a capacity of at least 1, got {capacity}')
+
+		self.name = name
+		self.capacity = capacity
+		self.active = 0
+		self.peak = 0
+
+	def try_acquire(self) -> bool:
+		if self.active >= self.capacity:
+			return False
+		self.active += 1
+		self.peak = max(self.peak, self.active)
+		return True
+
+	def release(self):
+		self.active -= 1
+
+
+# the pool of the targets of an action assigned to it
+def set_node_pool(node, pool: Pool):
+	node.attributes.metascons_pool = pool
+
+def get_node_pool(node) -> Pool|None:
+	return getattr(node.attributes, 'metascons_pool', None)
+
+
+# Taskmaster that holds back a ready node while its pool is full, instead of handing it to a job that would wait
+# for the pool in its job slot. The node goes back to the candidates once a node of its pool finished, so the other
+# job slots keep building nodes of other pools (or of none) meanwhile.
+# The taskmaster is only used by the thread walking the graph, so the pools need no locking.
+class PoolTaskmaster(SCons.Taskmaster.Taskmaster):
+	def __init__(self, targets=[], tasker=None, order=None, trace=None):
+		super().__init__(targets, tasker, order, trace)
+		self._holders: dict[Pool, list] = {}
+		self._deferred: dict[Pool, list] = {}
+
+	def _find_next_ready_node(self):
+		self._release_finished()
+		while True:
+			node = super()._find_next_ready_node()
+			if node is None or self.ready_exc is not None:
+				return node
+
+			pool = get_node_pool(node)
+			if pool is None:
+				return node
+			if pool.try_acquire():
+				self._holders.setdefault(pool, []).append(node)
+				return node
+
+			# a job holds the pool, so the build waits for it instead of ending when no other node is ready
+			self._deferred.setdefault(pool, []).append(node)
+
+	# releases the pools of the nodes that were built (or failed, or turned out up to date)
+	# and puts back the nodes waiting for them
+	def _release_finished(self):
+		for pool, holders in self._holders.items():
+			running = [node for node in holders if node.get_state() <= NODE_EXECUTING]
+			for _ in range(len(holders) - len(running)):
+				pool.release()
+			holders[:] = running
+
+			deferred = self._deferred.get(pool)
+			if deferred and pool.active < pool.capacity:
+				self.candidates.extend(reversed(deferred))
+				deferred.clear()
+
+	def stop(self):
+		# the waiting nodes are not built, like the other candidates
+		for deferred in self._deferred.values():
+			self.candidates.extend(deferred)
+			deferred.clear()
+		super().stop()
+
+# makes SCons walk the graph with PoolTaskmaster (SCons has no option to choose the taskmaster)
+def install_pool_taskmaster():
+	if not issubclass(SCons.Taskmaster.Taskmaster, PoolTaskmaster):
+		SCons.Taskmaster.Taskmaster = PoolTaskmaster
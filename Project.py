@@ -1,8 +1,7 @@
 import SCons
 import os
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterator
 import SCons.Environment
-from git import Repo
 
 from .Action import Action
 from .Toolset import Toolset
@@ -33,6 +32,14 @@ class Project:
 	def absolute_output_path(self) -> str:
 		return os.path.join(self.parent.absolute_output_path, self.output_path_root_relative_to_parent)
 
+	# the solution at the root of the project tree
+	@property
+	def solution(self) -> 'Solution':
+		from .Solution import Solution
+		if isinstance(self.parent, Solution):
+			return self.parent
+		return self.parent.solution
+
 	# ensure_project_exists at the given path
 	# and if not, it clones the project including its submodules
 	def verify_project_exist(self) -> bool:
@@ -41,6 +48,8 @@ class Project:
 				if self.git_url is None:
 					raise ValueError(f'Project "{self.name}" does not exist and no git url is provided to clone it.')
 
+				from git import Repo # GitPython is slow to import, load it only when cloning
+
 				print(f'{self.absolute_path} does not exist. Cloning from {self.git_url} branch "main"... ', end='')
 				repo = Repo.clone_from(self.git_url, self.absolute_path, branch='main', recursive=True)
 				print(f'Done')
@@ -64,6 +73,14 @@ class Project:
 		
 		return self.parent.find_toolset(name)
 	
+	# all actions of the project and its sub projects
+	def all_actions(self)->Iterator[Action]:
+		for element in self.elements:
+			if isinstance(element, Action):
+				yield element
+			elif isinstance(element, Project):
+				yield from element.all_actions()
+
 	# Add Action to the project
 	def add_action(self, action: Action)->None:
 		self.elements.append(action)
@@ -71,7 +88,7 @@ class Project:
 	def submit_action(self):
 		for element in self.elements:
 			if isinstance(element, Action):
-				element.submit_action()
+				element.submit_configurations()
 			elif isinstance(element, Project):
 				element.submit_action()
 			else:
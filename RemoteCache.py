@@ -0,0 +1,449 @@
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+import SCons.CacheDir
+
+# namespaces of the HTTP API (as in bazel-remote, with action cache validation disabled): the action cache maps
+# the SHA-256 of a key to a small value, the content store holds blobs by their SHA-256
+ACTION_CACHE = 'ac'
+CONTENT_STORE = 'cas'
+
+def sha256_text(text: str) -> str:
+	return hashlib.sha256(text.encode()).hexdigest()
+
+def sha256_file(path: str) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1024 * 1024), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+# Persistent (keep-alive) HTTP connections to a server, reused by the threads making requests
+class ConnectionPool:
+	def __init__(self, url: str, max_connections: int = 8, timeout: float = 5.0):
+		parsed = urllib.parse.urlsplit(url)
+		if parsed.scheme not in ['http', 'https'] or parsed.hostname is None:
+			raise ValueError(f'Invalid remote cache URL {url}, expected http://host[:port][/path]')
+
+		self.scheme = parsed.scheme
+		self.host = parsed.hostname
+		self.port = parsed.port
+		self.base_path = parsed.path.rstrip('/')
+		self.timeout = timeout
+		self._idle: queue.LifoQueue = queue.LifoQueue(max_connections)
+
+	def _connect(self) -> http.client.HTTPConnection:
+		if self.scheme == 'https':
+			return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+		return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+	def _release(self, connection: http.client.HTTPConnection):
+		try:
+			self._idle.put_nowait(connection)
+		except queue.Full:
+			connection.close()
+
+	# sends the request and returns the status and body of the response. A body that is a file is streamed.
+	# An idle connection closed by the server is retried once on a new connection.
+	def request(self, method: str, path: str, body: Any = None, headers: dict[str, str]|None = None) -> tuple[int, bytes]:
+		for attempt in range(2):
+			try:
+				connection = self._idle.get_nowait()
+				is_reused = True
+			except queue.Empty:
+				connection = self._connect()
+				is_reused = False
+
+			try:
+				if hasattr(body, 'seek'):
+					body.seek(0)
+				connection.request(method, self.base_path + path, body=body, headers=headers or {})
+				response = connection.getresponse()
+				data = response.read()
+			except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+				connection.close()
+				if is_reused and attempt == 0:
+					continue
+				raise
+			except Exception:
+				connection.close()
+				raise
+
+			if response.will_close:
+				connection.close()
+			else:
+				self._release(connection)
+			return response.status, data
+		raise ConnectionError('Unreachable') # the second attempt returns or raises
+
+	def close(self):
+		while True:
+			try:
+				self._idle.get_nowait().close()
+			except queue.Empty:
+				return
+
+
+# Stops using the remote after max_failures consecutive failed (or timed out) requests,
+# then lets a single request through every cooldown seconds until one succeeds
+class CircuitBreaker:
+	def __init__(self, max_failures: int = 3, cooldown: float = 30.0):
+		self.max_failures = max_failures
+		self.cooldown = cooldown
+		self.failures = 0
+		self.opened_at: float|None = None
+		self.trips = 0
+		self._lock = threading.Lock()
+
+	@property
+	def is_open(self) -> bool:
+		return self.opened_at is not None
+
+	def allow(self) -> bool:
+		with self._lock:
+			if self.opened_at is None:
+				return True
+			if time.monotonic() - self.opened_at >= self.cooldown:
+				self.opened_at = time.monotonic() # half open: this request probes the remote
+				return True
+			return False
+
+	def succeeded(self):
+		with self._lock:
+			self.failures = 0
+			self.opened_at = None
+
+	def failed(self):
+		with self._lock:
+			self.failures += 1
+			if self.failures >= self.max_failures:
+				if self.opened_at is None:
+					self.trips += 1
+				self.opened_at = time.monotonic()
+
+
+# Client of a remote cache of build outputs over HTTP GET/PUT. An output is stored as a blob in the content store,
+# and its cache key (the signature SCons caches it by) maps to the blob's digest (and mode) in the action cache.
+# Downloads go to the local cache directory, uploads run in the background, and the keys a build used are saved
+# as a manifest that the next build (of the same manifest name) prefetches concurrently.
+# A failing or slow remote is skipped (see CircuitBreaker), so the build falls back to building locally.
+class RemoteCache:
+	def __init__(self, url: str, max_connections: int = 8, timeout: float = 5.0, upload: bool = True, max_failures: int = 3, cooldown: float = 30.0):
+		self.url = url
+		self.upload = upload
+		self.pool = ConnectionPool(url, max_connections, timeout)
+		self.breaker = CircuitBreaker(max_failures, cooldown)
+		self._prefetch_executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='metascons-remote-fetch')
+		self._upload_executor = ThreadPoolExecutor(max_workers=max(1, max_connections // 2), thread_name_prefix='metascons-remote-upload')
+		self._lock = threading.Lock()
+		self._fetches: dict[str, Future] = {}
+		self._uploads: list[Future] = []
+		self._uploaded: set[str] = set()
+		self.used_keys: set[str] = set()
+
+		self.hits = 0
+		self.misses = 0
+		self.prefetched = 0
+		self.uploads = 0
+		self.errors = 0
+		self.bytes_downloaded = 0
+		self.bytes_uploaded = 0
+
+	# the response body of the request (None if not found), None without raising if the remote fails or is skipped
+	def _request(self, method: str, namespace: str, digest: str, body: Any = None, headers: dict[str, str]|None = None) -> bytes|None:
+		if not self.breaker.allow():
+			return None
+		try:
+			status, data = self.pool.request(method, f'/{namespace}/{digest}', body, headers)
+		except (OSError, http.client.HTTPException):
+			self.breaker.failed()
+			with self._lock:
+				self.errors += 1
+			return None
+
+		if status >= 500:
+			self.breaker.failed()
+			with self._lock:
+				self.errors += 1
+			return None
+		self.breaker.succeeded()
+		if status == 404:
+			return None
+		if status >= 400:
+			with self._lock:
+				self.errors += 1
+			return None
+		return data
+
+	# the output of the key in the action cache: the digest of its blob and whether it is executable, None if not found
+	def _get_output(self, key: str) -> tuple[str, bool]|None:
+		data = self._request('GET', ACTION_CACHE, sha256_text(key))
+		if data is None:
+			return None
+		try:
+			output = json.loads(data)
+			if re.fullmatch(r'[0-9a-f]{64}', output['digest']) is None:
+				return None
+			return output['digest'], bool(output.get('executable', False))
+		except (ValueError, KeyError, TypeError):
+			return None
+
+	# downloads the output of the key to path (atomically), returns False if the remote doesn't have it
+	def fetch(self, key: str, path: str) -> bool:
+		output = self._get_output(key)
+		data = self._request('GET', CONTENT_STORE, output[0]) if output is not None else None
+		if output is None or data is None or hashlib.sha256(data).hexdigest() != output[0]:
+			with self._lock:
+				self.misses += 1
+			return False
+
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.remote'
+		with open(temp_path, 'wb') as f:
+			f.write(data)
+		if output[1]:
+			os.chmod(temp_path, 0o755)
+		os.replace(temp_path, path)
+		with self._lock:
+			self.hits += 1
+			self.bytes_downloaded += len(data)
+		return True
+
+	# the fetch of the key to path: the one in progress or done, or a new one (True) run by the executor if given, else by
+	# the caller (see _run_fetch). Prefetches and the build's fetches share it, so a key is downloaded once.
+	def _fetch_future(self, key: str, path: str, executor: ThreadPoolExecutor|None) -> tuple[Future, bool]:
+		with self._lock:
+			future = self._fetches.get(key)
+			if future is not None:
+				return future, False
+			future = executor.submit(self.fetch, key, path) if executor is not None else Future()
+			self._fetches[key] = future
+			return future, True
+
+	def _run_fetch(self, future: Future, key: str, path: str):
+		try:
+			future.set_result(self.fetch(key, path))
+		except Exception as e:
+			future.set_exception(e)
+
+	# fetches the key to path in the background, unless it is already being fetched. Returns True if this started it.
+	def fetch_async(self, key: str, path: str) -> bool:
+		return self._fetch_future(key, path, self._prefetch_executor)[1]
+
+	# records that the build used the key, for the manifest
+	def use(self, key: str):
+		with self._lock:
+			self.used_keys.add(key)
+
+	# fetches the key to path, waiting for its fetch in progress if there is one (a prefetch, or another job's fetch;
+	# requests time out on their own). A new fetch runs in the calling job, not behind the queued prefetches.
+	# Returns False on a miss.
+	def retrieve(self, key: str, path: str) -> bool:
+		self.use(key)
+		future, is_new = self._fetch_future(key, path, None)
+		if is_new:
+			self._run_fetch(future, key, path)
+		try:
+			return future.result() and os.path.exists(path)
+		except Exception:
+			return False
+
+	def _upload(self, key: str, path: str):
+		digest = sha256_file(path)
+		size = os.path.getsize(path)
+		with open(path, 'rb') as f:
+			if self._request('PUT', CONTENT_STORE, digest, f, {'Content-Length': str(size)}) is None:
+				return
+		output = json.dumps({'digest': digest, 'executable': os.access(path, os.X_OK)}).encode()
+		if self._request('PUT', ACTION_CACHE, sha256_text(key), output) is None:
+			return
+		with self._lock:
+			self.uploads += 1
+			self.bytes_uploaded += size
+
+	# uploads the output of the key (at path, in the local cache) in the background
+	def upload_async(self, key: str, path: str):
+		with self._lock:
+			self.used_keys.add(key)
+			if not self.upload or key in self._uploaded:
+				return
+			self._uploaded.add(key)
+			self._uploads.append(self._upload_executor.submit(self._upload, key, path))
+
+	# starts fetching the keys of the manifest that aren't in the local cache (local_path maps a key to its path there)
+	def prefetch_manifest(self, name: str, local_path: Callable[[str], str]):
+		def prefetch():
+			data = self._request('GET', ACTION_CACHE, sha256_text(f'manifest\0{name}'))
+			if data is None:
+				return
+			try:
+				keys = json.loads(data)
+			except ValueError:
+				return
+			for key in keys:
+				if isinstance(key, str) and not os.path.exists(local_path(key)) and self.fetch_async(key, local_path(key)):
+					with self._lock:
+						self.prefetched += 1
+		self._prefetch_executor.submit(prefetch)
+
+	def save_manifest(self, name: str):
+		with self._lock:
+			used_keys = sorted(self.used_keys)
+		if not self.upload or len(used_keys) == 0:
+			return
+		self._request('PUT', ACTION_CACHE, sha256_text(f'manifest\0{name}'), json.dumps(used_keys).encode())
+
+	# waits up to timeout seconds for the uploads, and abandons the prefetches
+	def shutdown(self, timeout: float|None = 60.0):
+		with self._lock:
+			uploads = list(self._uploads)
+		if len(uploads) > 0:
+			wait(uploads, timeout=timeout)
+		self._upload_executor.shutdown(wait=False, cancel_futures=True)
+		self._prefetch_executor.shutdown(wait=False, cancel_futures=True)
+		self.pool.close()
+
+	def summary(self) -> str:
+		summary = f'Remote cache: {self.hits} hits, {self.misses} misses ({self.prefetched} prefetched), {self.uploads} uploads, {self.bytes_downloaded / (1024 * 1024):.1f}MiB down, {self.bytes_uploaded / (1024 * 1024):.1f}MiB up'
+		if self.errors > 0:
+			summary += f', {self.errors} errors'
+		if self.breaker.trips > 0:
+			summary += f' (remote skipped {self.breaker.trips} times after failures)'
+		return summary
+
+
+# CacheDir of SCons backed by the remote cache (see Solution.enable_remote_cache): outputs missing from the local cache
+# directory are fetched from the remote before SCons looks them up, and outputs pushed to the local cache are uploaded
+class RemoteCacheDir(SCons.CacheDir.CacheDir):
+	remote_cache: RemoteCache|None = None
+
+	# path of the output of the key (build signature) in the local cache
+	def local_path(self, key: str) -> str:
+		return os.path.join(self.path, key[:self.config['prefix_len']].upper(), key) # type: ignore
+
+	def retrieve(self, node) -> bool:
+		remote_cache = RemoteCacheDir.remote_cache
+		if remote_cache is not None and self.is_enabled():
+			key = node.get_cachedir_bsig()
+			path = self.local_path(key)
+			if not os.path.exists(path):
+				remote_cache.retrieve(key, path)
+			else:
+				remote_cache.use(key)
+		return super().retrieve(node)
+
+	def push(self, node):
+		result = super().push(node)
+
+		remote_cache = RemoteCacheDir.remote_cache
+		if remote_cache is not None and self.is_enabled() and not self.is_readonly() and not node.nocache:
+			key = node.get_cachedir_bsig()
+			path = self.local_path(key)
+			if os.path.isfile(path) and not os.path.islink(path):
+				remote_cache.upload_async(key, path)
+		return result
+
+
+# Server of the remote cache API storing the entries under a directory, for tests and small teams.
+# Blobs are checked against their digest. delay (in seconds) slows every response down, to test slow remotes.
+class RemoteCacheHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	directory = '.'
+	delay = 0.0
+
+	_path_pattern = re.compile(rf'^/({ACTION_CACHE}|{CONTENT_STORE})/([0-9a-f]{{64}})$')
+
+	def _entry_path(self) -> tuple[str, str]|None:
+		match = self._path_pattern.match(urllib.parse.urlsplit(self.path).path)
+		if match is None:
+			self._reply(400, b'Expected /ac/<sha256> or /cas/<sha256>\n')
+			return None
+		return match.group(2), os.path.join(self.directory, match.group(1), match.group(2)[:2], match.group(2))
+
+	def _reply(self, status: int, body: bytes = b''):
+		if self.delay > 0:
+			time.sleep(self.delay)
+		self.send_response(status)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		if self.command != 'HEAD':
+			self.wfile.write(body)
+
+	def do_GET(self):
+		entry = self._entry_path()
+		if entry is None:
+			return
+		try:
+			with open(entry[1], 'rb') as f:
+				self._reply(200, f.read())
+		except FileNotFoundError:
+			self._reply(404)
+
+	do_HEAD = do_GET
+
+	def do_PUT(self):
+		entry = self._entry_path()
+		if entry is None:
+			return
+		digest, path = entry
+		data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		if path.startswith(os.path.join(self.directory, CONTENT_STORE)) and hashlib.sha256(data).hexdigest() != digest:
+			self._reply(400, b'Digest mismatch\n')
+			return
+
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temp_path = f'{path}.{threading.get_ident()}.tmp'
+		with open(temp_path, 'wb') as f:
+			f.write(data)
+		os.replace(temp_path, path)
+		self._reply(200)
+
+	def log_message(self, format: str, *args: Any):
+		if self.server.verbose: # type: ignore
+			super().log_message(format, *args)
+
+def create_server(directory: str, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0, verbose: bool = False) -> ThreadingHTTPServer:
+	os.makedirs(directory, exist_ok=True)
+	handler = type('Handler', (RemoteCacheHandler,), {'directory': os.path.abspath(directory), 'delay': delay})
+	server = ThreadingHTTPServer((host, port), handler)
+	server.daemon_threads = True
+	server.verbose = verbose # type: ignore
+	return server
+
+def main(argv: list[str]|None = None) -> int:
+	parser = argparse.ArgumentParser(prog=f'python -m {__package__}.RemoteCache', description='Remote cache of MetaSCons (see Solution.enable_remote_cache)')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	serve_parser = commands.add_parser('serve', help='serve a remote cache from a directory')
+	serve_parser.add_argument('--directory', default='remote_cache')
+	serve_parser.add_argument('--host', default='127.0.0.1')
+	serve_parser.add_argument('--port', type=int, default=8080)
+	serve_parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before every response, to test slow remotes')
+	serve_parser.add_argument('--verbose', action='store_true')
+	args = parser.parse_args(argv)
+
+	server = create_server(args.directory, args.host, args.port, args.delay, args.verbose)
+	print(f'Serving the remote cache in {os.path.abspath(args.directory)} at http://{args.host}:{server.server_address[1]}', flush=True)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+import threading
+import time
+
+
+# available physical memory in bytes, or None if it cannot be determined
+def available_memory() -> int|None:
+	try:
+		with open('/proc/meminfo', 'r') as f:
+			for line in f:
+				if line.startswith('MemAvailable:'):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+
+	try:
+		return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+	except (ValueError, OSError, AttributeError):
+		return None
+
+# total physical memory in bytes, or None if it cannot be determined
+def total_memory() -> int|None:
+	try:
+		return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+	except (ValueError, OSError, AttributeError):
+		return None
+
+def cpu_count() -> int:
+	if hasattr(os, 'sched_getaffinity'):
+		return len(os.sched_getaffinity(0))
+	return os.cpu_count() or 1
+
+# converts ru_maxrss to bytes (kilobytes on Linux, bytes on macOS)
+def rusage_to_bytes(maxrss: int) -> int:
+	if sys.platform == 'darwin':
+		return maxrss
+	return maxrss * 1024
+
+
+# Picks the number of parallel jobs from the CPU count, the available memory and the
+# peak RSS recorded for each target in earlier runs, and holds back new jobs while the
+# system is under memory pressure.
+class AdaptiveJobs:
+	def __init__(self, history_path: str, memory_low_water: float = 0.1, default_job_memory: int = 512 * 1024 * 1024, poll_interval: float = 0.1):
+		self.history_path = history_path
+		self.memory_low_water = memory_low_water
+		self.default_job_memory = default_job_memory
+		self.poll_interval = poll_interval
+
+		self.peak_rss: dict[str, int] = {}
+		self._lock = threading.Lock()
+		self._dirty = False
+
+		# the expected RSS of the jobs let through and still running, which the available memory may not show yet
+		self.reserved_memory = 0
+		self.reserved_jobs = 0
+
+		self.throttle_count = 0
+		self.throttle_time = 0.0
+		self.longest_throttle = 0.0
+
+		self.load()
+
+	def load(self):
+		try:
+			with open(self.history_path, 'r', encoding='utf-8') as f:
+				self.peak_rss = json.load(f)
+		except (OSError, ValueError):
+			self.peak_rss = {}
+
+	def save(self):
+		if not self._dirty:
+			return
+
+		os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+		temp_path = self.history_path + '.tmp'
+		with open(temp_path, 'w', encoding='utf-8') as f:
+			json.dump(self.peak_rss, f)
+		os.replace(temp_path, self.history_path)
+		self._dirty = False
+
+	def record(self, target: str, peak_rss: int):
+		with self._lock:
+			if self.peak_rss.get(target) != peak_rss:
+				self.peak_rss[target] = peak_rss
+				self._dirty = True
+
+	# the memory a single job is expected to use: the mean of the heaviest
+	# targets that could possibly run together
+	def job_memory(self, max_jobs: int) -> int:
+		if len(self.peak_rss) == 0:
+			return self.default_job_memory
+
+		heaviest = sorted(self.peak_rss.values(), reverse=True)[:max_jobs]
+		return max(1, sum(heaviest) // len(heaviest))
+
+	def job_count(self) -> int:
+		cpus = cpu_count()
+		available = available_memory()
+		if available is None:
+			return cpus
+
+		return max(1, min(cpus, available // self.job_memory(cpus)))
+
+	# the memory the target is expected to use: its peak RSS in earlier runs, or the default
+	def expected_memory(self, target: str|None) -> int:
+		if target is not None and target in self.peak_rss:
+			return self.peak_rss[target]
+		return self.default_job_memory
+
+	def is_under_pressure(self, reserved_memory: int = 0) -> bool:
+		available = available_memory()
+		total = total_memory()
+		if available is None or total is None or total == 0:
+			return False
+		return (available - reserved_memory) / total < self.memory_low_water
+
+	# blocks until the memory expected for the target fits without pressure, unless nothing else is running (which
+	# could never relieve the pressure). The expected memory is reserved (under the lock, so concurrent jobs don't all
+	# pass the check at once) until release() is called with the returned amount, when the job finishes.
+	def wait_for_memory(self, running_jobs, target: str|None = None) -> int:
+		memory = self.expected_memory(target)
+		start = time.monotonic()
+		while True:
+			with self._lock:
+				if (running_jobs() == 0 and self.reserved_jobs == 0) or not self.is_under_pressure(self.reserved_memory + memory):
+					self.reserved_memory += memory
+					self.reserved_jobs += 1
+					break
+			time.sleep(self.poll_interval)
+
+		waited = time.monotonic() - start
+		if waited >= self.poll_interval: # held back at least once
+			with self._lock:
+				self.throttle_count += 1
+				self.throttle_time += waited
+				self.longest_throttle = max(self.longest_throttle, waited)
+		return memory
+
+	def release(self, memory: int) -> None:
+		with self._lock:
+			self.reserved_memory -= memory
+			self.reserved_jobs -= 1
+
+	def summary(self) -> str:
+		if self.throttle_count == 0:
+			return 'Memory throttling: no jobs were held back'
+		return f'Memory throttling: held back {self.throttle_count} jobs for {self.throttle_time:.2f}s in total (longest {self.longest_throttle:.2f}s)'
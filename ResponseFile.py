@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sys
+
+import SCons.Action
+import SCons.Platform
+import SCons.Subst
+import SCons.Util
+
+# the longest command SCons passes to sh -c on POSIX (Linux's MAX_ARG_STRLEN is 128KiB), with some margin
+DEFAULT_MAX_LINE_LENGTH = 2048 if sys.platform == 'win32' else 100 * 1024
+
+# construction variables of the commands that may exceed the maximum length, run through $TEMPFILE
+RESPONSE_FILE_COMMANDS = ['CCCOM', 'SHCCCOM', 'CXXCOM', 'SHCXXCOM', 'LINKCOM', 'SHLINKCOM', 'ARCOM']
+
+
+# $TEMPFILE that writes the arguments of commands longer than $MAXLINELENGTH to a response file next to the
+# target (<target>.<command digest>.rsp) that is kept between builds and rewritten only when its content changes,
+# instead of a new temporary file per command
+class CachedTempFileMunge(SCons.Platform.TempFileMunge):
+	def __call__(self, target, source, env, for_signature):
+		if for_signature:
+			return self.cmd
+
+		cmd = env.subst_list(self.cmd, SCons.Subst.SUBST_CMD, target, source)[0]
+		try:
+			max_line_length = int(env.subst('$MAXLINELENGTH'))
+		except ValueError:
+			max_line_length = DEFAULT_MAX_LINE_LENGTH
+		if sum(len(argument) for argument in cmd) + len(cmd) - 1 <= max_line_length:
+			return self.cmd
+
+		node = target[0] if SCons.Util.is_List(target) else target
+		cmdlist_key = tuple(self.cmd) if SCons.Util.is_List(self.cmd) else self.cmd
+		cmdlist = getattr(node.attributes, 'tempfile_cmdlist', {}).get(cmdlist_key) if node else None
+		if cmdlist is not None:
+			return cmdlist
+
+		escape = env.get('TEMPFILEARGESCFUNC', SCons.Subst.quote_spaces)
+		arguments = [escape(argument) for argument in cmd[1:]]
+		contents = (env.get('TEMPFILEARGJOIN', ' ').join(arguments) + '\n').encode(env.get('TEMPFILEENCODING', SCons.Platform.TEMPFILE_DEFAULT_ENCODING))
+
+		command_digest = hashlib.sha1(str(cmdlist_key).encode()).hexdigest()[:8]
+		path = f'{node.get_abspath()}.{command_digest}.rsp'
+		write_if_changed(path, contents)
+
+		if SCons.Action.print_actions:
+			cmdstr = env.subst(self.cmdstr, SCons.Subst.SUBST_RAW, target, source) if self.cmdstr is not None else ''
+			if not cmdstr:
+				cmdstr = f'Using response file {path} for command line:\n{cmd[0]} {" ".join(arguments)}'
+				self._print_cmd_str(target, source, env, cmdstr)
+
+		native_path = SCons.Util.get_native_path(path)
+		if env.get('SHELL', None) == 'sh':
+			native_path = native_path.replace('\\', r'\\\\')
+		prefix = env.subst('$TEMPFILEPREFIX') if 'TEMPFILEPREFIX' in env else '@'
+		cmdlist = [cmd[0], prefix + native_path]
+
+		if node is not None:
+			try:
+				node.attributes.tempfile_cmdlist[cmdlist_key] = cmdlist
+			except AttributeError:
+				node.attributes.tempfile_cmdlist = {cmdlist_key: cmdlist}
+		return cmdlist
+
+def write_if_changed(path: str, contents: bytes):
+	try:
+		with open(path, 'rb') as f:
+			if f.read() == contents:
+				return
+	except OSError:
+		pass
+
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	temp_path = f'{path}.{os.getpid()}.tmp'
+	with open(temp_path, 'wb') as f:
+		f.write(contents)
+	os.replace(temp_path, path)
+
+# runs the commands of the environment through a CachedTempFileMunge when they are longer than max_line_length
+def use_response_files(env, max_line_length: int|None = None):
+	env['TEMPFILE'] = CachedTempFileMunge
+	env['MAXLINELENGTH'] = max_line_length if max_line_length is not None else DEFAULT_MAX_LINE_LENGTH
+
+	for variable in RESPONSE_FILE_COMMANDS:
+		command = env.get(variable)
+		if isinstance(command, str) and command != '' and 'TEMPFILE' not in command and "'" not in command:
+			env[variable] = f"${{TEMPFILE('{command}', '${variable}STR')}}"
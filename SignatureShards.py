@@ -0,0 +1,138 @@
+import os
+import pickle
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+	from .Project import Project
+	from .Solution import Solution
+
+SHARD_FILE_NAME = 'sconsign.pickle'
+
+# the signatures of one project: a dictionary of SCons' per directory entries (directory -> pickled entries),
+# read on first access and written back only if an entry changed
+class SignatureShard:
+	def __init__(self, path: str, writable: bool):
+		self.path = path
+		self.writable = writable
+		self._entries: dict[str, bytes]|None = None
+		self.dirty = False
+
+	@property
+	def entries(self) -> dict[str, bytes]:
+		if self._entries is None:
+			try:
+				with open(self.path, 'rb') as f:
+					self._entries = pickle.load(f)
+			except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError):
+				self._entries = {}
+		return self._entries
+
+	def get(self, key: str) -> bytes:
+		return self.entries[key]
+
+	def set(self, key: str, value: bytes):
+		if not self.writable:
+			raise OSError(f'Read-only signature database: {self.path}')
+		if self.entries.get(key) != value:
+			self.entries[key] = value
+			self.dirty = True
+
+	def write(self):
+		if not self.dirty:
+			return
+
+		os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		temp_path = f'{self.path}.{os.getpid()}.tmp'
+		with open(temp_path, 'wb') as f:
+			pickle.dump(self._entries, f, pickle.HIGHEST_PROTOCOL)
+		os.replace(temp_path, self.path)
+		self.dirty = False
+
+
+# A dbm-like SCons signature database (see SConsignFile) that stores the entries of each
+# directory in the shard of the project owning it (the project with the longest source or
+# output path containing the directory) under the project's output path, and the rest in
+# the solution's shard. Shards are loaded when their directories are first examined.
+class ShardedSignatureDatabase:
+	def __init__(self, top_dir: str, owners: list[tuple[str, str]], default_shard_path: str, writable: bool):
+		self.top_dir = top_dir
+		self.writable = writable
+		self.shards: dict[str, SignatureShard] = {}
+		self.default_shard = self._shard(default_shard_path)
+
+		# (directory key prefix, shard), longest prefix first
+		self.owners = sorted(((self._key_of(directory), self._shard(path)) for directory, path in owners), key=lambda owner: len(owner[0]), reverse=True)
+		self._owner_cache: dict[str, SignatureShard] = {}
+
+	def _shard(self, path: str) -> SignatureShard:
+		path = os.path.normcase(os.path.abspath(path))
+		if path not in self.shards:
+			self.shards[path] = SignatureShard(path, self.writable)
+		return self.shards[path]
+
+	# directories are keyed like SCons does: relative to the top directory, or absolute outside of it
+	def _key_of(self, directory: str) -> str:
+		relative_path = os.path.relpath(os.path.abspath(directory), self.top_dir)
+		if relative_path == '..' or relative_path.startswith('..' + os.sep):
+			return os.path.normcase(os.path.abspath(directory))
+		return os.path.normcase(relative_path)
+
+	def shard_of(self, key: str) -> SignatureShard:
+		shard = self._owner_cache.get(key)
+		if shard is not None:
+			return shard
+
+		shard = self.default_shard
+		for prefix, owner in self.owners:
+			if prefix == '.' or key == prefix or key.startswith(prefix + os.sep):
+				shard = owner
+				break
+		self._owner_cache[key] = shard
+		return shard
+
+	def __getitem__(self, key: str) -> bytes:
+		return self.shard_of(key).get(key)
+
+	def __setitem__(self, key: str, value: bytes):
+		self.shard_of(key).set(key, value)
+
+	def __contains__(self, key: str) -> bool:
+		return key in self.shard_of(key).entries
+
+	def keys(self) -> Iterator[str]:
+		for shard in self.shards.values():
+			yield from shard.entries.keys()
+
+	def sync(self):
+		for shard in self.shards.values():
+			shard.write()
+
+	def close(self):
+		self.sync()
+
+
+# the dbm module to pass to SConsignFile: opens a ShardedSignatureDatabase of the solution's
+# projects as they are when SCons first needs signatures (that is, after the SConscripts are read)
+class ShardedSignatureModule:
+	def __init__(self, solution: 'Solution'):
+		self.solution = solution
+
+	def open(self, name: str, flag: str = 'r', mode: int = 0o666) -> ShardedSignatureDatabase:
+		import SCons.Node.FS
+
+		owners = []
+		for project in all_projects(self.solution.projects):
+			shard_path = os.path.join(project.absolute_output_path, '.metascons', SHARD_FILE_NAME)
+			owners.append((project.absolute_output_path, shard_path))
+			owners.append((project.absolute_path, shard_path))
+
+		top_dir = SCons.Node.FS.get_default_fs().Top.get_abspath()
+		default_shard_path = os.path.join(self.solution.absolute_output_path, '.metascons', SHARD_FILE_NAME)
+		return ShardedSignatureDatabase(top_dir, owners, default_shard_path, flag != 'r')
+
+def all_projects(projects: list['Project']) -> Iterator['Project']:
+	from .Project import Project
+
+	for project in projects:
+		yield project
+		yield from all_projects([element for element in project.elements if isinstance(element, Project)])
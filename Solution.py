@@ -1,15 +1,54 @@
 import os
 import platform
 import SCons
-import colorama
 from .Project import Project
-from .ColorizePrintStream import ColorizedWrapper
+from .Pool import Pool, install_pool_taskmaster, set_node_pool
+import atexit
 import sys
+import threading
 from enum import Enum
 from SCons.Environment import Environment
-from SCons.Defaults import DefaultEnvironment
 
 from .Toolset import Toolset
+from typing import TYPE_CHECKING, Any, Iterator
+
+# heavy or optional modules (colorama, subprocess machinery, gzip) are imported only when used
+if TYPE_CHECKING:
+	import colorama
+	from .Action import Action
+	from .OutputCapture import OutputCapture
+	from .Spawn import Spawner
+	from .ResourceMonitor import AdaptiveJobs
+	from .ContentHash import ContentHasher
+	from .BuilderProcessPool import BuilderProcessPool
+	from .BuilderCache import BuilderCache
+	from .BuildHistory import BuildHistory
+	from .HeaderImpact import HeaderImpact
+	from .CPPModules import ModuleScanner
+	from .RemoteCache import RemoteCache
+	from .Configuration import Configuration
+	from .CPPToolset import CPPBuildType, CPPArchitecture
+
+# default value of Solution's environment: SCons' DefaultEnvironment(), created on first use
+# because creating it runs the detection of all the SCons tools
+DEFAULT_ENVIRONMENT: Any = object()
+
+# paths of the (non derived) source files the given nodes are built from
+def source_files(nodes: Any)->list[str]:
+	paths = []
+	visited = set()
+	pending = list(nodes)
+	while len(pending) > 0:
+		node = pending.pop()
+		if id(node) in visited:
+			continue
+		visited.add(id(node))
+
+		if node.has_builder():
+			pending.extend(node.sources)
+		elif isinstance(node, SCons.Node.FS.File):
+			paths.append(node.get_abspath())
+	return paths
 
 class OperatingSystem(Enum):
 	WINDOWS = "Windows"
@@ -17,24 +56,67 @@ class OperatingSystem(Enum):
 	MACOS = "MacOS"
 
 class Solution:
-	def __init__(self, name: str, path: str, output_path_root: str, environment: Environment = DefaultEnvironment()):
+	def __init__(self, name: str, path: str, output_path_root: str, environment: Environment|None = DEFAULT_ENVIRONMENT):
 		self.name = name
 		self.projects = []
 		self.path = os.path.abspath(path)
 		self.output_path_root = os.path.abspath(output_path_root)
 		self.toolsets = {}
+		self.pools: dict[str, Pool] = {}
+		self.configurations: list['Configuration'] = []
 
-		if environment is None:
-			self.environment = Environment()
-		else:
-			self.environment = environment
-
-		if platform.system() == 'Windows':
-			self.set_environment_variable_from_host(['LocalAppData', 'AppData', 'ProgramData', 'ProgramFiles', 'SystemRoot', 'TEMP', 'TMP', 'USERPROFILE', 'windir'])
+		self._environment: Environment|None = None
+		self._environment_argument = environment
 
 		self.stdout_color_patterns = []
 		self.stderr_color_pattern = []
 
+		self.spawner: 'Spawner|None' = None
+		self.output_capture: 'OutputCapture|None' = None
+		self.adaptive_jobs: 'AdaptiveJobs|None' = None
+		self.content_hasher: 'ContentHasher|None' = None
+		self.builder_process_pool: 'BuilderProcessPool|None' = None
+		self._builder_process_pool_lock = threading.Lock()
+		self.builder_cache: 'BuilderCache|None' = None
+		self.build_history: 'BuildHistory|None' = None
+		self.module_scanner: 'ModuleScanner|None' = None
+		self.remote_cache: 'RemoteCache|None' = None
+		self.remote_cache_path: str|None = None
+		self.direct_spawn = False
+
+		# C++ commands longer than this are passed their arguments in a response file (see ResponseFile), None to never do it
+		self.max_command_line_length: int|None = -1
+
+		# started by `python -m MetaSCons.HeaderImpact` (see HeaderImpact.main): analyzes the submitted graph when SCons exits
+		header_impact_arguments = os.environ.get('METASCONS_HEADER_IMPACT')
+		if header_impact_arguments is not None:
+			import json
+
+			def on_exit(arguments: dict = json.loads(header_impact_arguments)):
+				self.analyze_header_impact(**arguments)
+			atexit.register(on_exit)
+
+	# the solution's environment, created on first use
+	@property
+	def environment(self)->Environment:
+		if self._environment is None:
+			if self._environment_argument is DEFAULT_ENVIRONMENT:
+				from SCons.Defaults import DefaultEnvironment
+				self._environment = DefaultEnvironment()
+			elif self._environment_argument is None:
+				self._environment = Environment()
+			else:
+				self._environment = self._environment_argument
+
+			if platform.system() == 'Windows':
+				self.set_environment_variable_from_host(['LocalAppData', 'AppData', 'ProgramData', 'ProgramFiles', 'SystemRoot', 'TEMP', 'TMP', 'USERPROFILE', 'windir'])
+
+		return self._environment
+
+	@environment.setter
+	def environment(self, environment: Environment)->None:
+		self._environment = environment
+
 	@property
 	def absolute_path(self)->str:
 		return self.path
@@ -51,6 +133,11 @@ class Solution:
 	def add_project(self, project: Project)->None:
 		self.projects.append(project)
 	
+	# all actions of all projects in the solution
+	def all_actions(self)->Iterator['Action']:
+		for project in self.projects:
+			yield from project.all_actions()
+
 	def print_solution_tree(self)->None:
 		indent = 0
 		print(f"Solution: {self.name}")
@@ -66,6 +153,39 @@ class Solution:
 		else:
 			return None
 
+	# adds a configuration: C++ actions are then submitted once per configuration, in the same build graph,
+	# with their outputs in a sub directory named after the configuration (see Configuration)
+	def add_configuration(self, build_type: 'CPPBuildType.BuildType', architecture: 'CPPArchitecture.Architecture', name: str|None = None)->'Configuration':
+		from .Configuration import Configuration
+
+		configuration = Configuration(build_type, architecture, name)
+		if any(existing.name == configuration.name for existing in self.configurations):
+			raise ValueError(f'Configuration "{configuration.name}" already exists')
+		self.configurations.append(configuration)
+		return configuration
+
+	# adds a configuration for every combination of the given build types and architectures
+	def set_configuration_matrix(self, build_types: 'list[CPPBuildType.BuildType]', architectures: 'list[CPPArchitecture.Architecture]')->'list[Configuration]':
+		return [self.add_configuration(build_type, architecture) for build_type in build_types for architecture in architectures]
+
+	# C++ commands longer than max_line_length (by default, a limit that suits the platform)
+	# are passed their arguments in a response file. Must be called before the actions are submitted.
+	def set_response_files(self, enabled: bool, max_line_length: int|None = None)->None:
+		self.max_command_line_length = (max_line_length if max_line_length is not None else -1) if enabled else None
+
+	# declares a pool that limits the concurrency of the actions assigned to it (see Action.set_pool)
+	def add_pool(self, name: str, capacity: int)->Pool:
+		pool = Pool(name, capacity)
+		self.pools[name] = pool
+		install_pool_taskmaster()
+		return pool
+
+	def find_pool(self, name: str)->Pool|None:
+		if name in self.pools:
+			return self.pools[name]
+		else:
+			return None
+
 	def set_environment_variable_from_host(self, keys: list[str])->None:
 		for key in keys:
 			self.environment['ENV'][key] = os.environ[key]
@@ -73,20 +193,269 @@ class Solution:
 	def set_environment_variable(self, key: str, value: str)->None:
 		self.environment['ENV'][key] = value
 
-	def set_stdout_color_patterns(self, patterns_and_colors: list[tuple[str, colorama.ansi.AnsiFore|colorama.ansi.AnsiBack|colorama.ansi.AnsiStyle]])->None:
+	def set_stdout_color_patterns(self, patterns_and_colors: 'list[tuple[str, colorama.ansi.AnsiFore|colorama.ansi.AnsiBack|colorama.ansi.AnsiStyle]]')->None:
 		self.stdout_color_patterns = patterns_and_colors
 
-	def set_stderr_color_patterns(self, patterns_and_colors: list[tuple[str, colorama.ansi.AnsiFore|colorama.ansi.AnsiBack|colorama.ansi.AnsiStyle]])->None:
+	def set_stderr_color_patterns(self, patterns_and_colors: 'list[tuple[str, colorama.ansi.AnsiFore|colorama.ansi.AnsiBack|colorama.ansi.AnsiStyle]]')->None:
 		self.stderr_color_patterns = patterns_and_colors
 
 	def install_colorize_stdout(self)->None:
+		from .ColorizePrintStream import ColorizedWrapper
 		self.stdout_colorizer = ColorizedWrapper(sys.stdout, self.stdout_color_patterns)
 		self.stdout_colorizer.install_stdout()
 
 	def install_colorize_stderr(self)->None:
+		from .ColorizePrintStream import ColorizedWrapper
 		self.stderr_colorizer = ColorizedWrapper(sys.stderr, self.stderr_color_patterns)
 		self.stderr_colorizer.install_stderr()
 
+	# captures the stdout/stderr of every command and emits it atomically when the command finishes.
+	# Per-target gzip logs (with the output of each of the target's commands) are written under log_directory
+	# (relative to the output root), named by the targets' paths relative to the solution, unless it is None.
+	# Must be called before the actions are submitted.
+	def enable_output_capture(self, log_directory: str|None = 'logs', console_limit: int|None = None)->None:
+		from .OutputCapture import OutputCapture
+
+		if log_directory is not None:
+			log_directory = os.path.join(self.absolute_output_path, log_directory)
+		self.output_capture = OutputCapture(log_directory, console_limit, self.path)
+		self._ensure_spawner()
+
+	# runs the commands of the actions with posix_spawn, without a shell, when they don't need one
+	# (no operators, redirections, expansions or globs), instead of forking the SCons process to run sh -c.
+	# Must be called before the actions are submitted.
+	def enable_direct_spawn(self)->None:
+		self.direct_spawn = True
+		self._ensure_spawner()
+
+	# picks the number of parallel jobs (unless -j is given on the command line) from the CPU count,
+	# the available memory and the peak RSS of every target recorded in earlier runs.
+	# While building, new jobs are held back when the available memory drops below memory_low_water
+	# (a fraction of the total memory). A throttling summary is printed when SCons exits.
+	def enable_adaptive_jobs(self, memory_low_water: float = 0.1, default_job_memory: int = 512 * 1024 * 1024, print_summary: bool = True)->int:
+		from SCons.Script import SetOption
+		from .ResourceMonitor import AdaptiveJobs
+
+		history_path = os.path.join(self.absolute_output_path, '.metascons', 'peak_rss.json')
+		self.adaptive_jobs = AdaptiveJobs(history_path, memory_low_water, default_job_memory)
+		self._ensure_spawner()
+
+		jobs = self.adaptive_jobs.job_count()
+		SetOption('num_jobs', jobs)
+
+		def on_exit(adaptive_jobs: 'AdaptiveJobs' = self.adaptive_jobs):
+			adaptive_jobs.save()
+			if print_summary:
+				print(adaptive_jobs.summary())
+		atexit.register(on_exit)
+
+		return jobs
+
+	# content signatures of files of at least min_size bytes (SCons' hash chunk size, which the command line overrides)
+	# are computed with a fast hash (through mmap from mmap_threshold bytes), are not recomputed while a file's size,
+	# mtime and inode are unchanged (cached under the output root), and the sources of submitted actions are hashed
+	# concurrently in the background. Signatures change once when enabled, so everything rebuilds once.
+	# Must be called before the actions are submitted.
+	def enable_fast_content_signatures(self, min_size: int = 64 * 1024, mmap_threshold: int = 1024 * 1024, max_workers: int|None = None)->None:
+		from SCons.Script import SetOption
+		from .ContentHash import ContentHasher, install_content_hasher
+
+		SetOption('md5_chunksize', max(1, min_size // 1024))
+
+		cache_path = os.path.join(self.absolute_output_path, '.metascons', 'content_hashes.json')
+		self.content_hasher = ContentHasher(cache_path, mmap_threshold, max_workers)
+		install_content_hasher(self.content_hasher)
+
+		def on_exit(content_hasher: 'ContentHasher' = self.content_hasher):
+			content_hasher.shutdown()
+			content_hasher.save()
+		atexit.register(on_exit)
+
+	# stores the signature database per project (under each project's output path) instead of in a single
+	# .sconsign file, so a build loads and rewrites only the signatures of the projects it examines and changes
+	def enable_sharded_signatures(self)->None:
+		from .SignatureShards import ShardedSignatureModule
+		self.environment.SConsignFile(os.path.join(self.absolute_output_path, '.metascons', 'sconsign'), ShardedSignatureModule(self))
+
+	# caches the targets of the CustomBuildActions that use it (see CustomBuildAction.set_use_cache) under the output root,
+	# keyed by the builder function's code and the sources' contents, in a store of up to max_size bytes.
+	# The least recently used results are evicted and hits, misses and time saved are printed when SCons exits.
+	def enable_builder_cache(self, max_size: int = 1024 * 1024 * 1024, print_summary: bool = True)->None:
+		from .BuilderCache import BuilderCache
+
+		self.builder_cache = BuilderCache(os.path.join(self.absolute_output_path, '.metascons', 'builder_cache'), max_size)
+
+		def on_exit(builder_cache: 'BuilderCache' = self.builder_cache):
+			builder_cache.evict()
+			if print_summary and builder_cache.hits + builder_cache.misses > 0:
+				print(builder_cache.summary())
+		atexit.register(on_exit)
+
+	# appends the metrics of every build (configure time, compile and link durations, cache hits, peak RSS and the duration
+	# of every command) to <output root>/.metascons/history.sqlite when SCons exits, keeping the last max_runs builds.
+	# `python -m MetaSCons.BuildHistory compare` compares the latest build against the previous ones (see BuildHistory).
+	# Must be called before the actions are submitted.
+	def enable_build_history(self, max_runs: int = 1000)->None:
+		from .BuildHistory import BuildHistory
+
+		self.build_history = BuildHistory(os.path.join(self.absolute_output_path, '.metascons', 'history.sqlite'), max_runs)
+		self._ensure_spawner()
+
+		def on_exit(build_history: 'BuildHistory' = self.build_history):
+			from SCons.Script import GetBuildFailures
+
+			cache_hits, cache_misses = self._cache_statistics()
+			exit_code = 1 if len(GetBuildFailures()) > 0 else 0
+			build_history.save(' '.join(sys.argv[1:]), exit_code, cache_hits, cache_misses)
+		atexit.register(on_exit)
+
+	# caches the outputs of the actions in a local cache directory (SCons' CacheDir, under the output root by default)
+	# backed by a remote cache at url, over HTTP GET/PUT (see RemoteCache, and `python -m MetaSCons.RemoteCache serve`).
+	# Outputs are uploaded in the background, unless upload is False, and uploads still pending when SCons exits are waited for
+	# up to upload_timeout seconds. The outputs used by the last build of manifest_name (by default, the solution's name and
+	# platform) are prefetched. Requests time out after timeout seconds, and the remote is skipped while it fails.
+	# Must be called before the actions are submitted.
+	def enable_remote_cache(self, url: str, local_path: str|None = None, manifest_name: str|None = None, upload: bool = True, max_connections: int = 8, timeout: float = 5.0, upload_timeout: float = 60.0, print_summary: bool = True)->None:
+		from .RemoteCache import RemoteCache, RemoteCacheDir
+
+		self.remote_cache_path = local_path if local_path is not None else os.path.join(self.absolute_output_path, '.metascons', 'cache')
+		os.makedirs(os.path.dirname(os.path.abspath(self.remote_cache_path)), exist_ok=True)
+		self.remote_cache = RemoteCache(url, max_connections, timeout, upload)
+		RemoteCacheDir.remote_cache = self.remote_cache
+
+		if manifest_name is None:
+			manifest_name = f'{self.name}-{sys.platform}'
+		self.remote_cache.prefetch_manifest(manifest_name, RemoteCacheDir(self.remote_cache_path).local_path)
+
+		def on_exit(remote_cache: 'RemoteCache' = self.remote_cache):
+			remote_cache.save_manifest(manifest_name)
+			remote_cache.shutdown(upload_timeout)
+			if print_summary and remote_cache.hits + remote_cache.misses + remote_cache.uploads > 0:
+				print(remote_cache.summary())
+		atexit.register(on_exit)
+
+	# keeps this configured solution in memory to serve builds requested with `python -m MetaSCons.Daemon` (see Daemon),
+	# if SCons was started by that client: the call serves until the daemon exits, and then exits SCons.
+	# Must be called last in the SConstruct, once the actions are submitted. The daemon restarts when one
+	# of the build_scripts (by default, the SConstruct) changes, and exits after idle_timeout seconds without requests.
+	def enable_daemon(self, build_scripts: list[str]|None = None, idle_timeout: float|None = 3 * 60 * 60)->None:
+		from .Daemon import DAEMON_ENVIRONMENT_VARIABLE
+		if os.environ.get(DAEMON_ENVIRONMENT_VARIABLE) != '1':
+			return
+
+		from SCons.Script import GetLaunchDir
+		from .Daemon import serve
+
+		if build_scripts is None:
+			build_scripts = [os.path.join(GetLaunchDir(), 'SConstruct')]
+		serve(self, build_scripts, idle_timeout)
+
+	# writes a build.ninja equivalent to the submitted graph, for fast incremental builds with ninja.
+	# build.ninja regenerates itself by running regenerate_command (by default, this SCons invocation
+	# as a dry run) when one of the build_scripts (by default, the SConstruct) changes.
+	# Must be called after the actions are submitted. Returns True if build.ninja changed.
+	def generate_ninja(self, path: str|None = None, regenerate_command: str|None = None, build_scripts: list[str]|None = None)->bool:
+		from .Ninja import NinjaWriter
+		from SCons.Script import GetLaunchDir
+
+		if path is None:
+			path = os.path.join(GetLaunchDir(), 'build.ninja')
+
+		if regenerate_command is None:
+			regenerate_command = f'{sys.executable} {os.path.abspath(sys.argv[0])} -Q -n -s'
+
+		if build_scripts is None:
+			build_scripts = [os.path.join(GetLaunchDir(), 'SConstruct')]
+
+		return NinjaWriter(self, path, regenerate_command, build_scripts).write()
+
+	# prints the headers of the C/C++ actions ranked by the recompilation they cause: the compile time of the objects
+	# including each header (from the build history, see enable_build_history, else the number of objects) times the
+	# number of commits of the last max_commits (or since a date) that changed it. Includes are found by SCons' scanners.
+	# Writes the full ranking as JSON to report_path, if given. Must be called after the actions are submitted.
+	def analyze_header_impact(self, report_path: str|None = None, top: int|None = 50, max_commits: int = 1000, since: str|None = None)->'list[HeaderImpact]':
+		from .HeaderImpact import analyze_header_impact, format_report
+
+		history_path = self.build_history.path if self.build_history is not None else os.path.join(self.absolute_output_path, '.metascons', 'history.sqlite')
+		impacts, has_history = analyze_header_impact(self, history_path, max_commits, since)
+		print(format_report(impacts, self.absolute_path, has_history, top))
+
+		if report_path is not None:
+			import json
+			with open(report_path, 'w', encoding='utf-8') as f:
+				json.dump([impact.to_dict() for impact in impacts], f, indent=1)
+		return impacts
+
+	def _ensure_spawner(self)->'Spawner':
+		if self.spawner is None:
+			from .Spawn import Spawner
+			self.spawner = Spawner(self)
+		return self.spawner
+
+	# the pool of worker processes running the builder functions of CustomBuildActions that use it, one worker per job,
+	# started when the first of them executes: all the SConscripts were read, so the forked workers have every function
+	# registered, and reading them doesn't pay for the workers. Called concurrently by the jobs.
+	def _ensure_builder_process_pool(self)->'BuilderProcessPool':
+		with self._builder_process_pool_lock:
+			if self.builder_process_pool is None:
+				from SCons.Script import GetOption
+				from .BuilderProcessPool import BuilderProcessPool
+
+				self.builder_process_pool = BuilderProcessPool(max(1, GetOption('num_jobs')))
+				self.builder_process_pool.warm_up()
+				atexit.register(self.builder_process_pool.shutdown)
+			return self.builder_process_pool
+
+	# hits and misses of the SCons cache directories (see CacheDir) and of the builder cache
+	def _cache_statistics(self)->tuple[int, int]:
+		hits = misses = 0
+		cache_dirs = {}
+		envs = [self.environment]
+		for action in self.all_actions():
+			envs += [action._env] + list(action._configuration_envs.values())
+		for env in envs:
+			cache_dir = getattr(env, '_last_CacheDir', None)
+			if cache_dir is not None and cache_dir.path is not None:
+				cache_dirs[id(cache_dir)] = cache_dir
+		for cache_dir in cache_dirs.values():
+			hits += cache_dir.hits
+			misses += cache_dir.misses
+
+		if self.builder_cache is not None:
+			hits += self.builder_cache.hits
+			misses += self.builder_cache.misses
+		return hits, misses
+
+	# the scanner of the module dependencies of C++ sources (see CPPAction.add_module_sources), started when first needed,
+	# with its results cached under the output root
+	def _ensure_module_scanner(self)->'ModuleScanner':
+		if self.module_scanner is None:
+			from .CPPModules import ModuleScanner
+
+			self.module_scanner = ModuleScanner(os.path.join(self.absolute_output_path, '.metascons', 'module_scans.json'))
+			atexit.register(self.module_scanner.save)
+		return self.module_scanner
+
+	# called by every action once it is submitted
+	def _on_action_submitted(self, action: 'Action')->None:
+		if action.pool is not None:
+			pool = self.find_pool(action.pool)
+			if pool is None:
+				raise ValueError(f'Pool "{action.pool}" is not declared in the solution {self.name}')
+			for node in action.submitted_action or []:
+				set_node_pool(node, pool)
+
+		if self.spawner is not None:
+			self.spawner.install(action)
+
+		if self.remote_cache_path is not None:
+			from .RemoteCache import RemoteCacheDir
+			action.env.CacheDir(self.remote_cache_path, RemoteCacheDir) # type: ignore
+
+		if self.content_hasher is not None and action.submitted_action is not None:
+			from SCons.Script import GetOption
+			self.content_hasher.prefetch(source_files(action.submitted_action), GetOption('md5_chunksize') * 1024)
+
 	def exit(self, exit_code: int)->None:
 		self.environment.Exit(exit_code) # type: ignore - added to environment dynamically
 
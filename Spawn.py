@@ -0,0 +1,183 @@
+import functools
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+from .ResourceMonitor import rusage_to_bytes
+
+if TYPE_CHECKING:
+	from .Action import Action
+	from .Solution import Solution
+
+
+# guesses the target of a command line from its output switch
+def guess_target(args: list[str]) -> str|None:
+	for i, arg in enumerate(args):
+		arg = arg.strip('"')
+		if arg == '-o' and i + 1 < len(args):
+			return args[i + 1].strip('"')
+		for prefix in ('/Fo', '/OUT:', '-o'):
+			if arg.startswith(prefix) and len(arg) > len(prefix):
+				return arg[len(prefix):]
+	return None
+
+
+# characters of a command line that need a shell: operators, redirections, expansions, globs and comments
+SHELL_CHARACTERS = frozenset('|&;<>()$`*?[]#~{}!\n')
+
+# the arguments of a command line that doesn't need a shell, None if it does
+# (or if it starts with a variable assignment)
+def split_command_line(command_line: str) -> list[str]|None:
+	if any(c in SHELL_CHARACTERS for c in command_line):
+		return None
+	try:
+		args = shlex.split(command_line)
+	except ValueError:
+		return None
+	if len(args) == 0 or '=' in args[0]:
+		return None
+	return args
+
+@functools.lru_cache(maxsize=None)
+def find_program(name: str, path: str) -> str|None:
+	return shutil.which(name, path=path)
+
+# runs the command with posix_spawn (vfork and exec, without copying the page tables of the parent) and returns
+# its exit code and peak RSS in bytes, or None if the program isn't found in the PATH of env or can't be spawned,
+# e.g. a script without #! line (ENOEXEC, which the shell runs) or arguments that are too long (E2BIG, which the
+# shell reports)
+def spawn_direct(args: list[str], env: dict[str, str], stdout: Any = None, stderr: Any = None) -> tuple[int, int]|None:
+	program = find_program(args[0], env.get('PATH', os.defpath)) if os.path.basename(args[0]) == args[0] else args[0]
+	if program is None or not os.access(program, os.X_OK):
+		return None
+
+	file_actions = []
+	if stdout is not None:
+		file_actions.append((os.POSIX_SPAWN_DUP2, stdout.fileno(), 1))
+	if stderr is not None:
+		file_actions.append((os.POSIX_SPAWN_DUP2, stderr.fileno(), 2))
+
+	try:
+		pid = os.posix_spawn(program, args, env, file_actions=file_actions)
+	except OSError:
+		return None
+	_, status, rusage = os.wait4(pid, 0)
+	return os.waitstatus_to_exitcode(status), rusage_to_bytes(rusage.ru_maxrss)
+
+# runs the command line with sh -c and returns its exit code and peak RSS in bytes
+def spawn_shell(sh: str, command_line: str, env: dict[str, str], stdout: Any = None, stderr: Any = None) -> tuple[int, int]:
+	process = subprocess.Popen([sh, '-c', command_line], env=env, close_fds=True, stdout=stdout, stderr=stderr)
+	_, status, rusage = os.wait4(process.pid, 0)
+	process.returncode = os.waitstatus_to_exitcode(status)
+	return process.returncode, rusage_to_bytes(rusage.ru_maxrss)
+
+
+# SPAWN installed in the environment of a single action
+class ActionSpawn:
+	def __init__(self, spawner: 'Spawner', action: 'Action', spawn: Any, pspawn: Any):
+		self.spawner = spawner
+		self.action = action
+		self.spawn = spawn
+		self.pspawn = pspawn
+
+	def __call__(self, sh: str, escape: Any, cmd: str, args: list[str], env: dict[str, str]) -> int:
+		return self.spawner.spawn(self, sh, escape, cmd, args, env)
+
+
+# Runs the commands of all submitted actions of a solution
+class Spawner:
+	def __init__(self, solution: 'Solution'):
+		self.solution = solution
+		self._local = threading.local()
+		self._running_lock = threading.Lock()
+		self._running = 0
+
+	@property
+	def running_jobs(self) -> int:
+		return self._running
+
+	def install(self, action: 'Action'):
+		env = action.env
+		if isinstance(env.get('SPAWN'), ActionSpawn):
+			return
+
+		env['SPAWN'] = ActionSpawn(self, action, env['SPAWN'], env['PSPAWN'])
+		env['PRINT_CMD_LINE_FUNC'] = functools.partial(self.print_cmd_line, print_cmd_line=env.get('PRINT_CMD_LINE_FUNC'))
+
+	# SCons prints the command line in the same thread right before spawning it,
+	# which is the only place the target of a command is known. The command line is printed
+	# with the environment's own PRINT_CMD_LINE_FUNC, if it has one.
+	def print_cmd_line(self, s: str, target: Any, source: Any, env: Any, print_cmd_line: Any = None):
+		self._local.target = str(target[0]) if target else None
+
+		output_capture = self.solution.output_capture
+		if print_cmd_line is not None:
+			if output_capture is not None:
+				with output_capture.lock:
+					print_cmd_line(s, target, source, env)
+			else:
+				print_cmd_line(s, target, source, env)
+		elif output_capture is not None:
+			output_capture.write_line(s)
+		else:
+			sys.stdout.write(s + '\n')
+
+	def spawn(self, action_spawn: ActionSpawn, sh: str, escape: Any, cmd: str, args: list[str], env: dict[str, str]) -> int:
+		target = getattr(self._local, 'target', None) or guess_target(args)
+		self._local.target = None
+
+		adaptive_jobs = self.solution.adaptive_jobs
+		reserved_memory = adaptive_jobs.wait_for_memory(lambda: self.running_jobs, target) if adaptive_jobs is not None else 0
+
+		output_capture = self.solution.output_capture
+		stdout, stderr = output_capture.buffers() if output_capture is not None else (None, None)
+
+		build_history = self.solution.build_history
+		if build_history is not None:
+			build_history.command_started()
+
+		with self._running_lock:
+			self._running += 1
+		started = time.monotonic()
+		try:
+			exit_code, peak_rss = self._run(action_spawn, sh, escape, cmd, args, env, stdout, stderr)
+		finally:
+			duration = time.monotonic() - started
+			with self._running_lock:
+				self._running -= 1
+			if adaptive_jobs is not None:
+				adaptive_jobs.release(reserved_memory)
+
+		if build_history is not None:
+			build_history.record(target, args, duration, peak_rss, exit_code)
+
+		if adaptive_jobs is not None and target is not None and peak_rss is not None:
+			adaptive_jobs.record(target, peak_rss)
+
+		if output_capture is not None:
+			output_capture.emit(target, ' '.join(args), stdout, stderr, exit_code) # type: ignore
+
+		return exit_code
+
+	# runs the command and returns its exit code and peak RSS in bytes (None if unknown)
+	def _run(self, action_spawn: ActionSpawn, sh: str, escape: Any, cmd: str, args: list[str], env: dict[str, str], stdout: Any, stderr: Any) -> tuple[int, int|None]:
+		if os.name != 'posix':
+			if stdout is None:
+				return action_spawn.spawn(sh, escape, cmd, args, env), None
+			return action_spawn.pspawn(sh, escape, cmd, args, env, stdout, stderr), None
+
+		command_line = ' '.join(args)
+		if self.solution.direct_spawn and hasattr(os, 'posix_spawn'):
+			direct_args = split_command_line(command_line)
+			if direct_args is not None:
+				result = spawn_direct(direct_args, env, stdout, stderr)
+				if result is not None:
+					return result
+
+		# same as SCons' posix spawn, but waits with wait4 to get the resource usage of the child
+		return spawn_shell(sh, command_line, env, stdout, stderr)
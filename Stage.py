@@ -0,0 +1,135 @@
+import os
+import shutil
+import stat
+import sys
+from typing import Any
+
+from SCons.Node import NodeList
+
+from .Action import Action
+from .Project import Project
+
+# ioctl of Linux that shares the extents of a file with another (copy-on-write), on btrfs, XFS, bcachefs, etc.
+FICLONE = 0x40049409
+
+# True if the destination is the source (hardlink) or was staged from it (same size and modification time)
+def is_staged(source: str, dest: str) -> bool:
+	try:
+		source_stat = os.stat(source)
+		dest_stat = os.stat(dest)
+	except OSError:
+		return False
+
+	if (source_stat.st_dev, source_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+		return True
+	return source_stat.st_size == dest_stat.st_size and source_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+def reflink(source: str, dest: str):
+	if not sys.platform.startswith('linux'):
+		raise OSError('Reflinks are not supported on this platform')
+
+	import fcntl
+	with open(source, 'rb') as source_file, open(dest, 'wb') as dest_file:
+		fcntl.ioctl(dest_file.fileno(), FICLONE, source_file.fileno())
+	shutil.copystat(source, dest)
+
+# stages a file by reflink, else hardlink, else copy (unless already staged).
+# The file is created next to the destination and renamed over it, so the destination is never partially written.
+def stage_file(source: str, dest: str, hardlink: bool = True) -> str:
+	if is_staged(source, dest):
+		return 'skipped'
+
+	temp_path = f'{dest}.{os.getpid()}.stage'
+	methods = [('reflink', reflink)]
+	if hardlink:
+		methods.append(('hardlink', os.link))
+	methods.append(('copy', shutil.copy2))
+
+	for method, function in methods:
+		try:
+			function(source, temp_path)
+		except OSError:
+			if os.path.lexists(temp_path):
+				os.remove(temp_path)
+			if method == 'copy':
+				raise
+			continue
+
+		os.replace(temp_path, dest)
+		return method
+	raise OSError(f'Failed to stage {source}') # unreachable, copy raises
+
+def stage_tree(source: str, dest: str, hardlink: bool = True):
+	if os.path.isdir(source):
+		os.makedirs(dest, exist_ok=True)
+		for name in os.listdir(source):
+			stage_tree(os.path.join(source, name), os.path.join(dest, name), hardlink)
+	elif os.path.islink(source):
+		if os.path.lexists(dest):
+			os.remove(dest)
+		os.symlink(os.readlink(source), dest)
+	else:
+		stage_file(source, dest, hardlink)
+		os.chmod(dest, stat.S_IMODE(os.stat(source).st_mode) | stat.S_IWRITE)
+
+# $INSTALL functions of SCons' Install builder (which calls them for each file or directory to install)
+def stage_install(dest: str, source: str, env) -> int:
+	stage_tree(source, dest)
+	return 0
+
+def stage_install_without_hardlinks(dest: str, source: str, env) -> int:
+	stage_tree(source, dest, hardlink=False)
+	return 0
+
+
+# Stages the outputs of actions (or files) into a directory under the project's output path, without copying when the
+# file system allows: files are reflinked (copy-on-write), else hardlinked, else copied, and files already staged
+# (same inode, or same size and modification time) are left as they are.
+# Hardlinked files share their content with the build outputs, so disable hardlinks if something modifies the staged files in place.
+# When the solution has configurations, each configuration is staged into <output path>/<configuration name>.
+class StageAction(Action):
+	def __init__(self, project: Project, sources: Action|list[Any]|NodeList, output_path_relative_to_parent: str, hardlink: bool = True, add_action_to_project: bool = True):
+		super().__init__(project, add_action_to_project)
+
+		self.sources = sources
+		self.output_path_relative_to_parent = output_path_relative_to_parent
+		self.hardlink = hardlink
+		self.env['INSTALL'] = stage_install if hardlink else stage_install_without_hardlinks
+
+	@property
+	def absolute_output_path(self) -> str:
+		return os.path.join(self.project.absolute_output_path, self.output_path_relative_to_parent)
+
+	def submit_configurations(self):
+		configurations = self.project.solution.configurations
+		if len(configurations) == 0 or not isinstance(self.sources, Action):
+			self.submit_action()
+			return
+
+		for configuration in configurations:
+			self.set_configuration(configuration)
+			try:
+				self.submit_action()
+			finally:
+				self.set_configuration(None)
+
+	def _source_nodes(self) -> Any:
+		from .CPPActions import CPPAction
+
+		if isinstance(self.sources, CPPAction):
+			return self.sources.submitted_for(self.configuration)
+
+		if isinstance(self.sources, Action):
+			if self.sources.submitted_action is None:
+				self.sources.submit_action()
+			return self.sources.submitted_action
+
+		return self.sources
+
+	def submit_action(self):
+		output_path = self.absolute_output_path if self.configuration is None else self.configuration.output_path(self.absolute_output_path)
+		action: NodeList = self.env.Install(output_path, self._source_nodes()) # type: ignore
+
+		# SCons removes targets before building them, which would defeat skipping the staged files
+		self.env.Precious(action)
+		self._set_submitted_action(action)
@@ -0,0 +1,213 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+
+# environment variables selecting the shard to run (as in GoogleTest), for distributing the tests over CI workers
+SHARD_INDEX_VARIABLE = 'METASCONS_TEST_SHARD_INDEX'
+SHARD_COUNT_VARIABLE = 'METASCONS_TEST_SHARD_COUNT'
+
+class TestResult:
+	PASSED = 'passed'
+	FAILED = 'failed'
+	TIMEOUT = 'timeout'
+	ERROR = 'error'
+
+	def __init__(self, name: str, status: str, duration: float, exit_code: int|None, output: str, cached: bool = False):
+		self.name = name
+		self.status = status
+		self.duration = duration
+		self.exit_code = exit_code
+		self.output = output
+		self.cached = cached
+
+	def to_dict(self) -> dict:
+		return {'name': self.name, 'status': self.status, 'duration': self.duration, 'exit_code': self.exit_code, 'output': self.output}
+
+	@staticmethod
+	def from_dict(data: dict, cached: bool = False) -> 'TestResult':
+		return TestResult(data['name'], data['status'], data['duration'], data['exit_code'], data['output'], cached)
+
+def file_digest(path: str) -> str:
+	digest = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1024 * 1024), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+# holds an exclusive lock on the file at path (created if needed) while the context runs
+@contextlib.contextmanager
+def file_lock(path: str):
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	with open(path, 'a+b') as f:
+		if os.name == 'nt':
+			import msvcrt
+			f.seek(0)
+			msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+		else:
+			import fcntl
+			fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			if os.name == 'nt':
+				f.seek(0)
+				msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+			else:
+				fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+# the tests of a shard: tests are sorted by name and dealt to the shards in turn
+def select_shard(tests: list[str], shard_index: int, shard_count: int) -> list[str]:
+	if shard_count < 1 or not 0 <= shard_index < shard_count:
+		raise ValueError(f'Invalid shard {shard_index} of {shard_count}')
+	return [test for i, test in enumerate(sorted(tests)) if i % shard_count == shard_index]
+
+
+# Runs test executables in parallel with a timeout each. Passed results are cached by the path and hash
+# of the test binary and the hash of its runtime inputs, so a test is only run again when one of them changes.
+# Runners sharing a cache (e.g. the shards of a CI job) merge their results into it.
+class TestRunner:
+	def __init__(self, cache_path: str|None = None, jobs: int|None = None, timeout: float|None = 60.0, runtime_inputs: list[str] = []):
+		self.cache_path = cache_path
+		self.jobs = jobs or os.cpu_count() or 1
+		self.timeout = timeout
+		self.runtime_inputs = runtime_inputs
+		self._cache: dict[str, dict] = self._load_cache()
+		self._inputs_digest: str|None = None
+
+	def _load_cache(self) -> dict:
+		if self.cache_path is None:
+			return {}
+		try:
+			with open(self.cache_path, 'r', encoding='utf-8') as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	# adds the entries to the cache file as it is now, in case other runners saved theirs since it was loaded
+	def _save_cache(self, entries: dict[str, dict]):
+		if self.cache_path is None:
+			return
+		with file_lock(self.cache_path + '.lock'):
+			self._cache = self._load_cache()
+			self._cache.update(entries)
+			temp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+			with open(temp_path, 'w', encoding='utf-8') as f:
+				json.dump(self._cache, f)
+			os.replace(temp_path, self.cache_path)
+
+	def cache_key(self, test: str) -> str:
+		if self._inputs_digest is None:
+			digest = hashlib.sha1()
+			for path in sorted(self.runtime_inputs):
+				digest.update(f'{path}\0{file_digest(path)}\0'.encode())
+			self._inputs_digest = digest.hexdigest()
+		return f'{os.path.abspath(test)}:{file_digest(test)}:{self._inputs_digest}'
+
+	def run_test(self, test: str) -> TestResult:
+		start = time.perf_counter()
+		try:
+			process = subprocess.run([os.path.abspath(test)], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=self.timeout, cwd=os.path.dirname(os.path.abspath(test)))
+		except subprocess.TimeoutExpired as e:
+			output = (e.output or b'').decode(errors='replace')
+			return TestResult(test, TestResult.TIMEOUT, time.perf_counter() - start, None, output + f'\nTimed out after {self.timeout} seconds')
+		except OSError as e:
+			return TestResult(test, TestResult.ERROR, time.perf_counter() - start, None, str(e))
+
+		status = TestResult.PASSED if process.returncode == 0 else TestResult.FAILED
+		return TestResult(test, status, time.perf_counter() - start, process.returncode, process.stdout.decode(errors='replace'))
+
+	# runs the tests (that aren't cached as passed) and returns their results in the given order
+	def run(self, tests: list[str]) -> list[TestResult]:
+		keys = {test: self.cache_key(test) for test in tests}
+		results: dict[str, TestResult] = {}
+		to_run = []
+		for test in tests:
+			cached = self._cache.get(keys[test])
+			if cached is not None:
+				results[test] = TestResult.from_dict(cached, cached=True)
+			else:
+				to_run.append(test)
+
+		passed = {}
+		with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+			for test, result in zip(to_run, executor.map(self.run_test, to_run)):
+				results[test] = result
+				if result.status == TestResult.PASSED:
+					passed[keys[test]] = result.to_dict()
+
+		if len(passed) > 0:
+			self._save_cache(passed)
+		return [results[test] for test in tests]
+
+def write_junit(results: list[TestResult], path: str, suite_name: str = 'MetaSCons'):
+	suite = ElementTree.Element('testsuite', {
+		'name': suite_name,
+		'tests': str(len(results)),
+		'failures': str(sum(1 for result in results if result.status == TestResult.FAILED)),
+		'errors': str(sum(1 for result in results if result.status in [TestResult.TIMEOUT, TestResult.ERROR])),
+		'skipped': '0',
+		'time': f'{sum(result.duration for result in results if not result.cached):.3f}',
+	})
+	for result in results:
+		case = ElementTree.SubElement(suite, 'testcase', {'classname': suite_name, 'name': os.path.basename(result.name), 'file': result.name, 'time': f'{result.duration:.3f}'})
+		if result.status == TestResult.FAILED:
+			ElementTree.SubElement(case, 'failure', {'message': f'exit code {result.exit_code}'}).text = result.output
+		elif result.status in [TestResult.TIMEOUT, TestResult.ERROR]:
+			ElementTree.SubElement(case, 'error', {'message': result.status}).text = result.output
+		else:
+			ElementTree.SubElement(ElementTree.SubElement(case, 'properties'), 'property', {'name': 'cached', 'value': str(result.cached).lower()})
+		if result.status == TestResult.PASSED and result.output != '':
+			ElementTree.SubElement(case, 'system-out').text = result.output
+
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	tree = ElementTree.ElementTree(suite)
+	ElementTree.indent(tree)
+	tree.write(path, encoding='utf-8', xml_declaration=True)
+
+def print_summary(results: list[TestResult], file=sys.stdout):
+	for result in results:
+		if result.status != TestResult.PASSED:
+			print(f'{result.status.upper()}: {result.name}\n{result.output}', file=file)
+	cached = sum(1 for result in results if result.cached)
+	passed = sum(1 for result in results if result.status == TestResult.PASSED)
+	print(f'{passed}/{len(results)} tests passed ({cached} cached)', file=file)
+
+# the shard to run, from the environment (all tests by default)
+def shard_from_environment() -> tuple[int, int]:
+	return int(os.environ.get(SHARD_INDEX_VARIABLE, '0')), int(os.environ.get(SHARD_COUNT_VARIABLE, '1'))
+
+# runs the tests of the shard, writes the JUnit report and returns whether they all passed
+def run_tests(tests: list[str], junit_path: str, cache_path: str|None = None, jobs: int|None = None, timeout: float|None = 60.0, runtime_inputs: list[str] = [], shard_index: int = 0, shard_count: int = 1) -> bool:
+	runner = TestRunner(cache_path, jobs, timeout, runtime_inputs)
+	results = runner.run(select_shard(tests, shard_index, shard_count))
+	write_junit(results, junit_path)
+	print_summary(results)
+	return all(result.status == TestResult.PASSED for result in results)
+
+# python -m MetaSCons.TestRunner [--jobs N] [--timeout S] [--shard-index I --shard-count N] [--cache PATH] [--input PATH ...] --junit PATH TEST ...
+def main(argv: list[str]|None = None) -> int:
+	default_shard_index, default_shard_count = shard_from_environment()
+
+	parser = argparse.ArgumentParser(description='Runs test executables in parallel, with result caching and JUnit XML output')
+	parser.add_argument('tests', nargs='+')
+	parser.add_argument('--junit', required=True, help='path of the JUnit XML report')
+	parser.add_argument('--cache', help='path of the result cache')
+	parser.add_argument('--jobs', type=int)
+	parser.add_argument('--timeout', type=float, default=60.0, help='timeout of each test in seconds')
+	parser.add_argument('--input', action='append', default=[], help='runtime input of the tests, part of the cache key')
+	parser.add_argument('--shard-index', type=int, default=default_shard_index)
+	parser.add_argument('--shard-count', type=int, default=default_shard_count)
+	args = parser.parse_args(argv)
+
+	passed = run_tests(args.tests, args.junit, args.cache, args.jobs, args.timeout, args.input, args.shard_index, args.shard_count)
+	return 0 if passed else 1
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .CPPToolset import CPPCompiler
+
+PROBE_SOURCE = 'int main() { return 0; }\n'
+
+def default_cache_path() -> str:
+	cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+	return os.path.join(cache_home, 'metascons', 'toolchains.json')
+
+def default_executable(compiler: CPPCompiler) -> str:
+	if compiler == CPPCompiler.CLCLANG:
+		return 'clang-cl'
+	return compiler.value
+
+
+# Detects the version of a compiler and which flags it supports. Candidate flags are
+# tested concurrently, and results are persisted in a cache keyed by the compiler's
+# path and modification time (with its version stored alongside), so warm runs spawn nothing.
+class ToolchainProbe:
+	# language of a probe: compile as C, compile as C++, or compile and link C++
+	C = 'c'
+	CPP = 'c++'
+	LINK = 'link'
+
+	def __init__(self, compiler: CPPCompiler, executable: str|None = None, cache_path: str|None = None, max_workers: int|None = None):
+		self.compiler = compiler
+		self.executable = shutil.which(executable or default_executable(compiler))
+		if self.executable is None:
+			raise Exception(f'Compiler "{executable or default_executable(compiler)}" is not found in PATH')
+		self.executable = os.path.realpath(self.executable)
+
+		self.cache_path = cache_path or default_cache_path()
+		self.max_workers = max_workers or min(32, os.cpu_count() or 1)
+		self._lock = threading.Lock()
+		self._warned: set[str] = set()
+
+		stat = os.stat(self.executable)
+		self.key = f'{self.executable}|{stat.st_mtime_ns}|{stat.st_size}'
+		self._entry = self._load_entry()
+
+	@property
+	def is_msvc_style(self) -> bool:
+		return self.compiler in [CPPCompiler.CL, CPPCompiler.CLCLANG]
+
+	@property
+	def version(self) -> str:
+		if 'version' not in self._entry:
+			self._entry['version'] = self._detect_version()
+			self._save_entry()
+		return self._entry['version']
+
+	def is_supported(self, flags: str, language: str = CPP) -> bool:
+		return self.check_flags([(flags, language)])[(flags, language)]
+
+	# returns whether each of the given (flags, language) candidates is supported,
+	# where flags is a command line fragment
+	def check_flags(self, candidates: list[tuple[str, str]]) -> dict[tuple[str, str], bool]:
+		results = self._entry.setdefault('flags', {})
+		missing = list(dict.fromkeys(candidate for candidate in candidates if f'{candidate[1]}:{candidate[0]}' not in results))
+
+		if len(missing) > 0:
+			self.version # recorded with the results, for diagnostics
+			with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+				for (flags, language), supported in zip(missing, executor.map(lambda candidate: self._probe(*candidate), missing)):
+					results[f'{language}:{flags}'] = supported
+			self._save_entry()
+
+		return {candidate: results[f'{candidate[1]}:{candidate[0]}'] for candidate in candidates}
+
+	def warn_unsupported(self, flags_list: list[str]):
+		for flags in flags_list:
+			if flags not in self._warned:
+				self._warned.add(flags)
+				print(f'Warning: {self.version} does not support "{flags}", dropping it', file=sys.stderr)
+
+	def _detect_version(self) -> str:
+		arguments = [self.executable] if self.compiler == CPPCompiler.CL else [self.executable, '--version']
+		process = subprocess.run(arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+		output = process.stdout if self.compiler != CPPCompiler.CL else process.stderr
+		return output.strip().splitlines()[0] if output.strip() != '' else 'unknown'
+
+	def _probe(self, flags: str, language: str) -> bool:
+		with tempfile.TemporaryDirectory(prefix='metascons_probe_') as directory:
+			source = os.path.join(directory, 'probe.c' if language == self.C else 'probe.cpp')
+			with open(source, 'w', encoding='utf-8') as f:
+				f.write(PROBE_SOURCE)
+
+			if self.is_msvc_style:
+				arguments = [self.executable, '/nologo', '/WX'] + flags.split()
+				arguments += [f'/Tc{source}' if language == self.C else f'/Tp{source}']
+				if language == self.LINK:
+					arguments += [f'/Fe{os.path.join(directory, "probe.exe")}', f'/Fo{directory}{os.sep}']
+				else:
+					arguments += ['/c', f'/Fo{os.path.join(directory, "probe.obj")}']
+			else:
+				arguments = [self.executable, '-Werror'] + flags.split() + ['-x', 'c' if language == self.C else 'c++', source]
+				if language == self.LINK:
+					arguments += ['-o', os.path.join(directory, 'probe')]
+				else:
+					arguments += ['-c', '-o', os.path.join(directory, 'probe.o')]
+
+			try:
+				process = subprocess.run(arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=directory)
+			except OSError:
+				return False
+			return process.returncode == 0
+
+	def _load_cache(self) -> dict:
+		try:
+			with open(self.cache_path, 'r', encoding='utf-8') as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def _load_entry(self) -> dict:
+		return self._load_cache().get(self.key, {})
+
+	def _save_entry(self):
+		with self._lock:
+			cache = self._load_cache()
+			cache[self.key] = self._entry
+
+			os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+			temp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+			with open(temp_path, 'w', encoding='utf-8') as f:
+				json.dump(cache, f, indent=1)
+			os.replace(temp_path, self.cache_path)
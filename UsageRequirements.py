@@ -0,0 +1,61 @@
+from typing import Any, Iterable
+
+# the items in order, without duplicates, keeping the first occurrence of each
+def unique_first(items: Iterable[Any]) -> list[Any]:
+	return list(dict.fromkeys(items))
+
+# the items in order, without duplicates, keeping the last occurrence of each
+# (for libraries, which must come after everything that uses them)
+def unique_last(items: Iterable[Any]) -> list[Any]:
+	return list(reversed(dict.fromkeys(reversed(list(items)))))
+
+
+# Static libraries that depend on each other (names or nodes). The group is deduplicated as one library and expanded
+# by expand_link_groups into its libraries twice (`a b a b`), so the linker resolves the symbols they take from each other.
+class LinkGroup:
+	def __init__(self, libraries: list[Any]):
+		self.libraries = tuple(libraries)
+
+	def __eq__(self, other: object) -> bool:
+		return isinstance(other, LinkGroup) and self.libraries == other.libraries
+
+	def __hash__(self) -> int:
+		return hash(self.libraries)
+
+	def __repr__(self) -> str:
+		return f'LinkGroup({list(self.libraries)})'
+
+# the libraries with each link group replaced by its libraries, repeated once
+def expand_link_groups(libraries: Iterable[Any]) -> list[Any]:
+	expanded = []
+	for library in libraries:
+		if isinstance(library, LinkGroup):
+			expanded.extend(list(library.libraries) * 2)
+		else:
+			expanded.append(library)
+	return expanded
+
+
+# What using a library requires: include paths and C++ modules (names and BMI paths) to compile against it,
+# and library paths and libraries (names or nodes) to link against it
+class UsageRequirements:
+	def __init__(self, include_paths: list[Any]|None = None, library_paths: list[Any]|None = None, libraries: list[Any]|None = None, modules: list[tuple[str, str]]|None = None):
+		self.include_paths = include_paths if include_paths is not None else []
+		self.library_paths = library_paths if library_paths is not None else []
+		self.libraries = libraries if libraries is not None else []
+		self.modules = modules if modules is not None else []
+
+	def add(self, other: 'UsageRequirements', include: bool = True, link: bool = True):
+		if include:
+			self.include_paths.extend(other.include_paths)
+			self.modules.extend(other.modules)
+		if link:
+			self.library_paths.extend(other.library_paths)
+			self.libraries.extend(other.libraries)
+
+	def deduplicate(self) -> 'UsageRequirements':
+		self.include_paths = unique_first(self.include_paths)
+		self.modules = unique_first(self.modules)
+		self.library_paths = unique_first(self.library_paths)
+		self.libraries = unique_last(self.libraries)
+		return self
@@ -0,0 +1,48 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# directory to put on sys.path to import the package as MetaSCons, whatever the checkout is named
+@pytest.fixture(scope='session')
+def package_parent(tmp_path_factory) -> str:
+	if os.path.basename(REPOSITORY) == 'MetaSCons':
+		return os.path.dirname(REPOSITORY)
+
+	parent = tmp_path_factory.mktemp('package')
+	os.symlink(REPOSITORY, parent / 'MetaSCons')
+	return str(parent)
+
+# imports a module of the package in the tests' process
+@pytest.fixture
+def import_module(package_parent):
+	def load(name: str):
+		if package_parent not in sys.path:
+			sys.path.insert(0, package_parent)
+		return importlib.import_module(f'MetaSCons.{name}')
+	return load
+
+# writes an SConstruct into root that imports the package, followed by body
+@pytest.fixture
+def write_sconstruct(package_parent):
+	def write(root, body: str):
+		with open(os.path.join(root, 'SConstruct'), 'w', encoding='utf-8') as f:
+			f.write(f'import sys\nsys.path.insert(0, {package_parent!r})\n{body}')
+	return write
+
+# runs SCons in root and returns the completed process (stdout and stderr as text)
+@pytest.fixture
+def run_scons(package_parent):
+	def run(root, *arguments: str, check: bool = True) -> subprocess.CompletedProcess:
+		env = dict(os.environ)
+		env['PYTHONPATH'] = os.pathsep.join([package_parent] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+		process = subprocess.run([sys.executable, '-m', 'SCons', '-Q'] + list(arguments), cwd=root, env=env, capture_output=True, text=True)
+		if check and process.returncode != 0:
+			raise AssertionError(f'SCons failed with exit code {process.returncode}\n{process.stdout}\n{process.stderr}')
+		return process
+	return run
@@ -0,0 +1,29 @@
+def add_run(BuildHistory, path, total_time: float, commands: int):
+	connection = BuildHistory.connect(str(path))
+	with connection:
+		connection.execute('INSERT INTO runs (started, command_line, exit_code, total_time, configure_time, compile_time, link_time, commands, cache_hits, cache_misses, peak_rss, scons_peak_rss) VALUES (0, ?, 0, ?, 0, 0, 0, ?, 0, 0, 0, 0)',
+			('-j8', total_time, commands))
+	connection.close()
+
+def test_up_to_date_runs_are_not_the_baseline_of_builds(tmp_path, import_module):
+	BuildHistory = import_module('BuildHistory')
+	path = tmp_path / 'history.sqlite'
+	add_run(BuildHistory, path, 60.0, 100)
+	for _ in range(5):
+		add_run(BuildHistory, path, 1.0, 0)
+	add_run(BuildHistory, path, 62.0, 100)
+
+	assert BuildHistory.compare_latest(str(path)) == []
+
+	add_run(BuildHistory, path, 90.0, 120)
+	assert BuildHistory.compare_latest(str(path))[0].startswith('total_time: 61.00 -> 90.00')
+
+def test_up_to_date_runs_are_compared_with_each_other(tmp_path, import_module):
+	BuildHistory = import_module('BuildHistory')
+	path = tmp_path / 'history.sqlite'
+	for _ in range(3):
+		add_run(BuildHistory, path, 1.0, 0)
+	add_run(BuildHistory, path, 60.0, 100)
+	add_run(BuildHistory, path, 3.0, 0)
+
+	assert BuildHistory.compare_latest(str(path))[0].startswith('total_time: 1.00 -> 3.00')
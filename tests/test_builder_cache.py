@@ -0,0 +1,27 @@
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+
+def upper(target, source, env):
+	with open(os.path.join(env.Dir('#').abspath, 'runs.txt'), 'a') as f:
+		f.write('run\\n')
+	with open(str(target[0]), 'w') as f:
+		f.write(source[0].get_text_contents().upper())
+
+root = Dir('.').abspath
+solution = Solution('cache', root, os.path.join(root, 'out'))
+solution.enable_builder_cache(print_summary=False)
+project = solution.create_project('project', '.', 'out')
+CustomBuildAction(project, upper, os.path.join(root, 'out', 'upper.txt'), os.path.join(root, 'input.txt'), use_cache=True)
+project.submit_action()
+'''
+
+def test_cached_targets_are_restored(tmp_path, write_sconstruct, run_scons):
+	write_sconstruct(tmp_path, SCONSTRUCT)
+	for content in ['first', 'second', 'first']:
+		(tmp_path / 'input.txt').write_text(content)
+		run_scons(tmp_path)
+
+	assert (tmp_path / 'out' / 'upper.txt').read_text() == 'FIRST'
+	assert (tmp_path / 'runs.txt').read_text().count('run') == 2
@@ -0,0 +1,30 @@
+import os
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+
+def write_pid(target, source, env):
+	with open(str(target[0]), 'w') as f:
+		f.write(str(os.getpid()))
+
+root = Dir('.').abspath
+solution = Solution('pool', root, os.path.join(root, 'out'))
+project = solution.create_project('project', '.', 'out')
+for index in range(2):
+	CustomBuildAction(project, write_pid, os.path.join(root, 'out', f'pid_{index}.txt'), os.path.join(root, 'input.txt'), use_process_pool=True)
+project.submit_action()
+print(f'scons pid {os.getpid()}, workers started while reading: {solution.builder_process_pool is not None}')
+'''
+
+def test_workers_start_at_first_execute(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'input.txt').write_text('input')
+	write_sconstruct(tmp_path, SCONSTRUCT)
+	process = run_scons(tmp_path, '-j2')
+
+	assert 'workers started while reading: False' in process.stdout
+	scons_pid = process.stdout.split('scons pid ')[1].split(',')[0]
+	worker_pids = [(tmp_path / 'out' / name).read_text() for name in sorted(os.listdir(tmp_path / 'out')) if name.startswith('pid_')]
+	assert len(worker_pids) == 2
+	assert scons_pid not in worker_pids
@@ -0,0 +1,60 @@
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None, reason='requires g++')
+
+SOURCES = {
+	'project/lib/value.cpp': 'int value() { return 1; }\n',
+	'shared/other.cpp': 'int other() { return 2; }\n',
+	'project/main.cpp': 'int value(); int other();\nint main() { return value() + other() - 3; }\n',
+}
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler, CPPBuildType, CPPArchitecture
+from MetaSCons.CPPActions import CPPProgram, CPPStaticLibrary
+
+root = Dir('.').abspath
+solution = Solution('matrix', root, os.path.join(root, 'out'))
+solution.set_configuration_matrix([CPPBuildType.BuildType.Debug, CPPBuildType.BuildType.Release], [CPPArchitecture.Architecture.COMPILER_DEFAULT])
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('matrix', 'project', 'matrix')
+library = CPPStaticLibrary('library', project, {library_target}, 'lib', sources=['project/lib/value.cpp', 'shared/other.cpp'])
+program = CPPProgram('program', project, 'hello', 'bin', sources=['project/main.cpp'])
+program.link(library)
+project.submit_action()
+'''
+
+CONFIGURATIONS = ['Debug-default', 'Release-default']
+
+def write_tree(root, write_sconstruct, library_target: str):
+	for path, content in SOURCES.items():
+		(root / path).parent.mkdir(parents=True, exist_ok=True)
+		(root / path).write_text(content)
+	write_sconstruct(root, SCONSTRUCT.format(library_target=library_target))
+
+@pytest.mark.parametrize('library_target', ["'mylib'", "os.path.join(project.absolute_output_path, 'mylib')"], ids=['relative', 'absolute'])
+def test_configurations_build_into_their_own_directories(tmp_path, write_sconstruct, run_scons, library_target):
+	write_tree(tmp_path, write_sconstruct, library_target)
+
+	run_scons(tmp_path)
+
+	output = tmp_path / 'out' / 'matrix'
+	for configuration in CONFIGURATIONS:
+		assert (output / 'lib' / configuration / 'libmylib.a').is_file()
+		# sources outside of the project get their objects under the configuration's objects directory too
+		assert (output / 'lib' / configuration / 'obj' / '__' / 'shared' / 'other.o').is_file()
+		assert subprocess.run([str(output / 'bin' / configuration / 'hello')]).returncode == 0
+	assert "is up to date" in run_scons(tmp_path).stdout
+
+def test_absolute_target_outside_of_the_project_is_rejected(tmp_path, write_sconstruct, run_scons):
+	write_tree(tmp_path, write_sconstruct, repr(str(tmp_path.parent / 'elsewhere' / 'mylib')))
+
+	process = run_scons(tmp_path, check=False)
+
+	assert process.returncode != 0
+	assert 'is outside of the project and its output path' in process.stdout + process.stderr
@@ -0,0 +1,118 @@
+import os
+import time
+
+import pytest
+
+def write_old(path, content: bytes):
+	path.write_bytes(content)
+	old = time.time() - 60 # not racily clean
+	os.utime(path, (old, old))
+
+def digest_of(ContentHash, content: bytes) -> str:
+	_, new_hash = ContentHash.default_hasher()
+	hasher = new_hash()
+	hasher.update(content)
+	return hasher.hexdigest()
+
+def test_unchanged_files_are_not_hashed_again(tmp_path, import_module):
+	ContentHash = import_module('ContentHash')
+	path = tmp_path / 'big.bin'
+	write_old(path, b'x' * 3000)
+	cache_path = str(tmp_path / 'cache' / 'hashes.json')
+
+	hasher = ContentHash.ContentHasher(cache_path, mmap_threshold=1024)
+	assert hasher.hash_file(str(path)) == digest_of(ContentHash, b'x' * 3000)
+	hasher.save()
+	hasher.shutdown()
+
+	reloaded = ContentHash.ContentHasher(cache_path)
+	assert reloaded.hash_file(str(path)) == digest_of(ContentHash, b'x' * 3000)
+	assert reloaded.hashed_bytes == 0 # from the stat cache
+
+	write_old(path, b'y' * 3001)
+	assert reloaded.hash_file(str(path)) == digest_of(ContentHash, b'y' * 3001)
+	assert reloaded.hashed_bytes == 3001
+	reloaded.shutdown()
+
+def test_recently_modified_files_are_not_cached(tmp_path, import_module):
+	ContentHash = import_module('ContentHash')
+	path = tmp_path / 'new.bin'
+	path.write_bytes(b'new')
+
+	hasher = ContentHash.ContentHasher(str(tmp_path / 'hashes.json'))
+	hasher.hash_file(str(path))
+	hasher.hash_file(str(path))
+	assert hasher.hashed_bytes == 6
+	hasher.shutdown()
+
+def test_prefetched_hashes_are_used(tmp_path, import_module):
+	ContentHash = import_module('ContentHash')
+	paths = []
+	for index in range(8):
+		write_old(tmp_path / f'file_{index}.bin', bytes([index]) * 1000)
+		paths.append(str(tmp_path / f'file_{index}.bin'))
+	write_old(tmp_path / 'small.bin', b's')
+
+	hasher = ContentHash.ContentHasher(str(tmp_path / 'hashes.json'), max_workers=4)
+	hasher.prefetch(paths + [str(tmp_path / 'small.bin'), str(tmp_path / 'missing.bin')], min_size=100)
+	hasher.wait()
+	assert hasher.hashed_bytes == 8000 # counted from every worker, without the small file
+
+	for index, path in enumerate(paths):
+		assert hasher.hash_file(path) == digest_of(ContentHash, bytes([index]) * 1000)
+	assert hasher.hashed_bytes == 8000
+	assert hasher.hash_file(str(tmp_path / 'small.bin')) == digest_of(ContentHash, b's')
+	hasher.shutdown()
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_forked_child_can_hash(tmp_path, import_module):
+	ContentHash = import_module('ContentHash')
+	write_old(tmp_path / 'file.bin', b'f' * 100)
+	hasher = ContentHash.ContentHasher(str(tmp_path / 'hashes.json'))
+	hasher.hash_file(str(tmp_path / 'file.bin'))
+
+	pid = os.fork()
+	if pid == 0:
+		hasher.prefetch([str(tmp_path / 'file.bin')])
+		hasher.wait()
+		os._exit(0 if hasher.hash_file(str(tmp_path / 'file.bin')) == digest_of(ContentHash, b'f' * 100) else 1)
+	_, status = os.waitpid(pid, 0)
+	assert os.waitstatus_to_exitcode(status) == 0
+	hasher.shutdown()
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+
+def copy(target, source, env):
+	with open(os.path.join(env.Dir('#').abspath, 'runs.txt'), 'a') as f:
+		f.write('run\\n')
+	with open(str(target[0]), 'wb') as f:
+		f.write(source[0].get_contents())
+
+root = Dir('.').abspath
+solution = Solution('hashes', root, os.path.join(root, 'out'))
+solution.enable_fast_content_signatures(min_size=1024)
+project = solution.create_project('hashes', '.', 'out')
+CustomBuildAction(project, copy, os.path.join(root, 'out', 'copy.bin'), os.path.join(root, 'big.bin'))
+project.submit_action()
+print('signature', File('big.bin').get_content_hash())
+'''
+
+def test_content_signatures_of_large_files_use_the_hasher(tmp_path, import_module, write_sconstruct, run_scons):
+	ContentHash = import_module('ContentHash')
+	write_old(tmp_path / 'big.bin', b'a' * 4096)
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	def signature(process) -> str:
+		return next(line.split()[1] for line in process.stdout.splitlines() if line.startswith('signature '))
+
+	assert signature(run_scons(tmp_path)) == digest_of(ContentHash, b'a' * 4096)
+	assert (tmp_path / 'out' / '.metascons' / 'content_hashes.json').is_file()
+	run_scons(tmp_path)
+	assert (tmp_path / 'runs.txt').read_text().count('run') == 1
+
+	write_old(tmp_path / 'big.bin', b'b' * 4096)
+	assert signature(run_scons(tmp_path)) == digest_of(ContentHash, b'b' * 4096)
+	assert (tmp_path / 'runs.txt').read_text().count('run') == 2
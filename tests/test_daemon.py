@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux') or shutil.which('g++') is None, reason='requires inotify and g++')
+
+SOURCES = {
+	'lib/greeting.h': '#pragma once\n#define GREETING "hello"\nconst char* greeting();\n',
+	'lib/greeting.cpp': '#include "greeting.h"\nconst char* greeting() { return GREETING; }\n',
+	'main.cpp': '#include <cstdio>\n#include "greeting.h"\nint main() { std::printf("%s %s\\n", greeting(), GREETING); return 0; }\n',
+	'other.cpp': 'int main() { return 0; }\n',
+}
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram, CPPStaticLibrary
+
+root = Dir('.').abspath
+solution = Solution('sample', root, os.path.join(root, 'out'))
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('other', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('sample', '.', 'sample')
+library = CPPStaticLibrary('library', project, 'greeting', 'lib', sources=['lib/greeting.cpp'])
+library.add_public_include_paths(['lib'])
+program = CPPProgram('program', project, 'hello', 'bin', sources=['main.cpp'])
+program.link(library)
+CPPProgram('other', project, 'other', 'bin', sources=['other.cpp'])
+project.submit_action()
+solution.enable_daemon()
+'''
+
+@pytest.fixture
+def daemon(tmp_path, package_parent, write_sconstruct):
+	for path, content in SOURCES.items():
+		os.makedirs(os.path.dirname(os.path.join(tmp_path, path)), exist_ok=True)
+		(tmp_path / path).write_text(content)
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	env = dict(os.environ)
+	env['PYTHONPATH'] = package_parent
+
+	def request(*arguments: str) -> subprocess.CompletedProcess:
+		return subprocess.run([sys.executable, '-m', 'MetaSCons.Daemon'] + list(arguments), cwd=tmp_path, env=env, capture_output=True, text=True)
+
+	yield request
+	request('--stop')
+
+def compiled(process: subprocess.CompletedProcess) -> list[str]:
+	return sorted(line.split()[2] for line in process.stdout.splitlines() if line.startswith('g++ -o') and ' -c ' in line)
+
+def test_daemon_rebuilds_what_depends_on_changes(tmp_path, daemon):
+	first = daemon()
+	assert first.returncode == 0, first.stderr
+	assert compiled(first) == ['lib/greeting.o', 'main.o', 'other.o']
+
+	assert "`.' is up to date" in daemon().stdout
+
+	(tmp_path / 'main.cpp').write_text(SOURCES['main.cpp'] + '// edited\n')
+	assert compiled(daemon()) == ['main.o']
+
+	(tmp_path / 'lib' / 'greeting.h').write_text(SOURCES['lib/greeting.h'].replace('hello', 'hi'))
+	assert compiled(daemon()) == ['lib/greeting.o', 'main.o']
+	assert subprocess.run([str(tmp_path / 'hello')], capture_output=True, text=True).stdout == 'hi hi\n'
+
+def test_daemon_recovers_from_failures(tmp_path, daemon):
+	assert daemon().returncode == 0
+
+	(tmp_path / 'other.cpp').write_text('int main() { return ; }\nint x = ;\n')
+	failed = daemon('-k')
+	assert failed.returncode == 2
+	assert 'scons: *** [other.o]' in failed.stderr
+
+	(tmp_path / 'other.cpp').write_text(SOURCES['other.cpp'])
+	assert compiled(daemon()) == ['other.o']
+	assert "`.' is up to date" in daemon().stdout
+
+def test_daemon_rejects_unsupported_options(daemon):
+	process = daemon('--dry-run')
+
+	assert process.returncode == 2
+	assert 'does not support the options --dry-run' in process.stderr
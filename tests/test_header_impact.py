@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+def test_objects_without_history_cost_the_median(import_module):
+	HeaderImpact = import_module('HeaderImpact')
+	index = {'/src/a.h': {'a.o', 'new.o'}, '/src/b.h': {'b.o'}}
+	costs = {'a.o': 2.0, 'b.o': 4.0, 'c.o': 10.0}
+
+	impacts = {impact.path: impact for impact in HeaderImpact.rank_headers(index, costs, {})}
+	assert impacts['/src/a.h'].compile_cost == 6.0
+	assert impacts['/src/b.h'].compile_cost == 4.0
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPMultiTierLibrary, CPPSharedLibrary
+
+root = Dir('.').abspath
+solution = Solution('tiers', root, os.path.join(root, 'out'))
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('tiers', '.', 'tiers')
+library = CPPSharedLibrary('library', project, 'kernel', 'src', 'lib')
+CPPMultiTierLibrary(project, library, ['x86-64-v2', 'x86-64-v3'])
+project.submit_action()
+'''
+
+# the objects of the CPU tiers include the header too
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='CPU tiers are built on Linux')
+def test_command_line_counts_the_translation_units_of_variants(tmp_path, package_parent, write_sconstruct):
+	(tmp_path / 'src').mkdir()
+	(tmp_path / 'src' / 'kernel.h').write_text('#pragma once\nint kernel();\n')
+	(tmp_path / 'src' / 'kernel.cpp').write_text('#include "kernel.h"\nint kernel() { return 1; }\n')
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	env = dict(os.environ)
+	env['PYTHONPATH'] = package_parent
+	process = subprocess.run([sys.executable, '-m', 'MetaSCons.HeaderImpact', '--top', '5', '--report', 'impact.json'], cwd=tmp_path, env=env, capture_output=True, text=True)
+	assert process.returncode == 0, process.stderr
+
+	rows = [line.split() for line in process.stdout.splitlines() if line.endswith('kernel.h')]
+	assert len(rows) == 1
+	assert rows[0][4] == '3' # TUs: the library and its 2 tiers
+	assert (tmp_path / 'impact.json').is_file()
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+# milliseconds the package may take to import on top of SCons (as in an SConstruct)
+IMPORT_TIME_BUDGET = float(os.environ.get('METASCONS_IMPORT_TIME_BUDGET', 50))
+
+# modules loaded only when the feature using them is (see Solution, Project and CPPModules)
+DEFERRED_MODULES = ['git', 'colorama', 'regex', 'concurrent.futures', 'sqlite3', 'http.client', 'gzip']
+
+def test_import_time_within_budget(import_module, package_parent):
+	benchmark = import_module('Benchmark')
+	total, slowest_modules = benchmark.measure_import_time(['MetaSCons', 'MetaSCons.CPPActions', 'MetaSCons.CustomBuilder'], repeat=3, preload=benchmark.STARTUP_PRELOAD, package_parent=package_parent)
+
+	slowest = ', '.join(f'{name} {self_time * 1000:.2f}ms' for name, self_time in slowest_modules)
+	assert total * 1000 <= IMPORT_TIME_BUDGET, f'importing took {total * 1000:.2f}ms, over the budget of {IMPORT_TIME_BUDGET:.0f}ms (slowest: {slowest})'
+
+def test_import_defers_heavy_modules(package_parent):
+	code = ('import sys, SCons.Script\n'
+		'before = set(sys.modules)\n'
+		'from MetaSCons import Solution\n'
+		'import MetaSCons.CPPActions, MetaSCons.CustomBuilder\n'
+		'print("\\n".join(sorted(set(sys.modules) - before)))\n')
+	env = dict(os.environ)
+	env['PYTHONPATH'] = package_parent
+	loaded = subprocess.run([sys.executable, '-c', code], env=env, check=True, capture_output=True, text=True).stdout.split()
+
+	assert [module for module in DEFERRED_MODULES if module in loaded] == []
@@ -0,0 +1,75 @@
+import shutil
+
+import pytest
+
+LAYERS = 10
+
+DIAMOND_SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram, CPPStaticLibrary
+from MetaSCons.UsageRequirements import LinkGroup
+
+root = Dir('.').abspath
+solution = Solution('diamond', root, os.path.join(root, 'out'))
+project = solution.create_project('diamond', '.', 'diamond')
+layers = []
+for layer in range({layers}):
+	libraries = []
+	for index in range(2):
+		name = f'layer_{{layer}}_{{index}}'
+		solution.add_toolset(name, CPPToolset(CPPCompiler.GCC))
+		libraries.append(CPPStaticLibrary(name, project, name, 'lib', sources=[f'{{name}}.cpp']))
+	layers.append(libraries)
+for libraries, next_libraries in zip(layers, layers[1:]):
+	for library in libraries:
+		library.link(next_libraries)
+layers[-1][1].add_public_libraries([LinkGroup(['x', 'y'])])
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+program = CPPProgram('program', project, 'program', 'bin', sources=['main.cpp'])
+program.link(layers[0])
+project.submit_action()
+print('LIBS', ' '.join(os.path.basename(str(library)) for library in program.env['LIBS']))
+'''
+
+def test_libraries_keep_their_last_occurrence(import_module):
+	UsageRequirements = import_module('UsageRequirements')
+
+	assert UsageRequirements.unique_last(['a', 'b', 'a', 'c', 'b']) == ['a', 'c', 'b']
+	requirements = UsageRequirements.UsageRequirements(libraries=['x', 'y', 'x', 'x']).deduplicate()
+	assert requirements.libraries == ['y', 'x']
+
+def test_link_groups_are_deduplicated_as_one_library_and_repeated(import_module):
+	UsageRequirements = import_module('UsageRequirements')
+	group = UsageRequirements.LinkGroup(['a', 'b'])
+
+	libraries = UsageRequirements.unique_last(['c', group, 'c', UsageRequirements.LinkGroup(['a', 'b'])])
+	assert libraries == ['c', group]
+	assert UsageRequirements.expand_link_groups(libraries) == ['c', 'a', 'b', 'a', 'b']
+
+@pytest.mark.skipif(shutil.which('g++') is None, reason='requires g++')
+def test_layered_diamond_links_each_library_once(tmp_path, write_sconstruct, run_scons):
+	for layer in range(LAYERS):
+		for index in range(2):
+			(tmp_path / f'layer_{layer}_{index}.cpp').write_text(f'int layer_{layer}_{index}() {{ return {layer}; }}\n')
+	(tmp_path / 'main.cpp').write_text('int main() { return 0; }\n')
+	write_sconstruct(tmp_path, DIAMOND_SCONSTRUCT.format(layers=LAYERS))
+
+	process = run_scons(tmp_path, '-n')
+	libraries = next(line for line in process.stdout.splitlines() if line.startswith('LIBS ')).split()[1:]
+
+	expected = [f'liblayer_{layer}_{index}.a' for layer in range(LAYERS) for index in range(2)]
+	# each library once, after every library using it, then the link group of the last layer
+	assert libraries == expected + ['x', 'y', 'x', 'y']
+
+def test_response_files_default_to_the_platform_limit(import_module):
+	ResponseFile = import_module('ResponseFile')
+	from SCons.Environment import Environment
+
+	env = Environment(tools=[])
+	ResponseFile.use_response_files(env)
+	assert env['MAXLINELENGTH'] == ResponseFile.DEFAULT_MAX_LINE_LENGTH
+
+	ResponseFile.use_response_files(env, 4096)
+	assert env['MAXLINELENGTH'] == 4096
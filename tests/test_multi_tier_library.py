@@ -0,0 +1,65 @@
+import platform
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux') or platform.machine() != 'x86_64' or shutil.which('g++') is None, reason='requires g++ on x86-64 Linux')
+
+SOURCES = {
+	'src/kernel.cpp': '''extern "C" const char* kernel() {
+#if defined(__AVX2__)
+	return "v3";
+#elif defined(__SSE4_2__)
+	return "v2";
+#else
+	return "baseline";
+#endif
+}
+''',
+	'main.cpp': '''#include <cstdio>
+#include <dlfcn.h>
+#include "kernel_loader.h"
+int main() {
+	void* library = kernel_load(NULL, RTLD_NOW);
+	if (library == NULL) { std::printf("%s\\n", dlerror()); return 1; }
+	auto kernel = (const char* (*)())dlsym(library, "kernel");
+	std::printf("%s %s\\n", kernel_cpu_tier(), kernel());
+	return 0;
+}
+''',
+}
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPMultiTierLibrary, CPPProgram, CPPSharedLibrary
+
+root = Dir('.').abspath
+solution = Solution('tiers', root, os.path.join(root, 'out'))
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('tiers', '.', 'tiers')
+library = CPPSharedLibrary('library', project, 'kernel', 'src', 'lib')
+tiers = CPPMultiTierLibrary(project, library, ['x86-64-v2', 'x86-64-v3'])
+program = CPPProgram('program', project, 'main', 'bin', sources=['main.cpp'])
+program.link(tiers.loader)
+project.submit_action()
+'''
+
+def test_each_tier_is_built_and_loaded(tmp_path, write_sconstruct, run_scons):
+	for path, content in SOURCES.items():
+		(tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+		(tmp_path / path).write_text(content)
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	run_scons(tmp_path)
+
+	header = next(tmp_path.glob('out/**/kernel_loader.h')).read_text()
+	assert '(or $METASCONS_CPU_TIER)' in header
+	for tier, built in [('baseline', 'baseline'), ('x86-64-v2', 'v2'), ('x86-64-v3', 'v3')]:
+		process = subprocess.run([str(tmp_path / 'main')], env={'METASCONS_CPU_TIER': tier}, capture_output=True, text=True)
+		assert process.returncode == 0, process.stdout
+		assert process.stdout == f'{tier} {built}\n'
@@ -0,0 +1,114 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('ninja') is None or shutil.which('g++') is None, reason='requires ninja and g++')
+
+SOURCES = {
+	'lib/greeting.h': '#pragma once\n#define GREETING "hello"\nconst char* greeting();\n',
+	'lib/greeting.cpp': '#include "greeting.h"\nconst char* greeting() { return GREETING; }\n',
+	'main.cpp': '#include <cstdio>\n#include "greeting.h"\nint main() { std::printf("%s %s\\n", greeting(), GREETING); return 0; }\n',
+}
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram, CPPStaticLibrary
+
+root = Dir('.').abspath
+solution = Solution('sample', root, os.path.join(root, 'out'))
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('sample', '.', 'sample')
+library = CPPStaticLibrary('library', project, 'greeting', 'lib', sources=['lib/greeting.cpp'])
+library.add_public_include_paths(['lib'])
+program = CPPProgram('program', project, 'hello', 'bin', sources=['main.cpp'])
+program.link(library)
+project.submit_action()
+if ARGUMENTS.get('ninja'):
+	solution.generate_ninja()
+'''
+
+OBJECTS = ['main.o', 'lib/greeting.o']
+
+def write_tree(root, write_sconstruct):
+	for path, content in SOURCES.items():
+		os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+		with open(os.path.join(root, path), 'w', encoding='utf-8') as f:
+			f.write(content)
+	write_sconstruct(root, SCONSTRUCT)
+
+def ninja(root, *arguments: str) -> str:
+	return subprocess.run(['ninja'] + list(arguments), cwd=root, check=True, capture_output=True, text=True).stdout
+
+def run_program(root) -> str:
+	return subprocess.run([os.path.join(root, 'hello')], check=True, capture_output=True, text=True).stdout
+
+def read(path) -> bytes:
+	with open(path, 'rb') as f:
+		return f.read()
+
+def test_ninja_build_matches_scons(tmp_path, write_sconstruct, run_scons):
+	scons_root, ninja_root = tmp_path / 'scons', tmp_path / 'ninja'
+	for root in (scons_root, ninja_root):
+		root.mkdir()
+		write_tree(root, write_sconstruct)
+
+	run_scons(scons_root)
+	run_scons(ninja_root, '-n', 'ninja=1')
+	ninja(ninja_root)
+
+	for path in OBJECTS:
+		assert read(ninja_root / path) == read(scons_root / path)
+	assert run_program(ninja_root) == run_program(scons_root) == 'hello hello\n'
+	assert 'no work to do' in ninja(ninja_root)
+
+def test_ninja_tracks_header_dependencies(tmp_path, write_sconstruct, run_scons):
+	write_tree(tmp_path, write_sconstruct)
+	run_scons(tmp_path, '-n', 'ninja=1')
+	ninja(tmp_path)
+
+	(tmp_path / 'lib' / 'greeting.h').write_text(SOURCES['lib/greeting.h'].replace('hello', 'hi'))
+	ninja(tmp_path)
+
+	assert run_program(tmp_path) == 'hi hi\n'
+	assert 'no work to do' in ninja(tmp_path)
+
+MODULE_SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler, CPPStandard
+from MetaSCons.CPPActions import CPPProgram
+
+root = Dir('.').abspath
+solution = Solution('modules', root, os.path.join(root, 'out'))
+toolset = CPPToolset(CPPCompiler.GCC)
+toolset.set_cpp_standard(CPPStandard.Standard.CPP20)
+solution.add_toolset('program', toolset)
+project = solution.create_project('modules', '.', 'modules')
+program = CPPProgram('program', project, 'hello', 'bin', sources=['main.cpp'])
+program.add_module_sources(['greeting.cppm'])
+project.submit_action()
+solution.generate_ninja()
+'''
+
+def supports_modules() -> bool:
+	process = subprocess.run(['g++', '-std=c++20', '-fmodules-ts', '-x', 'c++', '-fsyntax-only', os.devnull], capture_output=True)
+	return process.returncode == 0
+
+# the BMI is a second output of the interface's compile statement
+def test_ninja_builds_module_interfaces(tmp_path, write_sconstruct, run_scons):
+	if not supports_modules():
+		pytest.skip('requires g++ with C++20 modules')
+
+	(tmp_path / 'greeting.cppm').write_text('export module greeting;\nexport const char* greeting() { return "hello"; }\n')
+	(tmp_path / 'main.cpp').write_text('import greeting;\n#include <cstdio>\nint main() { std::printf("%s\\n", greeting()); return 0; }\n')
+	write_sconstruct(tmp_path, MODULE_SCONSTRUCT)
+	run_scons(tmp_path, '-n')
+	ninja(tmp_path)
+
+	assert run_program(tmp_path) == 'hello\n'
+	assert 'no work to do' in ninja(tmp_path)
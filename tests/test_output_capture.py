@@ -0,0 +1,92 @@
+import gzip
+import os
+import sys
+
+EMIT = '''
+import sys, time
+name, step, target = sys.argv[1:]
+for index in range(5):
+	print(f'{name} {step} {index}', flush=True)
+	time.sleep(0.02)
+open(target, 'a').write(step + '\\n')
+'''
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.Action import Action
+
+class ShellAction(Action):
+	def __init__(self, project, target, commands):
+		super().__init__(project)
+		self.target = target
+		self.commands = commands
+
+	def submit_action(self):
+		self._set_submitted_action(self.env.Command(self.target, [], self.commands))
+
+def print_cmd_line(s, target, source, env):
+	print('command: ' + s)
+
+root = Dir('.').abspath
+solution = Solution('capture', root, os.path.join(root, 'out'))
+solution.enable_output_capture()
+project = solution.create_project('capture', '.', 'capture')
+project.environment['PRINT_CMD_LINE_FUNC'] = print_cmd_line
+for name in ['a', 'b', 'c']:
+	ShellAction(project, f'gen/{{name}}.txt', [f'{python} emit.py {{name}} first $TARGET', f'{python} emit.py {{name}} second $TARGET'])
+project.submit_action()
+'''
+
+def read_log(path) -> str:
+	with gzip.open(path, 'rt') as log:
+		return log.read()
+
+def test_output_of_parallel_commands_is_not_interleaved(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'emit.py').write_text(EMIT)
+	write_sconstruct(tmp_path, SCONSTRUCT.format(python=sys.executable))
+
+	process = run_scons(tmp_path, '-j3')
+
+	lines = [line for line in process.stdout.splitlines() if not line.startswith('command: ')]
+	for index in range(0, len(lines), 5):
+		assert len({line.rsplit(' ', 1)[0] for line in lines[index:index + 5]}) == 1, lines
+	assert sum(line.startswith('command: ') for line in process.stdout.splitlines()) == 6
+
+	# each target's log has its commands' output, under the target's path relative to the solution
+	for name in ['a', 'b', 'c']:
+		log = read_log(tmp_path / 'out' / 'logs' / 'gen' / f'{name}.txt.log.gz')
+		assert log.count('--- exit code 0 ---') == 2
+		assert f'{name} first 4' in log and f'{name} second 4' in log
+
+	# a new build starts the logs anew
+	os.remove(tmp_path / 'gen' / 'a.txt')
+	run_scons(tmp_path)
+	assert read_log(tmp_path / 'out' / 'logs' / 'gen' / 'a.txt.log.gz').count('--- exit code 0 ---') == 2
+
+def test_console_output_is_truncated_and_logged_in_full(tmp_path, capsys, import_module):
+	OutputCapture = import_module('OutputCapture')
+	capture = OutputCapture.OutputCapture(str(tmp_path / 'logs'), console_limit=50, root_path=str(tmp_path))
+
+	stdout, stderr = capture.buffers()
+	stdout.write(b''.join(f'line {index}\n'.encode() for index in range(100)))
+	stderr.write(b'warning\n')
+	capture.emit(str(tmp_path / 'obj' / 'a.o'), 'cc -c a.c', stdout, stderr, 1)
+
+	out, err = capsys.readouterr()
+	assert len(out) <= 50
+	assert out.startswith('line 0\n')
+	log_path = tmp_path / 'logs' / 'obj' / 'a.o.log.gz'
+	assert f'[output of {tmp_path / "obj" / "a.o"} truncated, see {log_path}]' in err
+
+	log = read_log(log_path)
+	assert log.startswith('$ cc -c a.c\n--- stdout ---\nline 0\n')
+	assert 'line 99\n--- stderr ---\nwarning\n--- exit code 1 ---\n' in log
+
+def test_log_paths_are_relative_to_the_solution(tmp_path, import_module):
+	OutputCapture = import_module('OutputCapture')
+	capture = OutputCapture.OutputCapture(str(tmp_path / 'out' / 'logs'), root_path=str(tmp_path / 'src'))
+
+	assert capture.log_path(str(tmp_path / 'src' / 'a.o')) == str(tmp_path / 'out' / 'logs' / 'a.o.log.gz')
+	assert capture.log_path(str(tmp_path / 'out' / 'logs' / 'b.o')) == str(tmp_path / 'out' / 'logs' / 'b.o.log.gz')
+	assert capture.log_path('/elsewhere/c.o') == str(tmp_path / 'out' / 'logs' / 'elsewhere' / 'c.o.log.gz')
@@ -0,0 +1,73 @@
+import json
+import os
+
+SLEEP = 0.5
+
+SCONSTRUCT = '''
+import json, os, time
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+
+def sleep_builder(target, source, env):
+	start = time.time()
+	time.sleep({sleep})
+	with open(str(target[0]), 'w') as f:
+		json.dump({{'start': start, 'end': time.time()}}, f)
+
+root = Dir('.').abspath
+solution = Solution('pools', root, os.path.join(root, 'out'))
+solution.add_pool('link', {capacity})
+project = solution.create_project('project', '.', 'out')
+for index in range({pooled}):
+	action = CustomBuildAction(project, sleep_builder, os.path.join(root, 'out', f'pooled_{{index}}.json'), os.path.join(root, 'input.txt'))
+	action.set_pool('link')
+for index in range({unpooled}):
+	CustomBuildAction(project, sleep_builder, os.path.join(root, 'out', f'unpooled_{{index}}.json'), os.path.join(root, 'input.txt'))
+project.submit_action()
+'''
+
+def read_intervals(root, prefix: str) -> list[tuple[float, float]]:
+	intervals = []
+	for name in sorted(os.listdir(os.path.join(root, 'out'))):
+		if name.startswith(prefix):
+			with open(os.path.join(root, 'out', name), 'r', encoding='utf-8') as f:
+				times = json.load(f)
+			intervals.append((times['start'], times['end']))
+	return intervals
+
+def peak_concurrency(intervals: list[tuple[float, float]]) -> int:
+	events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+	peak = running = 0
+	for _, change in events:
+		running += change
+		peak = max(peak, running)
+	return peak
+
+def build(root, write_sconstruct, run_scons, capacity: int, pooled: int, unpooled: int, jobs: int):
+	(root / 'input.txt').write_text('input')
+	write_sconstruct(root, SCONSTRUCT.format(sleep=SLEEP, capacity=capacity, pooled=pooled, unpooled=unpooled))
+	run_scons(root, f'-j{jobs}')
+	return read_intervals(root, 'pooled_'), read_intervals(root, 'unpooled_')
+
+def test_pool_limits_concurrency(tmp_path, write_sconstruct, run_scons):
+	pooled, unpooled = build(tmp_path, write_sconstruct, run_scons, capacity=2, pooled=6, unpooled=0, jobs=6)
+
+	assert len(pooled) == 6
+	assert peak_concurrency(pooled) == 2
+
+def test_unpooled_targets_keep_building(tmp_path, write_sconstruct, run_scons):
+	pooled, unpooled = build(tmp_path, write_sconstruct, run_scons, capacity=1, pooled=4, unpooled=4, jobs=4)
+
+	assert peak_concurrency(pooled) == 1
+	# the job slots the waiting pooled targets don't hold build the unpooled ones meanwhile
+	assert peak_concurrency(pooled + unpooled) == 4
+	last_pooled_start = max(start for start, _ in pooled)
+	assert all(end <= last_pooled_start for _, end in unpooled)
+
+def test_undeclared_pool_fails(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'input.txt').write_text('input')
+	write_sconstruct(tmp_path, SCONSTRUCT.format(sleep=0, capacity=1, pooled=1, unpooled=0).replace("set_pool('link')", "set_pool('missing')"))
+	process = run_scons(tmp_path, check=False)
+
+	assert process.returncode != 0
+	assert 'Pool "missing" is not declared' in process.stderr
@@ -0,0 +1,57 @@
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None, reason='requires g++')
+
+MAIN = '''#include <cstdio>
+int main(int argc, char**) {
+	long sum = 0;
+	for (int i = 0; i < 100000; i++)
+		sum += (i % 7 == argc) ? i : 1;
+	std::printf("trained %ld\\n", sum);
+	return 0;
+}
+'''
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram, CPPProfileTraining
+
+root = Dir('.').abspath
+solution = Solution('pgo', root, os.path.join(root, 'out'))
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('pgo', '.', 'pgo')
+program = CPPProgram('program', project, 'hello', 'bin', sources=['main.cpp'])
+CPPProfileTraining(project, program, ['$SOURCE'])
+project.submit_action()
+'''
+
+def compiled(process) -> list[str]:
+	return [line for line in process.stdout.splitlines() if line.startswith('g++ ') and ' -c ' in line]
+
+def test_program_is_trained_and_optimized_with_its_profile(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'main.cpp').write_text(MAIN)
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	first = run_scons(tmp_path)
+	instrumented, optimized = compiled(first)
+	assert '-fprofile-generate=' in instrumented and 'pgo-instrumented' in instrumented
+	assert '-fprofile-use=' in optimized
+	assert 'trained ' in first.stdout # the training ran the instrumented program
+
+	profiles = tmp_path / 'out' / 'pgo' / 'bin' / 'pgo'
+	assert (profiles / 'raw' / 'main.gcda').is_file()
+	assert (profiles / 'profile.manifest').read_text().endswith(' main.gcda\n')
+	assert subprocess.run([str(tmp_path / 'hello')], capture_output=True, text=True).stdout.startswith('trained ')
+
+	assert 'is up to date' in run_scons(tmp_path).stdout
+
+	# an edited source is instrumented, trained and optimized again
+	(tmp_path / 'main.cpp').write_text(MAIN.replace('100000', '200000'))
+	retrained = run_scons(tmp_path)
+	assert len(compiled(retrained)) == 2
+	assert 'Clearing the profiles' in retrained.stdout and 'trained ' in retrained.stdout
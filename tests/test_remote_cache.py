@@ -0,0 +1,83 @@
+import socket
+import threading
+import time
+
+import pytest
+
+TARGETS = 3
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+
+def upper(target, source, env):
+	with open(os.path.join(env.Dir('#').abspath, 'runs.txt'), 'a') as f:
+		f.write('run\\n')
+	with open(str(target[0]), 'w') as f:
+		f.write(source[0].get_text_contents().upper())
+
+root = Dir('.').abspath
+solution = Solution('remote', root, os.path.join(root, 'out'))
+solution.enable_remote_cache({url!r}, timeout={timeout})
+project = solution.create_project('project', '.', 'out')
+for index in range({targets}):
+	CustomBuildAction(project, upper, os.path.join(root, 'out', f'upper_{{index}}.txt'), os.path.join(root, f'input_{{index}}.txt'))
+project.submit_action()
+'''
+
+@pytest.fixture
+def remote_server(tmp_path, import_module):
+	RemoteCache = import_module('RemoteCache')
+	servers = []
+
+	def start(delay: float = 0.0) -> str:
+		server = RemoteCache.create_server(str(tmp_path / f'remote_{len(servers)}'), port=0, delay=delay)
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		servers.append(server)
+		return f'http://127.0.0.1:{server.server_address[1]}'
+
+	yield start
+	for server in servers:
+		server.shutdown()
+		server.server_close()
+
+def build(root, write_sconstruct, run_scons, url: str, timeout: float = 5.0):
+	root.mkdir()
+	for index in range(TARGETS):
+		(root / f'input_{index}.txt').write_text(f'input {index}')
+	write_sconstruct(root, SCONSTRUCT.format(url=url, timeout=timeout, targets=TARGETS))
+	return run_scons(root)
+
+def runs(root) -> int:
+	return (root / 'runs.txt').read_text().count('run') if (root / 'runs.txt').exists() else 0
+
+def test_second_tree_is_built_from_the_remote(tmp_path, write_sconstruct, run_scons, remote_server):
+	url = remote_server()
+
+	first = build(tmp_path / 'first', write_sconstruct, run_scons, url)
+	assert runs(tmp_path / 'first') == TARGETS
+	assert f'{TARGETS} uploads' in first.stdout
+
+	second = build(tmp_path / 'second', write_sconstruct, run_scons, url)
+	assert runs(tmp_path / 'second') == 0
+	assert f'Remote cache: {TARGETS} hits, 0 misses' in second.stdout
+	for index in range(TARGETS):
+		assert (tmp_path / 'second' / 'out' / f'upper_{index}.txt').read_text() == f'INPUT {index}'
+
+def unused_port() -> int:
+	with socket.socket() as s:
+		s.bind(('127.0.0.1', 0))
+		return s.getsockname()[1]
+
+@pytest.mark.parametrize('remote', ['unreachable', 'slow'])
+def test_failing_remote_is_skipped(tmp_path, write_sconstruct, run_scons, remote_server, remote):
+	url = f'http://127.0.0.1:{unused_port()}' if remote == 'unreachable' else remote_server(delay=2.0)
+
+	started = time.monotonic()
+	process = build(tmp_path / 'tree', write_sconstruct, run_scons, url, timeout=0.5)
+
+	assert runs(tmp_path / 'tree') == TARGETS
+	assert 'remote skipped 1 times after failures' in process.stdout
+	# requests stop once the circuit breaker opened, instead of each waiting for its timeout
+	assert time.monotonic() - started < 10
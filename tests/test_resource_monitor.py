@@ -0,0 +1,67 @@
+import json
+import threading
+import time
+
+import pytest
+
+GB = 1024 * 1024 * 1024
+
+# available and total memory, as the patched module sees them
+@pytest.fixture
+def memory() -> dict[str, int]:
+	return {'available': 8 * GB, 'total': 16 * GB}
+
+@pytest.fixture
+def ResourceMonitor(import_module, monkeypatch, memory):
+	module = import_module('ResourceMonitor')
+	monkeypatch.setattr(module, 'available_memory', lambda: memory['available'])
+	monkeypatch.setattr(module, 'total_memory', lambda: memory['total'])
+	monkeypatch.setattr(module, 'cpu_count', lambda: 8)
+	return module
+
+def test_job_count_follows_the_peak_rss_of_earlier_runs(tmp_path, ResourceMonitor):
+	history_path = tmp_path / 'memory.json'
+	assert ResourceMonitor.AdaptiveJobs(str(history_path)).job_count() == 8 # 512MB per job by default
+
+	history_path.write_text(json.dumps({'a.o': 4 * GB, 'b.o': 2 * GB, 'c.o': 100}))
+	adaptive_jobs = ResourceMonitor.AdaptiveJobs(str(history_path))
+	assert adaptive_jobs.job_count() == 3 # 8GB available for jobs of (4GB + 2GB + 100B) / 3
+
+	adaptive_jobs.record('a.o', GB)
+	adaptive_jobs.save()
+	assert json.loads(history_path.read_text())['a.o'] == GB
+
+def test_jobs_are_held_back_until_their_memory_fits(tmp_path, ResourceMonitor, memory):
+	memory['available'] = 4 * GB
+	(tmp_path / 'memory.json').write_text(json.dumps({'big.o': 2 * GB}))
+	adaptive_jobs = ResourceMonitor.AdaptiveJobs(str(tmp_path / 'memory.json'), memory_low_water=0.1, poll_interval=0.01)
+	assert adaptive_jobs.summary() == 'Memory throttling: no jobs were held back'
+
+	# concurrent jobs can't all pass the check: the first reserves its memory
+	first = adaptive_jobs.wait_for_memory(lambda: 0, 'big.o')
+	assert first == 2 * GB
+
+	passed = threading.Event()
+	def second_job():
+		memory = adaptive_jobs.wait_for_memory(lambda: 1, 'big.o')
+		passed.set()
+		adaptive_jobs.release(memory)
+	thread = threading.Thread(target=second_job)
+	thread.start()
+
+	assert not passed.wait(0.2) # 4GB - 2GB - 2GB is under 10% of 16GB
+	adaptive_jobs.release(first)
+	thread.join(5)
+	assert passed.is_set()
+
+	assert adaptive_jobs.reserved_memory == 0
+	assert adaptive_jobs.summary().startswith('Memory throttling: held back 1 jobs for ')
+
+def test_job_alone_is_never_held_back(tmp_path, ResourceMonitor, memory):
+	memory['available'] = GB
+	adaptive_jobs = ResourceMonitor.AdaptiveJobs(str(tmp_path / 'memory.json'), poll_interval=0.01)
+
+	started = time.monotonic()
+	adaptive_jobs.release(adaptive_jobs.wait_for_memory(lambda: 0, 'a.o'))
+	assert time.monotonic() - started < 1
+	assert adaptive_jobs.throttle_count == 0
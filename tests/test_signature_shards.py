@@ -0,0 +1,45 @@
+import os
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+
+def upper(target, source, env):
+	with open(str(target[0]), 'w') as f:
+		f.write(source[0].get_text_contents().upper())
+
+root = Dir('.').abspath
+solution = Solution('shards', root, os.path.join(root, 'out'))
+solution.enable_sharded_signatures()
+for name in ['alpha', 'beta']:
+	project = solution.create_project(name, name, name)
+	CustomBuildAction(project, upper, os.path.join(root, 'out', name, 'upper.txt'), os.path.join(root, name, 'input.txt'))
+	project.submit_action()
+'''
+
+def shard_states(root) -> dict[str, tuple[int, int]]:
+	states = {}
+	for name in ['alpha', 'beta']:
+		stat = os.stat(root / 'out' / name / '.metascons' / 'sconsign.pickle')
+		states[name] = (stat.st_ino, stat.st_mtime_ns)
+	return states
+
+def test_only_the_changed_projects_shard_is_rewritten(tmp_path, write_sconstruct, run_scons):
+	for name in ['alpha', 'beta']:
+		(tmp_path / name).mkdir()
+		(tmp_path / name / 'input.txt').write_text(name)
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	run_scons(tmp_path)
+	built = shard_states(tmp_path)
+
+	assert 'is up to date' in run_scons(tmp_path).stdout
+	assert shard_states(tmp_path) == built
+
+	(tmp_path / 'beta' / 'input.txt').write_text('beta changed')
+	run_scons(tmp_path)
+	rebuilt = shard_states(tmp_path)
+	assert rebuilt['alpha'] == built['alpha']
+	assert rebuilt['beta'] != built['beta']
+	assert (tmp_path / 'out' / 'beta' / 'upper.txt').read_text() == 'BETA CHANGED'
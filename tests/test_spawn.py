@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'posix_spawn'), reason='requires posix_spawn')
+
+def test_direct_spawn_runs_programs(import_module):
+	Spawn = import_module('Spawn')
+
+	exit_code, _ = Spawn.spawn_direct([sys.executable, '-c', 'raise SystemExit(3)'], dict(os.environ))
+	assert exit_code == 3
+
+# scripts without #! line fail to exec (ENOEXEC) and are left to the shell, which runs them
+def test_direct_spawn_leaves_scripts_without_interpreter_to_the_shell(tmp_path, import_module):
+	Spawn = import_module('Spawn')
+	script = tmp_path / 'script'
+	script.write_text(f'echo ran > {tmp_path / "output.txt"}\n')
+	script.chmod(0o755)
+
+	assert Spawn.spawn_direct([str(script)], dict(os.environ)) is None
+	exit_code, _ = Spawn.spawn_shell('sh', str(script), dict(os.environ))
+	assert exit_code == 0
+	assert (tmp_path / 'output.txt').read_text() == 'ran\n'
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+@pytest.fixture
+def Stage(import_module, monkeypatch):
+	module = import_module('Stage')
+	def unsupported(source, dest):
+		raise OSError('reflinks are not supported')
+	monkeypatch.setattr(module, 'reflink', unsupported) # tmp file systems rarely support reflinks
+	return module
+
+def write_source(tmp_path):
+	source = tmp_path / 'source.bin'
+	source.write_bytes(b'content')
+	os.utime(source, ns=(1_000_000_000, 1_000_000_000))
+	return source
+
+def test_files_are_hardlinked_when_reflinks_fail(tmp_path, Stage):
+	source = write_source(tmp_path)
+	dest = tmp_path / 'dest.bin'
+
+	assert Stage.stage_file(str(source), str(dest)) == 'hardlink'
+	assert os.path.samefile(source, dest)
+	assert Stage.stage_file(str(source), str(dest)) == 'skipped'
+	assert not any(path.name.endswith('.stage') for path in tmp_path.iterdir())
+
+def test_files_are_copied_when_links_fail(tmp_path, Stage, monkeypatch):
+	source = write_source(tmp_path)
+	dest = tmp_path / 'dest.bin'
+	dest.write_bytes(b'stale')
+	def cross_device(source, dest):
+		raise OSError('cross-device link')
+	monkeypatch.setattr(os, 'link', cross_device)
+
+	assert Stage.stage_file(str(source), str(dest)) == 'copy'
+	assert dest.read_bytes() == b'content'
+	assert not os.path.samefile(source, dest)
+	# copies keep the modification time, so they are recognized as staged
+	assert Stage.stage_file(str(source), str(dest)) == 'skipped'
+
+	source.write_bytes(b'changed')
+	assert Stage.stage_file(str(source), str(dest)) == 'copy'
+	assert dest.read_bytes() == b'changed'
+
+def test_hardlinks_can_be_disabled(tmp_path, Stage):
+	source = write_source(tmp_path)
+	dest = tmp_path / 'dest.bin'
+
+	assert Stage.stage_file(str(source), str(dest), hardlink=False) == 'copy'
+	assert not os.path.samefile(source, dest)
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CustomBuilder import CustomBuildAction
+from MetaSCons.Stage import StageAction
+
+def upper(target, source, env):
+	with open(str(target[0]), 'w') as f:
+		f.write(source[0].get_text_contents().upper())
+
+root = Dir('.').abspath
+solution = Solution('stage', root, os.path.join(root, 'out'))
+project = solution.create_project('stage', '.', 'stage')
+built = CustomBuildAction(project, upper, os.path.join(root, 'out', 'upper.txt'), os.path.join(root, 'input.txt'))
+StageAction(project, built, 'staged')
+project.submit_action()
+'''
+
+def test_outputs_are_staged_again_after_a_rebuild(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'input.txt').write_text('first')
+	write_sconstruct(tmp_path, SCONSTRUCT)
+	output = tmp_path / 'out' / 'upper.txt'
+	staged = tmp_path / 'out' / 'stage' / 'staged' / 'upper.txt'
+
+	run_scons(tmp_path)
+	assert staged.read_text() == 'FIRST'
+	assert os.path.samefile(output, staged) or os.stat(output).st_mtime_ns == os.stat(staged).st_mtime_ns
+
+	assert 'is up to date' in run_scons(tmp_path).stdout
+
+	(tmp_path / 'input.txt').write_text('second')
+	run_scons(tmp_path)
+	assert staged.read_text() == 'SECOND'
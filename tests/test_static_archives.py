@@ -0,0 +1,56 @@
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None or shutil.which('ar') is None, reason='requires g++ and GNU ar')
+
+SOURCE_COUNT = 5
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram, CPPStaticLibrary
+
+root = Dir('.').abspath
+solution = Solution('archives', root, os.path.join(root, 'out'))
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('archives', '.', 'archives')
+library = CPPStaticLibrary('library', project, 'numbers', 'lib', sources=[f'lib/number_{{index}}.cpp' for index in range({count})])
+library.set_thin_archive()
+library.set_skip_ranlib()
+library.set_objects_per_archive(2)
+program = CPPProgram('program', project, 'sum', 'bin', sources=['main.cpp'])
+program.link(library)
+project.submit_action()
+'''
+
+def test_split_thin_archives_are_combined_into_the_library(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'lib').mkdir()
+	for index in range(SOURCE_COUNT):
+		(tmp_path / 'lib' / f'number_{index}.cpp').write_text(f'int number_{index}() {{ return {index}; }}\n')
+	declarations = ''.join(f'int number_{index}();\n' for index in range(SOURCE_COUNT))
+	total = ' + '.join(f'number_{index}()' for index in range(SOURCE_COUNT))
+	(tmp_path / 'main.cpp').write_text(f'{declarations}int main() {{ return {total} == 10 ? 0 : 1; }}\n')
+	write_sconstruct(tmp_path, SCONSTRUCT.format(count=SOURCE_COUNT))
+
+	process = run_scons(tmp_path)
+
+	archive_lines = [line for line in process.stdout.splitlines() if line.startswith('ar ')]
+	assert all(line.startswith('ar rcTDs ') for line in archive_lines)
+	assert not any(line.startswith('ranlib ') for line in process.stdout.splitlines())
+	# 3 parts of at most 2 objects, then the library from the parts
+	assert len(archive_lines) == 4
+	assert archive_lines[-1].split()[2] == 'libnumbers.a'
+	assert [len(line.split()) - 3 for line in archive_lines[:3]] == [2, 2, 1]
+	assert all('numbers.parts' in line.split()[2] for line in archive_lines[:3])
+
+	library = tmp_path / 'libnumbers.a'
+	assert library.read_bytes().startswith(b'!<thin>\n')
+	members = subprocess.run(['ar', 'tv', str(library)], capture_output=True, text=True, check=True).stdout.splitlines()
+	assert len(members) == SOURCE_COUNT # flattened
+	assert all(' 0/0 ' in member for member in members) # deterministic
+
+	assert subprocess.run([str(tmp_path / 'sum')]).returncode == 0
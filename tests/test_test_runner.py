@@ -0,0 +1,102 @@
+import os
+import shutil
+import sys
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+def write_test(path, exit_code: int = 0):
+	path.write_text(f'#!{sys.executable}\nprint("running")\nraise SystemExit({exit_code})\n')
+	path.chmod(0o755)
+
+def junit_cases(path) -> dict[str, ElementTree.Element]:
+	return {case.get('file'): case for case in ElementTree.parse(path).getroot().iter('testcase')}
+
+@pytest.mark.skipif(os.name != 'posix', reason='runs scripts as test executables')
+def test_identical_tests_are_cached_and_reported_by_path(tmp_path, import_module):
+	TestRunner = import_module('TestRunner')
+	tests = [str(tmp_path / 'a_test'), str(tmp_path / 'b_test')]
+	for test in tests:
+		write_test(tmp_path / test) # same binary
+
+	cache_path = str(tmp_path / 'cache.json')
+	assert TestRunner.run_tests(tests, str(tmp_path / 'first.xml'), cache_path)
+	assert TestRunner.run_tests(tests, str(tmp_path / 'second.xml'), cache_path)
+
+	cases = junit_cases(tmp_path / 'second.xml')
+	assert sorted(cases) == sorted(tests)
+	assert [case.get('name') for case in cases.values()] == ['a_test', 'b_test']
+	for case in cases.values():
+		assert case.find('properties/property').get('value') == 'true' # cached
+
+@pytest.mark.skipif(os.name != 'posix', reason='runs scripts as test executables')
+def test_shards_sharing_a_cache_keep_each_others_results(tmp_path, import_module):
+	TestRunner = import_module('TestRunner')
+	tests = []
+	for name in ['a_test', 'b_test', 'c_test', 'd_test']:
+		write_test(tmp_path / name, 1 if name == 'd_test' else 0)
+		tests.append(str(tmp_path / name))
+	assert TestRunner.select_shard(tests, 0, 2) == [tests[0], tests[2]]
+	assert TestRunner.select_shard(tests, 1, 2) == [tests[1], tests[3]]
+
+	# both shards load the cache before either saves
+	cache_path = str(tmp_path / 'cache.json')
+	shards = [TestRunner.TestRunner(cache_path), TestRunner.TestRunner(cache_path)]
+	results = [runner.run(TestRunner.select_shard(tests, index, 2)) for index, runner in enumerate(shards)]
+	assert [result.status for result in results[1]] == ['passed', 'failed']
+
+	cached = [result for result in TestRunner.TestRunner(cache_path).run(tests) if result.cached]
+	assert [result.name for result in cached] == tests[:3] # failures aren't cached
+
+SOURCES = {
+	'lib/value.h': 'int value();\n',
+	'lib/value.cpp': '#include "value.h"\nint value() { return 1; }\n',
+	'tests/value_test.cpp': '#include "value.h"\nint main() { return value() == 1 ? 0 : 1; }\n',
+	'tests/broken_test.cpp': '#include <cstdio>\nint main() { std::puts("broken"); return 3; }\n',
+}
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPStaticLibrary, CPPTest
+
+root = Dir('.').abspath
+solution = Solution('tests', root, os.path.join(root, 'out'))
+solution.add_toolset('library', CPPToolset(CPPCompiler.GCC))
+solution.add_toolset('tests', CPPToolset(CPPCompiler.GCC))
+project = solution.create_project('sample', '.', 'sample')
+library = CPPStaticLibrary('library', project, 'value', 'lib', sources=['lib/value.cpp'])
+library.add_public_include_paths(['lib'])
+tests = CPPTest('tests', project, 'tests', 'tests')
+tests.link(library)
+project.submit_action()
+'''
+
+@pytest.mark.skipif(shutil.which('g++') is None, reason='requires g++')
+def test_cpp_tests_run_with_the_test_alias(tmp_path, write_sconstruct, run_scons, monkeypatch):
+	for path, content in SOURCES.items():
+		(tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+		(tmp_path / path).write_text(content)
+	write_sconstruct(tmp_path, SCONSTRUCT)
+
+	run_scons(tmp_path) # the default build only builds the tests
+	assert not any(tmp_path.glob('out/**/test_results.xml'))
+
+	first = run_scons(tmp_path, 'test', check=False)
+	assert first.returncode != 0
+	assert 'FAILED: ' in first.stdout and 'broken' in first.stdout
+	assert '1/2 tests passed (0 cached)' in first.stdout
+
+	second = run_scons(tmp_path, 'test', check=False)
+	assert '1/2 tests passed (1 cached)' in second.stdout
+
+	report = next(tmp_path.glob('out/**/test_results.xml'))
+	cases = {case.get('name'): case for case in ElementTree.parse(report).getroot().iter('testcase')}
+	assert sorted(cases) == ['broken_test', 'value_test']
+	assert cases['broken_test'].find('failure').get('message') == 'exit code 3'
+
+	# the second of 2 shards runs value_test, which passed in the earlier runs
+	monkeypatch.setenv('METASCONS_TEST_SHARD_INDEX', '1')
+	monkeypatch.setenv('METASCONS_TEST_SHARD_COUNT', '2')
+	assert '1/1 tests passed (1 cached)' in run_scons(tmp_path, 'test').stdout
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pytest
+
+pytestmark = pytest.mark.skipif(os.name != 'posix' or shutil.which('g++') is None, reason='requires g++')
+
+UNSUPPORTED = '-fmetascons-no-such-flag'
+
+# a compiler that logs its invocations and runs g++
+def write_compiler(path, comment: str = ''):
+	path.write_text(f'#!/bin/sh\n# {comment}\necho "$@" >> "{path}.log"\nexec g++ "$@"\n')
+	path.chmod(0o755)
+
+def invocations(path) -> int:
+	log = path.parent / f'{path.name}.log'
+	return len(log.read_text().splitlines()) if log.exists() else 0
+
+def test_flags_are_probed_once_per_compiler_binary(tmp_path, import_module):
+	ToolchainProbe = import_module('ToolchainProbe')
+	CPPToolset = import_module('CPPToolset')
+	compiler = tmp_path / 'g++-wrapper'
+	write_compiler(compiler)
+	cache_path = str(tmp_path / 'toolchains.json')
+
+	probe = ToolchainProbe.ToolchainProbe(CPPToolset.CPPCompiler.GCC, str(compiler), cache_path)
+	assert probe.is_supported('-O2')
+	assert not probe.is_supported(UNSUPPORTED)
+	assert probe.is_supported('-fuse-ld=bfd', ToolchainProbe.ToolchainProbe.LINK)
+	spawned = invocations(compiler)
+	assert spawned == 4 # the version and 3 flags
+
+	# warm: from the cache
+	warm = ToolchainProbe.ToolchainProbe(CPPToolset.CPPCompiler.GCC, str(compiler), cache_path)
+	assert warm.check_flags([('-O2', 'c++'), (UNSUPPORTED, 'c++')]) == {('-O2', 'c++'): True, (UNSUPPORTED, 'c++'): False}
+	assert invocations(compiler) == spawned
+
+	# a changed compiler binary (path|mtime|size) is probed again
+	write_compiler(compiler, 'upgraded')
+	upgraded = ToolchainProbe.ToolchainProbe(CPPToolset.CPPCompiler.GCC, str(compiler), cache_path)
+	assert upgraded.key != probe.key
+	assert upgraded.is_supported('-O2')
+	assert invocations(compiler) == spawned + 2
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram
+
+root = Dir('.').abspath
+solution = Solution('probe', root, os.path.join(root, 'out'))
+toolset = CPPToolset(CPPCompiler.GCC)
+toolset.add_optional_flags(['-fno-plt', {unsupported!r}])
+toolset.enable_flag_probing(cache_path=os.path.join(root, 'toolchains.json'))
+solution.add_toolset('program', toolset)
+project = solution.create_project('probe', '.', 'probe')
+CPPProgram('program', project, 'hello', 'bin', sources=['main.cpp'])
+project.submit_action()
+'''
+
+def test_unsupported_optional_flags_are_dropped(tmp_path, write_sconstruct, run_scons):
+	(tmp_path / 'main.cpp').write_text('int main() { return 0; }\n')
+	write_sconstruct(tmp_path, SCONSTRUCT.format(unsupported=UNSUPPORTED))
+
+	process = run_scons(tmp_path)
+
+	compile_line = next(line for line in process.stdout.splitlines() if ' -c ' in line)
+	assert '-fno-plt' in compile_line
+	assert UNSUPPORTED not in compile_line
+	assert 'dropping' not in process.stderr # optional flags are dropped without a warning
+	assert os.path.isfile(tmp_path / 'toolchains.json')
@@ -0,0 +1,77 @@
+import shutil
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None, reason='requires g++')
+
+SCONSTRUCT = '''
+import os
+from MetaSCons.Solution import Solution
+from MetaSCons.CPPToolset import CPPToolset, CPPCompiler
+from MetaSCons.CPPActions import CPPProgram, CPPSharedLibrary, CPPStaticLibrary
+
+root = Dir('.').abspath
+solution = Solution('requirements', root, os.path.join(root, 'out'))
+project = solution.create_project('requirements', '.', 'requirements')
+libraries = {{}}
+for name in ['a', 'b', 'c', 'd']:
+	solution.add_toolset(name, CPPToolset(CPPCompiler.GCC))
+	if name == 'd':
+		libraries[name] = CPPSharedLibrary(name, project, name, name, 'lib')
+	else:
+		libraries[name] = CPPStaticLibrary(name, project, name, name, sources=[f'{{name}}/{{name}}.cpp'])
+	libraries[name].add_public_include_paths([f'{{name}}_include'])
+{links}
+solution.add_toolset('program', CPPToolset(CPPCompiler.GCC))
+program = CPPProgram('program', project, 'program', 'bin', sources=['main.cpp'])
+program.link([libraries['a'], libraries['d']])
+project.submit_action()
+for name, action in list(libraries.items()) + [('program', program)]:
+	print(name, 'CPPPATH', ' '.join(os.path.basename(str(path)) for path in action.env.get('CPPPATH', [])))
+	print(name, 'LIBS', ' '.join(os.path.basename(str(library)) for library in action.env.get('LIBS', [])))
+'''
+
+def configure(tmp_path, write_sconstruct, links: str):
+	for name in ['a', 'b', 'c', 'd']:
+		(tmp_path / name).mkdir()
+		(tmp_path / name / f'{name}.cpp').write_text(f'int {name}() {{ return 0; }}\n')
+	(tmp_path / 'main.cpp').write_text('int main() { return 0; }\n')
+	write_sconstruct(tmp_path, SCONSTRUCT.format(links=links))
+
+def variables(process) -> dict[str, list[str]]:
+	found = {}
+	for line in process.stdout.splitlines():
+		parts = line.split()
+		if len(parts) >= 2 and parts[1] in ['CPPPATH', 'LIBS']:
+			found[f'{parts[0]} {parts[1]}'] = parts[2:]
+	return found
+
+def test_requirements_propagate_transitively(tmp_path, write_sconstruct, run_scons):
+	configure(tmp_path, write_sconstruct, '\n'.join([
+		"libraries['a'].link(libraries['b'], public=True)",
+		"libraries['b'].link(libraries['c'])",
+		"libraries['d'].link(libraries['c'])",
+	]))
+
+	found = variables(run_scons(tmp_path, '-n'))
+
+	# public include paths reach the consumers of a public link, private ones stop at the linking library
+	assert [path for path in found['program CPPPATH'] if path.endswith('_include')] == ['a_include', 'b_include', 'd_include']
+	assert 'c_include' in found['b CPPPATH']
+	assert 'c_include' not in found['a CPPPATH']
+	# static libraries pass their libraries on to the link, shared libraries link them themselves
+	assert found['program LIBS'] == ['liba.a', 'libb.a', 'libc.a', 'libd.so']
+	assert found['d LIBS'] == ['libc.a']
+	assert found['a LIBS'] == []
+
+def test_circular_dependency_is_reported(tmp_path, write_sconstruct, run_scons):
+	configure(tmp_path, write_sconstruct, '\n'.join([
+		"libraries['a'].link(libraries['b'])",
+		"libraries['b'].link(libraries['c'])",
+		"libraries['c'].link(libraries['a'])",
+	]))
+
+	process = run_scons(tmp_path, '-n', check=False)
+
+	assert process.returncode != 0
+	assert 'Circular library dependency involving requirements/' in process.stdout + process.stderr